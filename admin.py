@@ -0,0 +1,103 @@
+"""
+관리자 화면 도구
+주소에 ?admin=<ADMIN_KEY>를 붙였을 때만 운영 정보를 표시
+"""
+
+import os
+
+import streamlit as st
+
+from judgment import get_judgment_metrics, get_judgment_flights, get_judgment_breaker
+
+
+def get_admin_key():
+    """관리자 키 - 환경변수 또는 Streamlit Secrets (없으면 관리자 화면 비활성)"""
+    key = os.getenv("ADMIN_KEY")
+    if not key:
+        try:
+            key = st.secrets["ADMIN_KEY"]
+        except Exception:
+            key = None
+    return key
+
+
+def is_admin():
+    """현재 접속이 관리자용인지 확인"""
+    key = get_admin_key()
+    return bool(key) and st.query_params.get("admin") == key
+
+
+def show_judgment_metrics():
+    """판결 첫 토큰 시간(TTFT)과 전체 응답 시간"""
+    show_breaker_status(get_judgment_breaker())
+    summary = get_judgment_metrics().summary()
+    flights = get_judgment_flights()
+    in_flight = flights.in_flight()
+    if in_flight:
+        queued = flights.queued()
+        st.caption(
+            f"생성 중인 판결 {in_flight}건 (같은 요청은 한 번만 호출)"
+            + (f" · 스레드 대기 {queued}건" if queued else "")
+        )
+    if not summary["count"]:
+        st.caption("아직 판결 기록이 없습니다.")
+        return
+
+    def seconds(value):
+        return f"{value:.1f}초" if value is not None else "-"
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("첫 토큰 (중앙값)", seconds(summary["ttft_median"]))
+        st.metric("첫 토큰 (최대)", seconds(summary["ttft_max"]))
+    with col2:
+        st.metric("전체 응답 (중앙값)", seconds(summary["total_median"]))
+        st.metric("판결 수", summary["count"])
+    st.caption(f"재시도 {summary['retries']}회 · 실패(기본 판결 사용) {summary['failures']}회")
+
+
+def show_breaker_status(breaker):
+    """회로 차단기 상태와 열린 횟수"""
+    status = breaker.status()
+    labels = {"closed": "🟢 정상", "open": "🔴 차단 (임시 판결 사용)", "half_open": "🟡 시험 호출 중"}
+    text = f"판결 API: {labels.get(status['state'], status['state'])} · 차단 {status['trips']}회"
+    if status["state"] == "open":
+        text += f" · {status['retry_in']:.0f}초 뒤 재시도"
+    st.caption(text)
+    if status["last_error"] and status["state"] != "closed":
+        st.caption(f"마지막 오류: {status['last_error'][:120]}")
+
+
+def show_reactor_status(client):
+    """공유 API 루프에서 진행 중/대기 중인 요청 수와 분당 한도 대기열"""
+    if not hasattr(client, "stats"):
+        return
+    stats = client.stats()
+    st.caption(
+        f"API 요청: 진행 {stats['active']} / 최대 {stats['max_concurrency']} · 대기 {stats['waiting']}"
+    )
+    for kind, queue in stats.get("queues", {}).items():
+        st.caption(
+            f"{kind}: 한도 대기 {queue['waiting']}건 · 처리 {queue['served']}건 · "
+            f"429 {queue['throttled']}회 · 평균 대기 {queue['avg_wait']:.1f}초"
+        )
+
+
+def show_ops_link():
+    """API 운영 현황 페이지로 가는 링크 (관리자 키를 그대로 붙여서)"""
+    st.page_link(
+        "pages/ops_dashboard.py",
+        label="📈 API 운영 현황 (지연 백분위, 오류율, 진행 중 호출)",
+        query_params={"admin": st.query_params.get("admin")}
+    )
+
+
+def show_prompt_report():
+    """이 세션의 마지막 판결 프롬프트 크기"""
+    report = st.session_state.get("prompt_report")
+    if not report:
+        return
+    st.caption(
+        f"📝 판결 프롬프트: 약 {report['tokens_before']}→{report['tokens_after']}토큰 "
+        f"(예산 {report['budget']}, 줄인 발언 {report['compacted']}개)"
+    )
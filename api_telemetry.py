@@ -0,0 +1,312 @@
+"""
+API 호출 기록
+판결/음성 인식 호출마다 걸린 시간, 전송량, 토큰, 모델, 캐시 여부, 결과를 남김
+(프로세스 메모리 링 버퍼 + 크기 기준으로 돌려 쓰는 JSONL 파일, 선택적으로 Prometheus 텍스트 파일)
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import streamlit as st
+
+from cache_store import CACHE_DIR
+from usage_budget import current_class, get_usage_ledger
+
+# 관리자 화면에서 백분위를 계산할 최근 기록 수
+TELEMETRY_HISTORY = 2000
+# JSONL 기록 파일 - 빈 문자열이면 파일에 남기지 않음
+API_LOG_PATH = os.getenv("API_LOG_PATH", os.path.join(CACHE_DIR, "api_calls.jsonl"))
+API_LOG_MAX_BYTES = int(os.getenv("API_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+API_LOG_BACKUPS = int(os.getenv("API_LOG_BACKUPS", "5"))
+# 모니터링용 Prometheus 텍스트 파일 (node_exporter textfile 수집기 등) - 비어 있으면 쓰지 않음
+API_METRICS_PROM_FILE = os.getenv("API_METRICS_PROM_FILE", "")
+PROM_WRITE_SECONDS = 15
+# 오류로 세지 않는 결과 - 미리 시작했다 버린 판결(cancelled), 화면을 떠난 세션(abandoned),
+# 학급 예산을 다 써서 규칙 기반 판결을 쓴 경우(budget) 포함 (error, rate_limited, circuit_open은 오류율에 포함)
+OK_OUTCOMES = ("ok", "no_speech", "cancelled", "abandoned", "budget")
+
+
+def percentile(values, q):
+    """정렬된 값의 q 백분위 (값이 없으면 None)"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def session_tags():
+    """지금 세션과 학급을 구분하는 태그 - 기록마다 함께 남김 (학급별 사용량 집계에 사용)"""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex[:8]
+    return {"session": st.session_state.session_id, "class": current_class()}
+
+
+class ApiCall:
+    """진행 중인 호출 하나 - with 블록이 끝나면 기록
+
+    예외가 나면 outcome=error, 재실행/중지로 스크립트가 멈춘 경우(BaseException)는 abandoned
+    """
+
+    def __init__(self, telemetry, endpoint, fields):
+        self.telemetry = telemetry
+        self.endpoint = endpoint
+        self.fields = {"outcome": "ok", "cache": None, "model": None}
+        self.fields.update(fields)
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.closed = False
+
+    def update(self, **fields):
+        self.fields.update(fields)
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def close(self, **fields):
+        """기록 마무리 - 두 번 불러도 한 번만 기록"""
+        if self.closed:
+            return
+        self.closed = True
+        self.fields.update(fields)
+        self.telemetry.finish(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(exc, Exception):
+            self.fields.update(outcome="error", error=type(exc).__name__)
+        elif exc is not None:
+            self.fields.update(outcome="abandoned")
+        self.close()
+        return False
+
+
+class ApiTelemetry:
+    """API 호출 기록 - 모든 세션이 공유"""
+
+    def __init__(self, history=TELEMETRY_HISTORY, log_path=API_LOG_PATH,
+                 max_bytes=API_LOG_MAX_BYTES, backups=API_LOG_BACKUPS,
+                 prom_path=API_METRICS_PROM_FILE):
+        self._records = deque(maxlen=history)
+        self._in_flight = {}
+        # Prometheus 카운터는 링 버퍼와 달리 계속 누적
+        self._totals = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.prom_path = prom_path
+        self._prom_written = 0.0
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """호출이 끝날 때마다 listener(record)를 부름 (작업 스레드에서 불릴 수 있음)"""
+        self._listeners.append(listener)
+
+    def track(self, endpoint, tags=None, **fields):
+        """호출 시작 - with telemetry.track("judgment", ...) as call: ..."""
+        call = ApiCall(self, endpoint, dict(tags or {}, **fields))
+        with self._lock:
+            self._in_flight[id(call)] = call
+        return call
+
+    def finish(self, call):
+        record = {
+            "time": call.started_at,
+            "endpoint": call.endpoint,
+            "seconds": time.perf_counter() - call.started,
+            "ttft": call.ttft,
+        }
+        record.update(call.fields)
+        with self._lock:
+            self._in_flight.pop(id(call), None)
+            self._records.append(record)
+            self._count(record)
+        self._write(record)
+        for listener in self._listeners:
+            listener(record)
+        if self.prom_path and time.time() - self._prom_written >= PROM_WRITE_SECONDS:
+            self.write_prometheus()
+
+    def _count(self, record):
+        endpoint = record["endpoint"]
+        totals = self._totals.setdefault(endpoint, {
+            "outcomes": {}, "seconds": 0.0, "count": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+            "bytes_sent": 0, "bytes_received": 0, "audio_seconds": 0.0,
+        })
+        totals["outcomes"][record["outcome"]] = totals["outcomes"].get(record["outcome"], 0) + 1
+        totals["seconds"] += record["seconds"]
+        totals["count"] += 1
+        for field in ("prompt_tokens", "completion_tokens", "bytes_sent", "bytes_received", "audio_seconds"):
+            totals[field] += record.get(field) or 0
+
+    # --- JSONL 파일 ---
+
+    def _write(self, record):
+        if not self.log_path:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._file_lock:
+            try:
+                directory = os.path.dirname(self.log_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if (os.path.exists(self.log_path)
+                        and os.path.getsize(self.log_path) + len(line) > self.max_bytes):
+                    self._rotate()
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                # 기록 파일 문제로 수업이 멈추면 안 됨 - 메모리 기록은 그대로 남음
+                pass
+
+    def _rotate(self):
+        """api_calls.jsonl → .1 → .2 ... (가장 오래된 것은 삭제)"""
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.log_path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.log_path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.log_path, f"{self.log_path}.1")
+        else:
+            os.remove(self.log_path)
+
+    # --- 조회 ---
+
+    def records(self, since=None):
+        with self._lock:
+            records = list(self._records)
+        if since is not None:
+            records = [r for r in records if r["time"] >= since]
+        return records
+
+    def in_flight(self):
+        """진행 중인 호출 - [{endpoint, seconds, model, session}]"""
+        now = time.perf_counter()
+        with self._lock:
+            calls = list(self._in_flight.values())
+        return [
+            {
+                "endpoint": call.endpoint,
+                "seconds": now - call.started,
+                "model": call.fields.get("model"),
+                "session": call.fields.get("session"),
+            }
+            for call in sorted(calls, key=lambda c: c.started)
+        ]
+
+    def summary(self, since=None):
+        """엔드포인트별 호출 수, 오류율, 지연 백분위(캐시 적중 제외), 토큰/전송량, 진행 중 호출 수"""
+        by_endpoint = {}
+        for record in self.records(since):
+            by_endpoint.setdefault(record["endpoint"], []).append(record)
+        live = {}
+        for call in self.in_flight():
+            live[call["endpoint"]] = live.get(call["endpoint"], 0) + 1
+
+        summary = {}
+        for endpoint in sorted(set(by_endpoint) | set(live)):
+            records = by_endpoint.get(endpoint, [])
+            latencies = sorted(r["seconds"] for r in records if r.get("cache") != "hit")
+            ttfts = sorted(r["ttft"] for r in records if r.get("ttft") is not None)
+            errors = sum(1 for r in records if r["outcome"] not in OK_OUTCOMES)
+            hits = sum(1 for r in records if r.get("cache") == "hit")
+            summary[endpoint] = {
+                "calls": len(records),
+                "errors": errors,
+                "error_rate": errors / len(records) if records else 0.0,
+                "cache_hit_rate": hits / len(records) if records else 0.0,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "ttft_p50": percentile(ttfts, 50),
+                "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in records),
+                "completion_tokens": sum(r.get("completion_tokens") or 0 for r in records),
+                "bytes_sent": sum(r.get("bytes_sent") or 0 for r in records),
+                "audio_seconds": sum(r.get("audio_seconds") or 0 for r in records),
+                "in_flight": live.get(endpoint, 0),
+            }
+        return summary
+
+    # --- Prometheus ---
+
+    def prometheus_text(self):
+        """Prometheus 텍스트 형식 - 누적 카운터, 최근 기록의 지연 백분위, 진행 중 호출 수"""
+        with self._lock:
+            totals = json.loads(json.dumps(self._totals))
+        summary = self.summary()
+        lines = [
+            "# HELP trial_api_calls_total API calls by endpoint and outcome.",
+            "# TYPE trial_api_calls_total counter",
+        ]
+        for endpoint, total in sorted(totals.items()):
+            for outcome, count in sorted(total["outcomes"].items()):
+                lines.append(f'trial_api_calls_total{{endpoint="{endpoint}",outcome="{outcome}"}} {count}')
+        lines += [
+            "# HELP trial_api_latency_seconds API call latency over recent calls (cache hits excluded).",
+            "# TYPE trial_api_latency_seconds summary",
+        ]
+        for endpoint, total in sorted(totals.items()):
+            stats = summary.get(endpoint, {})
+            for q, field in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                if stats.get(field) is not None:
+                    lines.append(
+                        f'trial_api_latency_seconds{{endpoint="{endpoint}",quantile="{q}"}} {stats[field]:.6f}'
+                    )
+            lines.append(f'trial_api_latency_seconds_sum{{endpoint="{endpoint}"}} {total["seconds"]:.6f}')
+            lines.append(f'trial_api_latency_seconds_count{{endpoint="{endpoint}"}} {total["count"]}')
+        lines += [
+            "# HELP trial_api_in_flight API calls currently in progress.",
+            "# TYPE trial_api_in_flight gauge",
+        ]
+        for endpoint in sorted(set(totals) | set(summary)):
+            lines.append(f'trial_api_in_flight{{endpoint="{endpoint}"}} {summary.get(endpoint, {}).get("in_flight", 0)}')
+        lines += [
+            "# HELP trial_api_tokens_total Tokens used by endpoint and kind.",
+            "# TYPE trial_api_tokens_total counter",
+        ]
+        for endpoint, total in sorted(totals.items()):
+            for kind in ("prompt", "completion"):
+                lines.append(f'trial_api_tokens_total{{endpoint="{endpoint}",kind="{kind}"}} {total[kind + "_tokens"]}')
+        lines += [
+            "# HELP trial_api_bytes_total Bytes sent to and received from the API.",
+            "# TYPE trial_api_bytes_total counter",
+        ]
+        for endpoint, total in sorted(totals.items()):
+            for direction in ("sent", "received"):
+                lines.append(f'trial_api_bytes_total{{endpoint="{endpoint}",direction="{direction}"}} {total["bytes_" + direction]}')
+        lines += [
+            "# HELP trial_api_audio_seconds_total Seconds of audio transcribed.",
+            "# TYPE trial_api_audio_seconds_total counter",
+        ]
+        for endpoint, total in sorted(totals.items()):
+            if total["audio_seconds"]:
+                lines.append(f'trial_api_audio_seconds_total{{endpoint="{endpoint}"}} {total["audio_seconds"]:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        """Prometheus 텍스트 파일 갱신 (다른 프로세스가 반쯤 쓴 파일을 읽지 않도록 바꿔치기)"""
+        self._prom_written = time.time()
+        try:
+            temp_path = f"{self.prom_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, self.prom_path)
+        except OSError:
+            pass
+
+
+@st.cache_resource
+def get_api_telemetry():
+    """서버 프로세스 전체에서 하나만 쓰는 API 호출 기록 - 끝난 호출은 학급별 사용량 장부에도 더함"""
+    telemetry = ApiTelemetry()
+    telemetry.add_listener(get_usage_ledger().record)
+    return telemetry
@@ -5,13 +5,27 @@ AI 모의재판 시스템 - 50분 수업 최적화 버전
 
 import streamlit as st
 import os
-from openai import OpenAI
-import tempfile
+from openai_client import get_openai_client
 from audio_recorder_streamlit import audio_recorder
 from datetime import datetime
 import json
 import time
 from dotenv import load_dotenv
+from judgment import stream_judgment, get_judgment_cache, judgment_pending
+from local_verdict import build_local_verdict
+from round_evaluation import (
+    get_round_evaluator, collect_round_evaluations, round_evaluated_prompt, show_round_evaluation_status
+)
+from admin import is_admin, show_judgment_metrics, show_reactor_status, show_prompt_report, show_ops_link
+from prompt_builder import build_judgment_prompt, record_prompt_report
+from usage_budget import show_class_selector, show_usage_summary, session_usage
+from utils import (
+    show_cache_stats, is_new_recording, queue_transcription, collect_transcriptions,
+    pending_transcriptions, show_transcription_status
+)
+from transcription import (
+    format_upload_stats, get_asr_backend, get_transcript_cache, MAX_RECORDING_SECONDS
+)
 
 # .env 파일 로드
 load_dotenv()
@@ -402,8 +416,9 @@ if not api_key:
         st.info("💡 Streamlit Cloud Settings > Secrets에서 설정하세요.")
         st.stop()
 
-# OpenAI 클라이언트
-client = OpenAI(api_key=api_key)
+# OpenAI 클라이언트 - 프로세스 전체에서 하나를 공유 (재실행마다 새 연결을 맺지 않음)
+client = get_openai_client(api_key)
+round_evaluator = get_round_evaluator(client)
 
 # ===== 세션 초기화 =====
 if 'initialized' not in st.session_state:
@@ -417,46 +432,22 @@ if 'initialized' not in st.session_state:
     st.session_state.current_round = 1
     st.session_state.timer_start = None
     st.session_state.mode = 'simple'  # simple or advanced
-    st.session_state.last_audio_pros = None  # 마지막 오디오 추적
-    st.session_state.last_audio_def = None
+    st.session_state.audio_fingerprints = {}  # 녹음기별 마지막 녹음 지문
     init_gamification()
 
 # ===== 핵심 함수 =====
 
-def transcribe_audio(audio_bytes, language="ko"):
-    """음성 인식 - 리소스 최적화 버전"""
+def transcribe_audio(audio_bytes, team, round_num, language="ko"):
+    """음성 인식 시작 - 공유 작업 큐에 넣고 바로 반환 (결과는 read_transcription으로 확인)"""
+    return queue_transcription(
+        team, round_num, get_asr_backend(client), audio_bytes, language,
+        cache=get_transcript_cache()
+    )
+
+def read_transcription(job):
+    """끝난 음성 인식 작업의 텍스트 - 무음/오류 안내 포함"""
     try:
-        # 오디오 파일 크기 확인 (최소 0.1초 이상)
-        if not audio_bytes or len(audio_bytes) < 1000:  # 대략 1KB 미만
-            return ""
-        
-        # 오디오 크기 제한 (최대 30초 - 약 500KB)
-        MAX_SIZE = 500000  # 500KB
-        if len(audio_bytes) > MAX_SIZE:
-            st.warning("⚠️ 녹음이 너무 깁니다. 30초 이내로 녹음해주세요.")
-            audio_bytes = audio_bytes[:MAX_SIZE]
-        
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-            tmp_file.write(audio_bytes)
-            tmp_file_path = tmp_file.name
-        
-        # 진행 표시
-        progress_text = st.empty()
-        progress_text.info("🎙️ 음성 인식 중... (5-10초 소요)")
-        
-        with open(tmp_file_path, "rb") as audio_file:
-            # response_format="text" 추가로 JSON 파싱 오버헤드 제거
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=language,
-                response_format="text",  # 속도 향상을 위해 텍스트로 직접 받기
-                prompt="중학생 모의재판 발언"  # 컨텍스트 제공으로 정확도 향상
-            )
-        
-        progress_text.empty()
-        os.unlink(tmp_file_path)
-        return transcript  # response_format="text"일 때는 직접 텍스트 반환
+        result = job.result()
     except Exception as e:
         error_msg = str(e)
         if "audio_too_short" in error_msg:
@@ -466,22 +457,27 @@ def transcribe_audio(audio_bytes, language="ko"):
         else:
             st.error(f"음성 인식 오류: {error_msg}")
         return ""
+    
+    if result.no_speech:
+        # 무음 녹음은 API를 호출하지 않고 바로 안내
+        st.warning("🔇 음성이 감지되지 않았습니다. 마이크 가까이에서 다시 녹음해주세요.")
+        return ""
+    if result.truncated:
+        st.warning(f"⚠️ 녹음이 너무 깁니다. 앞 {MAX_RECORDING_SECONDS // 60}분만 인식했습니다.")
+    st.caption(format_upload_stats(result))
+    return result.text
 
-def get_ai_judgment(prompt):
-    """AI 판결 생성"""
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "당신은 교육적이고 공정한 AI 판사입니다. 중학생 수준에 맞춰 친근하게 설명합니다."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"""
+# 판결 형식 - 사건 개요 바로 뒤, 라운드 발언 앞에 들어감
+JUDGMENT_INSTRUCTIONS = """
+1. 🏆 승리 팀과 이유
+2. 👍 각 팀의 잘한 점 (2개씩)
+3. 💡 개선할 점 (각 팀 1개씩)
+4. 🌟 베스트 발언자
+5. 📈 점수: 검사팀 ?점, 변호팀 ?점 (100점 만점)
+"""
+
+# 응답 실패 시 보여 줄 기본 판결
+FALLBACK_JUDGMENT = """
         🏆 판결 결과
         
         양 팀 모두 훌륭한 논증을 보여주었습니다.
@@ -495,6 +491,24 @@ def get_ai_judgment(prompt):
         - 가치어를 더 많이 사용하세요
         """
 
+def get_ai_judgment(prompt, refresh=False):
+    """AI 판결 생성 - 토큰 단위로 바로 화면에 출력, 같은 토론 내용이면 저장된 판결 재사용"""
+    return stream_judgment(
+        client,
+        prompt,
+        model="gpt-4",
+        system_prompt="당신은 교육적이고 공정한 AI 판사입니다. 중학생 수준에 맞춰 친근하게 설명합니다.",
+        fallback=FALLBACK_JUDGMENT,
+        max_tokens=1000,
+        temperature=0.7,
+        cache=get_judgment_cache(),
+        refresh=refresh,
+        # 응답이 늦으면 먼저 보여 주고, 실패하면 기본 판결 대신 사용
+        local_verdict=build_local_verdict(st.session_state.rounds),
+        # 판결 재사용은 프롬프트(라운드 평가 포함)가 아니라 토론 내용 기준
+        debate=(st.session_state.case_summary, st.session_state.rounds)
+    )
+
 # ===== 메인 UI =====
 
 # 헤더
@@ -641,24 +655,29 @@ if st.session_state.mode == 'simple':
                     key=f"pros_audio_{round_num}"
                 )
             with col_rec2:
-                if audio and len(audio) > 1000:
+                if audio:
                     st.success("✅ 녹음 완료")
                 else:
                     st.info("⏸️ 대기중")
             
-            # 새로운 오디오인지 확인
-            if audio and len(audio) > 1000:  # 최소 1KB 이상의 오디오만 처리
-                # 이전 오디오와 다른 경우만 처리
-                if st.session_state.last_audio_pros != audio:
-                    st.session_state.last_audio_pros = audio
-                    with st.spinner("음성 인식 중..."):
-                        text = transcribe_audio(audio)
-                        if text and len(text.strip()) > 0:  # 실제 텍스트가 있을 때만
-                            st.session_state.rounds[round_num-1]['prosecutor'] = text
-                            create_quick_feedback(text, 'prosecutor')
-                            st.session_state.speech_count['prosecutor'] += 1
-                            st.session_state.combo['prosecutor'] += 1
-                            check_badges('prosecutor')
+            # 새 녹음인지 지문으로 확인 (무음 여부는 음성 인식 단계에서 판단)
+            if is_new_recording(f"pros_audio_{round_num}", audio):
+                # 기다리지 않고 백그라운드로 인식 - 상대 팀 화면이 멈추지 않음
+                transcribe_audio(audio, 'prosecutor', round_num)
+                # 원본 오디오는 파이프라인에 넘긴 뒤 바로 놓아 줌
+                del audio
+            
+            # 끝난 음성 인식 결과 반영
+            for job in collect_transcriptions('prosecutor'):
+                text = read_transcription(job)
+                if text and len(text.strip()) > 0:  # 실제 텍스트가 있을 때만
+                    st.session_state.rounds[job.round_num-1]['prosecutor'] = text
+                    create_quick_feedback(text, 'prosecutor')
+                    st.session_state.speech_count['prosecutor'] += 1
+                    st.session_state.combo['prosecutor'] += 1
+                    check_badges('prosecutor')
+            if pending_transcriptions('prosecutor'):
+                show_transcription_status('prosecutor', client)
             
             # 텍스트 입력 섹션
             st.markdown("**✍️ 텍스트 입력**")
@@ -719,24 +738,29 @@ if st.session_state.mode == 'simple':
                     key=f"def_audio_{round_num}"
                 )
             with col_rec2:
-                if audio and len(audio) > 1000:
+                if audio:
                     st.success("✅ 녹음 완료")
                 else:
                     st.info("⏸️ 대기중")
             
-            # 새로운 오디오인지 확인
-            if audio and len(audio) > 1000:  # 최소 1KB 이상의 오디오만 처리
-                # 이전 오디오와 다른 경우만 처리
-                if st.session_state.last_audio_def != audio:
-                    st.session_state.last_audio_def = audio
-                    with st.spinner("음성 인식 중..."):
-                        text = transcribe_audio(audio)
-                        if text and len(text.strip()) > 0:  # 실제 텍스트가 있을 때만
-                            st.session_state.rounds[round_num-1]['defender'] = text
-                            create_quick_feedback(text, 'defender')
-                            st.session_state.speech_count['defender'] += 1
-                            st.session_state.combo['defender'] += 1
-                            check_badges('defender')
+            # 새 녹음인지 지문으로 확인 (무음 여부는 음성 인식 단계에서 판단)
+            if is_new_recording(f"def_audio_{round_num}", audio):
+                # 기다리지 않고 백그라운드로 인식 - 상대 팀 화면이 멈추지 않음
+                transcribe_audio(audio, 'defender', round_num)
+                # 원본 오디오는 파이프라인에 넘긴 뒤 바로 놓아 줌
+                del audio
+            
+            # 끝난 음성 인식 결과 반영
+            for job in collect_transcriptions('defender'):
+                text = read_transcription(job)
+                if text and len(text.strip()) > 0:  # 실제 텍스트가 있을 때만
+                    st.session_state.rounds[job.round_num-1]['defender'] = text
+                    create_quick_feedback(text, 'defender')
+                    st.session_state.speech_count['defender'] += 1
+                    st.session_state.combo['defender'] += 1
+                    check_badges('defender')
+            if pending_transcriptions('defender'):
+                show_transcription_status('defender', client)
             
             # 텍스트 입력 섹션
             st.markdown("**✍️ 텍스트 입력**")
@@ -775,42 +799,53 @@ if st.session_state.mode == 'simple':
         3. 10-15초 정도 기다리면 판결문이 나타납니다
         """)
         
-        if st.button("🤖 AI 판사에게 판결 요청", type="primary", use_container_width=True):
-            with st.spinner("AI 판사가 신중하게 검토 중입니다..."):
-                # 프롬프트 생성
-                prompt = f"""
-                중학생 모의재판을 평가해주세요.
-                
-                [사건 개요]
-                {st.session_state.case_summary}
-                
-                [토론 내용]
-                """
-                
-                for i, round_data in enumerate(st.session_state.rounds):
-                    if round_data['prosecutor'] or round_data['defender']:
-                        prompt += f"\n라운드 {i+1}:\n"
-                        if round_data['prosecutor']:
-                            prompt += f"검사: {round_data['prosecutor']}\n"
-                        if round_data['defender']:
-                            prompt += f"변호: {round_data['defender']}\n"
-                
-                prompt += """
-                
-                다음 형식으로 판결해주세요:
-                1. 🏆 승리 팀과 이유
-                2. 👍 각 팀의 잘한 점 (2개씩)
-                3. 💡 개선할 점 (각 팀 1개씩)
-                4. 🌟 베스트 발언자
-                5. 📈 점수: 검사팀 ?점, 변호팀 ?점 (100점 만점)
-                """
-                
-                judgment = get_ai_judgment(prompt)
-                st.session_state.ai_judgment = judgment
+        judgment_streamed = False
+        col_req, col_re = st.columns([3, 1])
+        with col_req:
+            # 판결이 아직 생성 중이면 버튼으로 알려 주고, 누르면 진행 중인 판결을 이어서 받음
+            pending = judgment_pending()
+            request_judgment = st.button(
+                "⏳ 판결 생성 중... (눌러서 이어 보기)" if pending else "🤖 AI 판사에게 판결 요청",
+                type="secondary" if pending else "primary",
+                use_container_width=True,
+                key="request_judgment"  # 문구가 바뀌어도 같은 버튼으로 (생성 중 누른 클릭 유지)
+            )
+        with col_re:
+            # 교사용 - 저장된 판결 대신 새 판결 받기
+            rejudge = st.button(
+                "🔄 다시 판결",
+                use_container_width=True,
+                disabled=not st.session_state.ai_judgment or pending,
+                help="같은 내용으로 저장된 판결을 무시하고 새로 판결을 받습니다."
+            )
+        # 라운드 평가 요청 - 판결 요청 전에 진행 상황 표시
+        collect_round_evaluations(
+            round_evaluator, st.session_state.case_summary, st.session_state.rounds
+        )
+        show_round_evaluation_status(round_evaluator, st.session_state.rounds)
+        if request_judgment or rejudge:
+            # 프롬프트 생성 - 토큰 예산을 넘으면 긴 발언부터 핵심 문장만 남김
+            # (사전 평가는 모든 라운드 평가가 끝났을 때만 쓰고, 같은 토론이면 만든 프롬프트를 다시 씀)
+            prompt, report = round_evaluated_prompt(
+                round_evaluator, st.session_state.case_summary, st.session_state.rounds,
+                lambda round_evals: build_judgment_prompt(
+                    st.session_state.case_summary,
+                    st.session_state.rounds,
+                    JUDGMENT_INSTRUCTIONS,
+                    round_evals=round_evals
+                )
+            )
+            record_prompt_report(report)
+            
+            # 판결문이 만들어지는 대로 바로 표시
+            judgment = get_ai_judgment(prompt, refresh=rejudge)
+            st.session_state.ai_judgment = judgment
+            judgment_streamed = True
+            if judgment:
                 st.balloons()
         
-        # 판결 표시
-        if st.session_state.ai_judgment:
+        # 판결 표시 (방금 스트리밍으로 보여 준 경우 제외)
+        if st.session_state.ai_judgment and not judgment_streamed:
             st.markdown("""
             <div style='background: linear-gradient(135deg, #fdfbfb 0%, #ebedee 100%);
                         padding: 2rem;
@@ -856,6 +891,10 @@ if st.session_state.mode == 'simple':
                 for b in badges:
                     st.write(f"{BADGES[b]['icon']} {BADGES[b]['name']}")
         
+        # 이번 수업과 학급의 API 사용량
+        st.markdown("---")
+        show_usage_summary()
+        
         # 저장
         st.markdown("---")
         save_data = {
@@ -863,8 +902,10 @@ if st.session_state.mode == 'simple':
             "case": st.session_state.case_summary,
             "rounds": st.session_state.rounds,
             "judgment": st.session_state.ai_judgment,
+            "judgment_meta": st.session_state.get('judgment_meta'),
             "scores": st.session_state.points,
-            "badges": st.session_state.badges
+            "badges": st.session_state.badges,
+            "usage": session_usage()
         }
         
         st.download_button(
@@ -891,8 +932,12 @@ else:
     # 기존 코드 유지...
     st.info("상세 모드는 기존 app.py의 전체 기능을 포함합니다.")
 
+# 발언이 모두 저장된 라운드는 판결 전에 백그라운드에서 미리 평가
+collect_round_evaluations(round_evaluator, st.session_state.case_summary, st.session_state.rounds)
+
 # 사이드바
 with st.sidebar:
+    show_class_selector()
     st.markdown("## 💡 도움말")
     
     with st.expander("🚀 간편 모드 사용법"):
@@ -911,5 +956,16 @@ with st.sidebar:
         for level in LEVEL_SYSTEM:
             st.write(f"{level['title']}: {level['min']}-{level['max']}점")
     
+    with st.expander("🗄️ 캐시 현황"):
+        show_cache_stats(get_transcript_cache(), "음성 인식 결과 재사용")
+        show_cache_stats(get_judgment_cache(), "판결 재사용")
+    
+    if is_admin():
+        with st.expander("🛠️ 판결 응답 속도 (관리자)"):
+            show_judgment_metrics()
+            show_reactor_status(client)
+            show_prompt_report()
+            show_ops_link()
+    
     st.markdown("---")
     st.info("💬 문의: 금천중학교")
\ No newline at end of file
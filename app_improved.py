@@ -5,17 +5,31 @@ AI 모의재판 시스템 - 개선된 버전
 
 import streamlit as st
 import os
-from openai import OpenAI
-import tempfile
+from openai_client import get_openai_client
 from audio_recorder_streamlit import audio_recorder
 from datetime import datetime
-import json
 import time
 from utils import (
     init_gamification, add_points, check_badges, get_level,
     create_team_dashboard, create_versus_display, save_session_data,
     load_sample_case, create_quick_feedback, format_time_korean,
-    SAMPLE_CASES, generate_ai_hint
+    SAMPLE_CASES, generate_ai_hint, show_cache_stats, is_new_recording,
+    queue_transcription, collect_transcriptions, pending_transcriptions,
+    show_transcription_status
+)
+from judgment import (
+    stream_judgment, get_judgment_cache, judgment_pending, speculate_judgment, cancel_speculation
+)
+from local_verdict import build_local_verdict
+from round_evaluation import (
+    get_round_evaluator, collect_round_evaluations, final_round_evaluations,
+    wait_round_evaluations, round_evaluated_prompt, show_round_evaluation_status
+)
+from admin import is_admin, show_judgment_metrics, show_reactor_status, show_prompt_report, show_ops_link
+from prompt_builder import build_judgment_prompt, record_prompt_report, debate_snapshot, pin_prompt
+from usage_budget import show_class_selector
+from transcription import (
+    format_upload_stats, get_asr_backend, get_transcript_cache, MAX_RECORDING_SECONDS
 )
 
 # 페이지 설정
@@ -96,8 +110,9 @@ if not api_key:
         st.info("💡 Streamlit Cloud Settings > Secrets에서 설정하세요.")
         st.stop()
 
-# OpenAI 클라이언트
-client = OpenAI(api_key=api_key)
+# OpenAI 클라이언트 - 프로세스 전체에서 하나를 공유 (재실행마다 새 연결을 맺지 않음)
+client = get_openai_client(api_key)
+round_evaluator = get_round_evaluator(client)
 
 # 세션 초기화
 if 'initialized' not in st.session_state:
@@ -116,42 +131,45 @@ if 'initialized' not in st.session_state:
     st.session_state.round_time_limit = 150  # 2.5분
     init_gamification()
 
-# 음성 인식 함수
-def transcribe_audio(audio_bytes, language="ko"):
+# 음성 인식 함수 - 공유 작업 큐에 넣고 바로 반환
+def transcribe_audio(audio_bytes, team, round_num, language="ko"):
+    return queue_transcription(
+        team, round_num, get_asr_backend(client), audio_bytes, language,
+        cache=get_transcript_cache()
+    )
+
+# 끝난 음성 인식 작업의 텍스트
+def read_transcription(job):
     try:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-            tmp_file.write(audio_bytes)
-            tmp_file_path = tmp_file.name
-        
-        with open(tmp_file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=language
-            )
-        
-        os.unlink(tmp_file_path)
-        return transcript.text
+        result = job.result()
     except Exception as e:
         st.error(f"음성 인식 오류: {str(e)}")
         return ""
+    if result.no_speech:
+        st.warning("🔇 음성이 감지되지 않았습니다. 다시 녹음해주세요.")
+        return ""
+    if result.truncated:
+        st.warning(f"⚠️ 녹음이 너무 깁니다. 앞 {MAX_RECORDING_SECONDS // 60}분만 인식했습니다.")
+    st.caption(format_upload_stats(result))
+    return result.text
 
-# AI 판결 생성
-def get_ai_judgment(prompt):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "당신은 교육적이고 공정한 AI 판사입니다. 중학생 수준에 맞춰 친근하고 이해하기 쉽게 설명합니다."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        # 폴백: 간단한 템플릿 판결
-        return f"""
+# 판결 모델과 판사 역할
+JUDGMENT_MODEL = "gpt-4"
+JUDGMENT_SYSTEM_PROMPT = "당신은 교육적이고 공정한 AI 판사입니다. 중학생 수준에 맞춰 친근하고 이해하기 쉽게 설명합니다."
+# 마지막 라운드 발언이 모두 저장되면 판결 버튼을 누르기 전에 미리 판결 시작 (0이면 끔)
+SPECULATIVE_JUDGMENT = os.getenv("SPECULATIVE_JUDGMENT", "1") != "0"
+
+# 판결 형식 - 사건 개요 바로 뒤, 라운드 발언 앞에 들어감
+JUDGMENT_INSTRUCTIONS = """
+1. 🏆 승리 팀과 이유 (간단히)
+2. 👍 각 팀의 잘한 점 (2개씩)
+3. 💡 개선할 점 (각 팀 1개씩)
+4. 🌟 베스트 발언자
+5. 📈 점수: 검사팀 ?점, 변호팀 ?점 (100점 만점)
+"""
+
+# 응답 실패 시 보여 줄 기본 판결
+FALLBACK_JUDGMENT = """
         🏆 판결 결과
         
         양 팀 모두 훌륭한 논증을 보여주었습니다.
@@ -163,10 +181,67 @@ def get_ai_judgment(prompt):
         - 구체적인 증거를 더 많이 제시하세요
         - 상대방 주장을 직접 반박하세요
         - 가치어를 더 많이 사용하세요
-        
-        오류: {str(e)}
         """
 
+# AI 판결 생성 - 토큰 단위로 바로 화면에 출력, 같은 토론 내용이면 저장된 판결 재사용
+def get_ai_judgment(prompt, refresh=False):
+    return stream_judgment(
+        client,
+        prompt,
+        model=JUDGMENT_MODEL,
+        system_prompt=JUDGMENT_SYSTEM_PROMPT,
+        fallback=FALLBACK_JUDGMENT,
+        max_tokens=1000,
+        temperature=0.7,
+        cache=get_judgment_cache(),
+        refresh=refresh,
+        # 응답이 늦으면 먼저 보여 주고, 실패하면 기본 판결 대신 사용
+        local_verdict=build_local_verdict(st.session_state.rounds),
+        # 판결 재사용은 프롬프트(라운드 평가 포함)가 아니라 토론 내용 기준
+        debate=(st.session_state.case_summary, st.session_state.rounds)
+    )
+
+# 판결 프롬프트 생성 - 라운드 평가는 모든 라운드 평가가 끝났을 때만 함께 전달
+def build_prompt(round_evals):
+    return build_judgment_prompt(
+        st.session_state.case_summary,
+        st.session_state.rounds,
+        JUDGMENT_INSTRUCTIONS,
+        round_evals=round_evals
+    )
+
+# 미리 판결 - 마지막 라운드 두 발언이 저장되면 시작, 그 뒤 라운드를 고치면 버리고 다시 시작
+def sync_speculative_judgment():
+    speculation = st.session_state.get('speculation')
+    # 판결에 들어가는 토론 내용 - 이것이 바뀌면 미리 시작한 판결은 버림
+    snapshot = debate_snapshot(st.session_state.case_summary, st.session_state.rounds)
+    if speculation and speculation['snapshot'] != snapshot:
+        cancel_speculation(speculation['key'])
+        speculation = st.session_state.speculation = None
+    last_round = st.session_state.rounds[-1]
+    if speculation or not (SPECULATIVE_JUDGMENT and st.session_state.case_summary
+                           and last_round['prosecutor'] and last_round['defender']):
+        return speculation
+    # 라운드 평가가 아직 진행 중이면 기다리지 않고, 평가가 끝나 다시 실행될 때 시작
+    round_evals = final_round_evaluations(
+        round_evaluator, st.session_state.case_summary, st.session_state.rounds, timeout=0
+    )
+    if round_evals is None:
+        wait_round_evaluations(round_evaluator, st.session_state.case_summary, st.session_state.rounds)
+        return None
+    prompt, report = build_prompt(round_evals)
+    pin_prompt(snapshot, prompt, report)
+    key = speculate_judgment(
+        client, prompt, JUDGMENT_MODEL, JUDGMENT_SYSTEM_PROMPT,
+        max_tokens=1000, temperature=0.7, cache=get_judgment_cache(),
+        debate=(st.session_state.case_summary, st.session_state.rounds)
+    )
+    if key:
+        st.session_state.speculation = {
+            'snapshot': snapshot, 'key': key, 'prompt': prompt, 'report': report
+        }
+    return st.session_state.get('speculation')
+
 # 메인 헤더
 st.markdown("<h1 style='text-align: center;'>⚖️ AI 판사 모의재판</h1>", unsafe_allow_html=True)
 
@@ -287,19 +362,26 @@ if st.session_state.mode == 'simple':
                 key=f"pros_audio_{round_num}"
             )
             
-            if audio:
-                with st.spinner("음성 인식 중..."):
-                    text = transcribe_audio(audio)
-                    if text:
-                        st.session_state.rounds[round_num-1]['prosecutor'] = text
-                        score = create_quick_feedback(text, 'prosecutor')
-                        st.session_state.speech_count['prosecutor'] += 1
-                        st.session_state.combo['prosecutor'] += 1
-                        badges = check_badges('prosecutor')
-                        if badges:
-                            st.balloons()
-                            for badge in badges:
-                                st.success(f"{badge['icon']} {badge['name']} 획득!")
+            # 재실행마다 다시 인식하지 않도록 새 녹음만 처리
+            if is_new_recording(f"pros_audio_{round_num}", audio):
+                transcribe_audio(audio, 'prosecutor', round_num)
+                del audio  # 원본 오디오는 세션에 남기지 않음
+            
+            # 끝난 음성 인식 결과 반영
+            for job in collect_transcriptions('prosecutor'):
+                text = read_transcription(job)
+                if text:
+                    st.session_state.rounds[job.round_num-1]['prosecutor'] = text
+                    score = create_quick_feedback(text, 'prosecutor')
+                    st.session_state.speech_count['prosecutor'] += 1
+                    st.session_state.combo['prosecutor'] += 1
+                    badges = check_badges('prosecutor')
+                    if badges:
+                        st.balloons()
+                        for badge in badges:
+                            st.success(f"{badge['icon']} {badge['name']} 획득!")
+            if pending_transcriptions('prosecutor'):
+                show_transcription_status('prosecutor', client)
             
             # 텍스트 입력
             prosecutor_text = st.text_area(
@@ -328,19 +410,26 @@ if st.session_state.mode == 'simple':
                 key=f"def_audio_{round_num}"
             )
             
-            if audio:
-                with st.spinner("음성 인식 중..."):
-                    text = transcribe_audio(audio)
-                    if text:
-                        st.session_state.rounds[round_num-1]['defender'] = text
-                        score = create_quick_feedback(text, 'defender')
-                        st.session_state.speech_count['defender'] += 1
-                        st.session_state.combo['defender'] += 1
-                        badges = check_badges('defender')
-                        if badges:
-                            st.balloons()
-                            for badge in badges:
-                                st.success(f"{badge['icon']} {badge['name']} 획득!")
+            # 재실행마다 다시 인식하지 않도록 새 녹음만 처리
+            if is_new_recording(f"def_audio_{round_num}", audio):
+                transcribe_audio(audio, 'defender', round_num)
+                del audio  # 원본 오디오는 세션에 남기지 않음
+            
+            # 끝난 음성 인식 결과 반영
+            for job in collect_transcriptions('defender'):
+                text = read_transcription(job)
+                if text:
+                    st.session_state.rounds[job.round_num-1]['defender'] = text
+                    score = create_quick_feedback(text, 'defender')
+                    st.session_state.speech_count['defender'] += 1
+                    st.session_state.combo['defender'] += 1
+                    badges = check_badges('defender')
+                    if badges:
+                        st.balloons()
+                        for badge in badges:
+                            st.success(f"{badge['icon']} {badge['name']} 획득!")
+            if pending_transcriptions('defender'):
+                show_transcription_status('defender', client)
             
             # 텍스트 입력
             defender_text = st.text_area(
@@ -355,6 +444,9 @@ if st.session_state.mode == 'simple':
                 if defender_text:
                     create_quick_feedback(defender_text, 'defender')
         
+        # 마지막 라운드가 끝났으면 판결 미리 시작
+        sync_speculative_judgment()
+        
         # 라운드 네비게이션
         st.markdown("---")
         col1, col2, col3 = st.columns(3)
@@ -376,60 +468,63 @@ if st.session_state.mode == 'simple':
                     st.session_state.combo['defender'] = 0
                     st.rerun()
             else:
-                if st.button("🤖 AI 판결 요청", type="primary"):
+                # 판결이 아직 생성 중이면 버튼으로 알려 주고, 누르면 진행 중인 판결을 이어서 받음
+                pending = judgment_pending()
+                if st.button("⏳ 판결 생성 중... (눌러서 이어 보기)" if pending else "🤖 AI 판결 요청",
+                             type="secondary" if pending else "primary",
+                             key="request_judgment"):  # 문구가 바뀌어도 같은 버튼으로 (생성 중 누른 클릭 유지)
                     st.session_state.current_phase = 'judgment'
                     st.rerun()
     
     elif st.session_state.current_phase == 'judgment':
         st.markdown("## 🤖 STEP 3: AI 판결 (5분)")
         
-        # 판결 생성
+        # 판결 생성 - 판결문이 만들어지는 대로 바로 표시
+        judgment_streamed = False
         if not st.session_state.ai_judgment:
-            with st.spinner("AI 판사가 신중하게 검토 중입니다..."):
-                # 프롬프트 생성
-                prompt = f"""
-                중학생 모의재판을 평가해주세요.
-                
-                [사건 개요]
-                {st.session_state.case_summary}
-                
-                [토론 내용]
-                """
-                
-                for i, round_data in enumerate(st.session_state.rounds):
-                    if round_data['prosecutor'] or round_data['defender']:
-                        prompt += f"\n라운드 {i+1}:\n"
-                        if round_data['prosecutor']:
-                            prompt += f"검사: {round_data['prosecutor']}\n"
-                        if round_data['defender']:
-                            prompt += f"변호: {round_data['defender']}\n"
-                
-                prompt += """
-                
-                다음 형식으로 판결해주세요:
-                1. 🏆 승리 팀과 이유 (간단히)
-                2. 👍 각 팀의 잘한 점 (2개씩)
-                3. 💡 개선할 점 (각 팀 1개씩)
-                4. 🌟 베스트 발언자
-                5. 📈 점수: 검사팀 ?점, 변호팀 ?점 (100점 만점)
-                """
-                
-                judgment = get_ai_judgment(prompt)
-                st.session_state.ai_judgment = judgment
-        
-        # 판결 표시
-        st.markdown("""
-        <div style='background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-                    padding: 2rem;
-                    border-radius: 20px;
-                    box-shadow: 0 10px 40px rgba(0,0,0,0.2);'>
-        """, unsafe_allow_html=True)
+            # 토론 내용이 그대로면 미리 시작한 판결과 같은 프롬프트를 써야 그 결과를 이어 받음
+            speculation = sync_speculative_judgment()
+            if speculation:
+                prompt, report = speculation['prompt'], speculation['report']
+            else:
+                # 프롬프트 생성 - 토큰 예산을 넘으면 긴 발언부터 핵심 문장만 남김
+                prompt, report = round_evaluated_prompt(
+                    round_evaluator, st.session_state.case_summary, st.session_state.rounds,
+                    build_prompt
+                )
+            show_round_evaluation_status(round_evaluator, st.session_state.rounds)
+            record_prompt_report(report)
+            
+            refresh = st.session_state.pop('force_rejudge', False)
+            judgment = get_ai_judgment(prompt, refresh=refresh)
+            st.session_state.ai_judgment = judgment
+            judgment_streamed = True
         
-        st.markdown(st.session_state.ai_judgment)
+        # 판결 표시 (방금 스트리밍으로 보여 준 경우 제외)
+        if not judgment_streamed:
+            st.markdown("""
+            <div style='background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
+                        padding: 2rem;
+                        border-radius: 20px;
+                        box-shadow: 0 10px 40px rgba(0,0,0,0.2);'>
+            """, unsafe_allow_html=True)
+            
+            st.markdown(st.session_state.ai_judgment)
+            
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        st.markdown("</div>", unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            # 교사용 - 저장된 판결 대신 새 판결 받기
+            if st.button("🔄 다시 판결", use_container_width=True,
+                         help="같은 내용으로 저장된 판결을 무시하고 새로 판결을 받습니다."):
+                st.session_state.ai_judgment = ''
+                st.session_state.force_rejudge = True
+                st.rerun()
+        with col2:
+            show_review = st.button("📊 결과 분석 보기", use_container_width=True)
         
-        if st.button("📊 결과 분석 보기", use_container_width=True):
+        if show_review:
             st.session_state.current_phase = 'review'
             st.rerun()
     
@@ -489,8 +584,12 @@ if st.session_state.mode == 'simple':
                 st.session_state.initialized = False
                 st.rerun()
 
+# 발언이 모두 저장된 라운드는 판결 전에 백그라운드에서 미리 평가
+collect_round_evaluations(round_evaluator, st.session_state.case_summary, st.session_state.rounds)
+
 # 사이드바 - 도움말
 with st.sidebar:
+    show_class_selector()
     st.markdown("## 💡 빠른 도움말")
     
     with st.expander("🚀 간편 모드 사용법"):
@@ -521,5 +620,16 @@ with st.sidebar:
         - Lv.5 👑 전설의 변호사 (501점+)
         """)
     
+    with st.expander("🗄️ 캐시 현황"):
+        show_cache_stats(get_transcript_cache(), "음성 인식 결과 재사용")
+        show_cache_stats(get_judgment_cache(), "판결 재사용")
+    
+    if is_admin():
+        with st.expander("🛠️ 판결 응답 속도 (관리자)"):
+            show_judgment_metrics()
+            show_reactor_status(client)
+            show_prompt_report()
+            show_ops_link()
+    
     st.markdown("---")
     st.info("💬 문의: 금천중학교 교사")
\ No newline at end of file
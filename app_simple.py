@@ -5,10 +5,18 @@ AI 모의재판 - 경량화 버전 (텍스트 입력 중심)
 
 import streamlit as st
 import os
-from openai import OpenAI
+from openai_client import get_openai_client
 from datetime import datetime
 import json
 from dotenv import load_dotenv
+from judgment import stream_judgment, get_judgment_cache, judgment_pending
+from local_verdict import build_local_verdict
+from round_evaluation import (
+    get_round_evaluator, collect_round_evaluations, round_evaluated_prompt, show_round_evaluation_status
+)
+from admin import is_admin, show_judgment_metrics, show_reactor_status, show_prompt_report, show_ops_link
+from prompt_builder import build_judgment_prompt, record_prompt_report
+from usage_budget import show_class_selector
 
 # 환경변수 로드
 load_dotenv()
@@ -52,7 +60,21 @@ if not api_key:
         st.error("⚠️ API 키를 설정해주세요!")
         st.stop()
 
-client = OpenAI(api_key=api_key)
+# 프로세스 전체에서 하나를 공유 (재실행마다 새 연결을 맺지 않음)
+client = get_openai_client(api_key)
+round_evaluator = get_round_evaluator(client)
+
+# 응답 실패 시 보여 줄 기본 판결
+FALLBACK_JUDGMENT = """
+                    🏆 판결 결과
+                    
+                    양 팀 모두 좋은 논증을 보여주었습니다.
+                    
+                    - 검사팀: 규칙의 중요성을 잘 설명했습니다.
+                    - 변호팀: 상황적 맥락을 잘 제시했습니다.
+                    
+                    더 구체적인 증거와 논리적 연결이 필요합니다.
+                    """
 
 # 세션 초기화
 if 'rounds' not in st.session_state:
@@ -135,45 +157,63 @@ with tab2:
 with tab3:
     st.header("AI 판결")
     
-    if st.button("🤖 판결 요청", type="primary", use_container_width=True):
+    judgment_streamed = False
+    # 교사용 - 저장된 판결 대신 새 판결 받기
+    rejudge = st.checkbox(
+        "🔄 다시 판결 (저장된 판결 무시)",
+        help="같은 내용으로 저장된 판결이 있어도 새로 판결을 받습니다."
+    )
+    # 발언이 모두 들어간 라운드는 미리 평가해 두고 판결에 함께 전달
+    collect_round_evaluations(
+        round_evaluator, st.session_state.case, st.session_state.rounds
+    )
+    show_round_evaluation_status(round_evaluator, st.session_state.rounds)
+    # 판결이 아직 생성 중이면 버튼으로 알려 주고, 누르면 진행 중인 판결을 이어서 받음
+    pending = judgment_pending()
+    if st.button(
+        "⏳ 판결 생성 중... (눌러서 이어 보기)" if pending else "🤖 판결 요청",
+        type="secondary" if pending else "primary",
+        use_container_width=True,
+        key="request_judgment"  # 문구가 바뀌어도 같은 버튼으로 (생성 중 누른 클릭 유지)
+    ):
         if not st.session_state.rounds:
             st.error("토론 내용이 없습니다!")
         else:
-            with st.spinner("AI 판사가 검토 중..."):
-                # 프롬프트 생성
-                prompt = f"사건: {st.session_state.case}\n\n"
-                for i, r in enumerate(st.session_state.rounds):
-                    prompt += f"라운드 {i+1}:\n"
-                    prompt += f"검사: {r['prosecutor']}\n"
-                    prompt += f"변호: {r['defender']}\n\n"
-                
-                prompt += "간단하게 판결해주세요: 1) 승리팀 2) 이유 3) 피드백"
-                
-                try:
-                    response = client.chat.completions.create(
-                        model="gpt-3.5-turbo",  # 더 빠른 모델 사용
-                        messages=[
-                            {"role": "system", "content": "당신은 중학생 모의재판의 교육적인 판사입니다."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        max_tokens=500,
-                        temperature=0.7
-                    )
-                    st.session_state.judgment = response.choices[0].message.content
-                except:
-                    st.session_state.judgment = """
-                    🏆 판결 결과
-                    
-                    양 팀 모두 좋은 논증을 보여주었습니다.
-                    
-                    - 검사팀: 규칙의 중요성을 잘 설명했습니다.
-                    - 변호팀: 상황적 맥락을 잘 제시했습니다.
-                    
-                    더 구체적인 증거와 논리적 연결이 필요합니다.
-                    """
+            # 프롬프트 생성 - 토큰 예산을 넘으면 긴 발언부터 핵심 문장만 남김
+            # (사전 평가는 모든 라운드 평가가 끝났을 때만 쓰고, 같은 토론이면 만든 프롬프트를 다시 씀)
+            prompt, report = round_evaluated_prompt(
+                round_evaluator, st.session_state.case, st.session_state.rounds,
+                lambda round_evals: build_judgment_prompt(
+                    st.session_state.case,
+                    st.session_state.rounds,
+                    "간단하게 판결해주세요: 1) 승리팀 2) 이유 3) 피드백",
+                    round_evals=round_evals,
+                    intro="중학생 모의재판을 판결해주세요.",
+                    budget=1500
+                )
+            )
+            record_prompt_report(report)
+            
+            # 판결문이 만들어지는 대로 바로 표시
+            st.session_state.judgment = stream_judgment(
+                client,
+                prompt,
+                model="gpt-3.5-turbo",  # 더 빠른 모델 사용
+                system_prompt="당신은 중학생 모의재판의 교육적인 판사입니다.",
+                fallback=FALLBACK_JUDGMENT,
+                max_tokens=500,
+                temperature=0.7,
+                cache=get_judgment_cache(),
+                refresh=rejudge,
+                local_verdict=build_local_verdict(st.session_state.rounds),
+                # 판결 재사용은 프롬프트(라운드 평가 포함)가 아니라 토론 내용 기준
+                debate=(st.session_state.case, st.session_state.rounds)
+            )
+            judgment_streamed = True
     
     if st.session_state.judgment:
-        st.success(st.session_state.judgment)
+        if not judgment_streamed:
+            st.success(st.session_state.judgment)
         
         # 저장
         if st.button("💾 결과 저장"):
@@ -181,7 +221,8 @@ with tab3:
                 "date": datetime.now().isoformat(),
                 "case": st.session_state.case,
                 "rounds": st.session_state.rounds,
-                "judgment": st.session_state.judgment
+                "judgment": st.session_state.judgment,
+                "judgment_meta": st.session_state.get('judgment_meta')
             }
             st.download_button(
                 "📥 다운로드",
@@ -192,6 +233,7 @@ with tab3:
 
 # 사이드바
 with st.sidebar:
+    show_class_selector()
     st.markdown("### 💡 사용 팁")
     st.info("""
     1. 텍스트로 빠르게 입력
@@ -205,4 +247,11 @@ with st.sidebar:
     - 빠른 응답
     - 안정적 작동
     - 리소스 절약
-    """)
\ No newline at end of file
+    """)
+    
+    if is_admin():
+        with st.expander("🛠️ 판결 응답 속도 (관리자)"):
+            show_judgment_metrics()
+            show_reactor_status(client)
+            show_prompt_report()
+            show_ops_link()
@@ -0,0 +1,301 @@
+"""
+음성 인식 엔진 모음
+OpenAI Whisper API, 로컬 CPU 엔진(faster-whisper), 테스트용 고정 엔진과 자동 전환
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from audio_utils import NamedAudioBuffer, compress_segment
+
+# 로컬 엔진은 faster-whisper가 설치된 경우에만 사용 가능
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+# 배포마다 선택 - 쉼표로 여러 개를 적으면 앞에서부터 시도 (예: "openai,local")
+ASR_BACKEND = os.getenv("ASR_BACKEND", "openai")
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "small")
+# 평균 응답 시간이 이보다 길어지면 잠시 다음 엔진을 먼저 사용
+FALLBACK_LATENCY_SECONDS = 15
+# 느리거나 실패한 엔진을 뒤로 미루는 시간
+FALLBACK_COOLDOWN_SECONDS = 60
+
+
+class ASRBackend:
+    """음성 인식 엔진 기본 클래스
+
+    transcribe()는 (헤더, 데이터) WAV 조각과 WavInfo를 받아
+    (텍스트, 전송 바이트, 실제 사용한 엔진 이름)을 반환함.
+    WAV가 아닌 원본은 info 없이 바이트 그대로 전달됨.
+    submit()은 같은 결과를 담은 Future를 바로 반환함
+    """
+
+    name = "base"
+
+    @property
+    def cache_namespace(self):
+        """캐시 키에 넣을 엔진 구분자 - 엔진마다 결과 품질이 달라 섞지 않음"""
+        return self.name
+
+    @property
+    def cache_namespaces(self):
+        """캐시에서 찾아볼 엔진 구분자 (앞쪽 엔진 결과 우선)"""
+        return [self.cache_namespace]
+
+    def served_namespace(self, served):
+        """served(결과를 만든 엔진 이름, 쉼표로 이음) 결과를 저장할 구분자 - None이면 저장하지 않음"""
+        return self.cache_namespace
+
+    def engine_model(self, engine):
+        """transcribe()가 돌려준 엔진 이름의 모델 이름 - 사용량/비용 기록용 (예: openai → whisper-1)"""
+        return getattr(self, "model", None) or self.name
+
+    def transcribe(self, parts, info, language, prompt):
+        raise NotImplementedError
+
+    def submit(self, executor, parts, info, language, prompt):
+        """기본은 스레드 풀에서 transcribe() 실행"""
+        return executor.submit(self.transcribe, parts, info, language, prompt)
+
+
+class OpenAIWhisperBackend(ASRBackend):
+    """OpenAI Whisper API - 메모리 버퍼로 업로드, 가능하면 FLAC 압축
+
+    공유 루프 클라이언트(client.submit)가 있으면 업로드를 루프에 맡겨
+    구간별 업로드가 스레드를 하나씩 차지하지 않음
+    """
+
+    name = "openai"
+
+    def __init__(self, client, model="whisper-1", compress=True):
+        self.client = client
+        self.model = model
+        self.compress = compress
+
+    def _encode(self, parts, info):
+        """업로드할 (조각, 파일 이름) - 가능하면 FLAC 압축"""
+        name = "speech.wav"
+        if self.compress and info is not None:
+            parts, name = compress_segment(parts, info)
+        return parts, name
+
+    def _payload(self, parts, info):
+        parts, name = self._encode(parts, info)
+        return NamedAudioBuffer(parts, name=name)
+
+    def submit(self, executor, parts, info, language, prompt):
+        if not hasattr(self.client, "submit"):
+            return super().submit(executor, parts, info, language, prompt)
+        parts, name = self._encode(parts, info)
+        with NamedAudioBuffer(parts, name=name) as probe:
+            sent = len(probe)
+
+        async def upload(client):
+            # 429로 대기열에 다시 들어가면 이 코루틴이 다시 불리므로 버퍼는 시도마다 새로 만듦
+            with NamedAudioBuffer(parts, name=name) as audio_file:
+                transcript = await client.audio.transcriptions.create(
+                    model=self.model,
+                    file=audio_file,
+                    language=language,
+                    response_format="text",
+                    prompt=prompt
+                )
+            return transcript.strip(), sent, self.name
+
+        return self.client.submit(upload, "audio")
+
+    def transcribe(self, parts, info, language, prompt):
+        if hasattr(self.client, "submit"):
+            return self.submit(None, parts, info, language, prompt).result()
+        with self._payload(parts, info) as audio_file:
+            sent = len(audio_file)
+            transcript = self.client.audio.transcriptions.create(
+                model=self.model,
+                file=audio_file,
+                language=language,
+                response_format="text",  # JSON 파싱 없이 텍스트로 직접 받기
+                prompt=prompt
+            )
+        return transcript.strip(), sent, self.name
+
+
+class LocalWhisperBackend(ASRBackend):
+    """로컬 CPU 엔진 (faster-whisper) - 네트워크 없이 교실 서버에서 인식"""
+
+    name = "local"
+
+    def __init__(self, model_size=LOCAL_WHISPER_MODEL, device="cpu", compute_type="int8",
+                 num_workers=2):
+        if WhisperModel is None:
+            raise RuntimeError("faster-whisper가 설치되어 있지 않습니다. (pip install faster-whisper)")
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.num_workers = num_workers
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        """모델은 처음 쓸 때 한 번만 불러옴"""
+        with self._lock:
+            if self._model is None:
+                self._model = WhisperModel(
+                    self.model_size,
+                    device=self.device,
+                    compute_type=self.compute_type,
+                    num_workers=self.num_workers
+                )
+            return self._model
+
+    def transcribe(self, parts, info, language, prompt):
+        if info is not None and info.channels == 1 and info.sample_width == 2 \
+                and info.sample_rate == 16000:
+            # 16kHz 모노 PCM은 디코딩 없이 바로 배열로 전달
+            audio = np.frombuffer(parts[1], dtype="<i2").astype(np.float32) / 32768
+        else:
+            audio = NamedAudioBuffer(parts)
+        segments, _ = self._get_model().transcribe(
+            audio,
+            language=language,
+            initial_prompt=prompt,
+            beam_size=1
+        )
+        text = " ".join(segment.text.strip() for segment in segments)
+        return text.strip(), 0, self.name
+
+
+class StubBackend(ASRBackend):
+    """테스트용 고정 엔진 - 같은 입력이면 항상 같은 결과, 네트워크 사용 없음"""
+
+    name = "stub"
+
+    def __init__(self, text=None, delay=0.0):
+        self.text = text
+        self.delay = delay
+
+    def transcribe(self, parts, info, language, prompt):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.text is not None:
+            return self.text, 0, self.name
+        digest = hashlib.sha256()
+        for part in (parts if isinstance(parts, (list, tuple)) else [parts]):
+            digest.update(part)
+        duration = info.duration if info is not None else 0.0
+        return f"[stub {duration:.1f}초 {digest.hexdigest()[:8]}]", 0, self.name
+
+
+class FallbackBackend(ASRBackend):
+    """여러 엔진을 순서대로 시도 - 실패하거나 느려진 엔진은 잠시 뒤로 미룸"""
+
+    def __init__(self, backends, latency_limit=FALLBACK_LATENCY_SECONDS,
+                 cooldown=FALLBACK_COOLDOWN_SECONDS):
+        self.backends = list(backends)
+        self.latency_limit = latency_limit
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._latency = {backend.name: None for backend in self.backends}
+        self._demoted_until = {backend.name: 0.0 for backend in self.backends}
+        self._failures = {backend.name: 0 for backend in self.backends}
+
+    @property
+    def name(self):
+        return "+".join(backend.name for backend in self.backends)
+
+    @property
+    def cache_namespaces(self):
+        return [backend.cache_namespace for backend in self.backends]
+
+    def served_namespace(self, served):
+        """실제로 인식한 엔진의 구분자 - 로컬 결과가 OpenAI 결과로 저장되지 않도록,
+        구간마다 다른 엔진이 맡은 결과는 어느 쪽으로도 저장하지 않음
+        """
+        engines = {engine for engine in served.split(",") if engine}
+        for backend in self.backends:
+            if engines == {backend.name}:
+                return backend.cache_namespace
+        return None
+
+    def engine_model(self, engine):
+        for backend in self.backends:
+            if backend.name == engine:
+                return backend.engine_model(engine)
+        return engine
+
+    def _ordered(self):
+        """지금 쓸 수 있는 엔진을 먼저, 뒤로 미룬 엔진은 마지막에"""
+        now = time.time()
+        with self._lock:
+            ready = [b for b in self.backends if self._demoted_until[b.name] <= now]
+            demoted = [b for b in self.backends if self._demoted_until[b.name] > now]
+        return ready + demoted
+
+    def _record(self, backend, elapsed=None, failed=False):
+        with self._lock:
+            if failed:
+                self._failures[backend.name] += 1
+                self._demoted_until[backend.name] = time.time() + self.cooldown
+                return
+            # 최근 응답 시간의 지수 이동 평균
+            previous = self._latency[backend.name]
+            latency = elapsed if previous is None else previous * 0.7 + elapsed * 0.3
+            self._latency[backend.name] = latency
+            if latency > self.latency_limit:
+                self._demoted_until[backend.name] = time.time() + self.cooldown
+
+    def transcribe(self, parts, info, language, prompt):
+        last_error = None
+        for backend in self._ordered():
+            started = time.perf_counter()
+            try:
+                result = backend.transcribe(parts, info, language, prompt)
+            except Exception as e:
+                self._record(backend, failed=True)
+                last_error = e
+                continue
+            self._record(backend, time.perf_counter() - started)
+            return result
+        raise last_error
+
+    def status(self):
+        """엔진별 평균 응답 시간, 실패 횟수, 뒤로 밀린 상태"""
+        now = time.time()
+        with self._lock:
+            return {
+                name: {
+                    "latency": self._latency[name],
+                    "failures": self._failures[name],
+                    "demoted": self._demoted_until[name] > now,
+                }
+                for name in self._latency
+            }
+
+
+def create_asr_backend(spec, client=None):
+    """설정 문자열로 엔진 생성 - 예: "openai", "local", "stub", "openai,local" """
+    backends = []
+    errors = []
+    for name in [part.strip() for part in spec.split(",") if part.strip()]:
+        try:
+            if name == "openai":
+                backends.append(OpenAIWhisperBackend(client))
+            elif name == "local":
+                backends.append(LocalWhisperBackend())
+            elif name == "stub":
+                backends.append(StubBackend())
+            else:
+                raise ValueError(f"알 수 없는 음성 인식 엔진: {name}")
+        except RuntimeError as e:
+            # 설치되지 않은 선택 엔진은 건너뛰고 나머지로 구성
+            errors.append(str(e))
+    if not backends:
+        raise RuntimeError("사용할 수 있는 음성 인식 엔진이 없습니다. " + " ".join(errors))
+    if len(backends) == 1:
+        return backends[0]
+    return FallbackBackend(backends)
@@ -0,0 +1,333 @@
+"""
+오디오 유틸리티 모음
+녹음 데이터를 디스크를 거치지 않고 메모리에서 바로 다루는 기능
+"""
+
+import hashlib
+import io
+import struct
+
+import numpy as np
+
+# 음성 구간 검출(VAD) 설정
+VAD_FRAME_MS = 30           # 에너지를 재는 프레임 길이
+VAD_MIN_RMS = 0.01          # 이보다 작으면 무조건 무음 (약 -40dBFS)
+VAD_NOISE_RATIO = 3.0       # 배경 소음(하위 10% 프레임) 대비 몇 배 커야 음성인지
+VAD_PAD_SECONDS = 0.25      # 음성 앞뒤로 남겨 둘 여유
+VAD_MAX_GAP_SECONDS = 1.0   # 이보다 긴 쉬는 구간은 여유만 남기고 줄임
+VAD_MIN_SPEECH_SECONDS = 0.3  # 이보다 짧으면 음성이 없는 녹음으로 판단
+
+# FLAC 압축은 soundfile이 설치된 경우에만 사용 (없으면 WAV 그대로 전송)
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+# WAV 포맷 태그
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class NamedAudioBuffer(io.RawIOBase):
+    """이름이 있는 읽기 전용 메모리 버퍼 - 녹음 바이트를 복사 없이 업로드
+
+    data는 bytes류 객체 하나 또는 (헤더, 데이터 슬라이스)처럼 여러 조각의
+    리스트일 수 있으며, 조각들은 이어 붙이지 않고 순서대로 읽힘
+    """
+
+    def __init__(self, data, name="speech.wav"):
+        super().__init__()
+        # OpenAI SDK는 파일 이름의 확장자로 형식을 판단함
+        self.name = name
+        parts = data if isinstance(data, (list, tuple)) else [data]
+        self._parts = [memoryview(part).cast("B") for part in parts]
+        self._starts = []
+        total = 0
+        for part in self._parts:
+            self._starts.append(total)
+            total += len(part)
+        self._size = total
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        """요청한 만큼 memoryview 슬라이스에서 바로 채워 넣기"""
+        if self.closed:
+            raise ValueError("닫힌 버퍼입니다.")
+        written = 0
+        wanted = len(buffer)
+        for part, start in zip(self._parts, self._starts):
+            if written >= wanted:
+                break
+            end = start + len(part)
+            if self._pos >= end:
+                continue
+            offset = self._pos - start
+            size = min(wanted - written, end - self._pos)
+            buffer[written:written + size] = part[offset:offset + size]
+            written += size
+            self._pos += size
+        return written
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._pos + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"지원하지 않는 whence 값: {whence}")
+        self._pos = max(0, position)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        """버퍼 참조 해제 - 예외가 나도 with 블록에서 항상 호출됨"""
+        if not self.closed:
+            for part in self._parts:
+                part.release()
+        super().close()
+
+
+def audio_fingerprint(audio_bytes, window=4096):
+    """녹음 지문 - 길이와 헤더/가운데/끝 구간만 해시해서 녹음 길이와 무관하게 일정한 비용
+
+    마이크 입력은 같은 길이라도 샘플 값이 매번 달라 새 녹음 판별에는 충분함
+    """
+    view = memoryview(audio_bytes)
+    size = len(view)
+    digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=16)
+    middle = max(0, size // 2 - window // 2)
+    for start in (0, middle, max(0, size - window)):
+        digest.update(view[start:start + window])
+    return digest.hexdigest()
+
+
+class WavInfo:
+    """WAV 헤더 정보 - 데이터 구간은 원본 바이트의 오프셋으로만 기억"""
+
+    def __init__(self, sample_rate, channels, sample_width, data_offset, data_size):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.data_offset = data_offset
+        self.data_size = data_size
+
+    @property
+    def frame_size(self):
+        return self.channels * self.sample_width
+
+    @property
+    def n_frames(self):
+        return self.data_size // self.frame_size
+
+    @property
+    def duration(self):
+        """재생 시간(초)"""
+        return self.n_frames / self.sample_rate
+
+
+def parse_wav(audio_bytes):
+    """RIFF 청크를 직접 따라가며 PCM WAV 헤더 해석
+
+    브라우저 녹음기는 데이터 길이를 0이나 0xFFFFFFFF로 적는 경우가 있어
+    실제 바이트 길이에 맞춰 보정함. WAV가 아니면 ValueError
+    """
+    view = memoryview(audio_bytes)
+    if len(view) < 12 or view[0:4] != b"RIFF" or view[8:12] != b"WAVE":
+        raise ValueError("WAV 형식이 아닙니다.")
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos:pos + 4])
+        chunk_size = struct.unpack_from("<I", view, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            fmt_tag, channels, sample_rate = struct.unpack_from("<HHI", view, body)
+            bits = struct.unpack_from("<H", view, body + 14)[0]
+            if fmt_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE):
+                raise ValueError(f"지원하지 않는 WAV 인코딩: {fmt_tag:#06x}")
+            fmt = (sample_rate, channels, bits // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("fmt 청크가 data 청크보다 뒤에 있습니다.")
+            available = len(view) - body
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            sample_rate, channels, sample_width = fmt
+            # 프레임 경계에 맞춰 자투리 바이트 제거
+            frame_size = channels * sample_width
+            chunk_size -= chunk_size % frame_size
+            return WavInfo(sample_rate, channels, sample_width, body, chunk_size)
+        # 청크는 2바이트 정렬
+        pos = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError("data 청크를 찾을 수 없습니다.")
+
+
+def wav_header(sample_rate, channels, sample_width, data_size):
+    """표준 44바이트 PCM WAV 헤더 생성"""
+    frame_size = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, WAVE_FORMAT_PCM, channels, sample_rate,
+        sample_rate * frame_size, frame_size, sample_width * 8,
+        b"data", data_size,
+    )
+
+
+def wav_segment(audio_bytes, info, start_frame, end_frame):
+    """프레임 구간을 (새 헤더, 데이터 슬라이스) 조각으로 반환 - 데이터는 복사하지 않음"""
+    start = info.data_offset + start_frame * info.frame_size
+    end = info.data_offset + end_frame * info.frame_size
+    data = memoryview(audio_bytes)[start:end]
+    header = wav_header(info.sample_rate, info.channels, info.sample_width, len(data))
+    return [header, data]
+
+
+def split_wav(audio_bytes, info, chunk_seconds, overlap_seconds=0.0, n_frames=None):
+    """프레임 경계 기준으로 겹치는 구간을 두고 나누기 - n_frames 이후는 버림"""
+    if n_frames is None:
+        n_frames = info.n_frames
+    chunk_frames = max(1, int(chunk_seconds * info.sample_rate))
+    overlap_frames = min(int(overlap_seconds * info.sample_rate), chunk_frames // 2)
+    step = chunk_frames - overlap_frames
+
+    segments = []
+    start = 0
+    while start < n_frames:
+        end = min(start + chunk_frames, n_frames)
+        segments.append(wav_segment(audio_bytes, info, start, end))
+        if end >= n_frames:
+            break
+        start += step
+    return segments
+
+
+def _pcm_to_float(data, sample_width):
+    """PCM 바이트를 -1.0~1.0 범위의 float 배열로 변환 (원본 버퍼는 복사하지 않고 읽음)"""
+    if sample_width == 1:
+        return (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    if sample_width == 2:
+        return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768
+    if sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        return values.astype(np.float32) / (1 << 23)
+    if sample_width == 4:
+        return np.frombuffer(data, dtype="<i4").astype(np.float32) / (1 << 31)
+    raise ValueError(f"지원하지 않는 샘플 크기: {sample_width}")
+
+
+def _resample(samples, src_rate, dst_rate):
+    """선형 보간 리샘플링 - 다운샘플링 시 이동 평균으로 간단한 저역 통과"""
+    ratio = src_rate / dst_rate
+    if ratio > 1:
+        width = int(round(ratio))
+        if width > 1:
+            kernel = np.ones(width, dtype=np.float32) / width
+            samples = np.convolve(samples, kernel, mode="same")
+    n_out = int(len(samples) / ratio)
+    positions = np.arange(n_out, dtype=np.float64) * ratio
+    return np.interp(positions, np.arange(len(samples)), samples)
+
+
+def to_speech_wav(audio_bytes, info, target_rate=16000, n_frames=None):
+    """음성 인식용 16비트 모노 WAV로 변환 (기본 16kHz)
+
+    이미 같은 형식이면 원본을 그대로 돌려주며, 원본보다 높은 샘플레이트로
+    올리지는 않음. n_frames 이후 구간은 변환하지 않음
+    """
+    if n_frames is None:
+        n_frames = info.n_frames
+    rate = min(target_rate, info.sample_rate)
+    if (info.channels == 1 and info.sample_width == 2
+            and info.sample_rate == rate and n_frames == info.n_frames):
+        return audio_bytes
+
+    start = info.data_offset
+    data = memoryview(audio_bytes)[start:start + n_frames * info.frame_size]
+    samples = _pcm_to_float(data, info.sample_width)
+    if info.channels > 1:
+        samples = samples.reshape(-1, info.channels).mean(axis=1)
+    if info.sample_rate != rate:
+        samples = _resample(samples, info.sample_rate, rate)
+
+    pcm = np.clip(samples * 32768, -32768, 32767).astype("<i2")
+    return wav_header(rate, 1, 2, pcm.nbytes) + pcm.tobytes()
+
+
+def compress_segment(parts, info):
+    """(헤더, 데이터) 조각을 FLAC로 압축 - soundfile이 없으면 WAV 그대로
+
+    반환값: (업로드할 데이터, 파일 이름)
+    """
+    if soundfile is None or info.sample_width != 2:
+        return parts, "speech.wav"
+    pcm = np.frombuffer(parts[1], dtype="<i2").reshape(-1, info.channels)
+    output = io.BytesIO()
+    soundfile.write(output, pcm, info.sample_rate, format="FLAC", subtype="PCM_16")
+    return output.getbuffer(), "speech.flac"
+
+
+def detect_speech(samples, sample_rate):
+    """에너지 기반 음성 구간 검출 - [(시작 샘플, 끝 샘플), ...] 반환"""
+    frame = max(1, int(sample_rate * VAD_FRAME_MS / 1000))
+    n = len(samples) // frame
+    if n == 0:
+        return []
+    frames = samples[:n * frame].reshape(n, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    # 녹음 전체가 말소리인 경우 하위 10%도 음성이므로 가장 큰 프레임의 절반을 상한으로 둠
+    noise_threshold = float(np.percentile(rms, 10)) * VAD_NOISE_RATIO
+    threshold = max(VAD_MIN_RMS, min(noise_threshold, float(rms.max()) * 0.5))
+    voiced = rms > threshold
+
+    # 연속된 음성 프레임을 구간으로 묶고, 짧게 쉰 구간은 하나로 합침
+    max_gap = int(VAD_MAX_GAP_SECONDS * 1000 / VAD_FRAME_MS)
+    regions = []
+    for index in np.flatnonzero(voiced):
+        if regions and index - regions[-1][1] <= max_gap:
+            regions[-1][1] = index + 1
+        else:
+            regions.append([index, index + 1])
+    return [(start * frame, end * frame) for start, end in regions]
+
+
+def trim_silence(audio_bytes, info):
+    """앞뒤 무음을 자르고 긴 쉬는 구간을 줄인 WAV 반환
+
+    반환값: (WAV 바이트, 음성 길이(초)) - 음성이 없으면 (None, 0.0).
+    16비트 모노가 아니면 손대지 않고 돌려줌
+    """
+    if info.channels != 1 or info.sample_width != 2:
+        return audio_bytes, info.duration
+
+    data = memoryview(audio_bytes)[info.data_offset:info.data_offset + info.data_size]
+    pcm = np.frombuffer(data, dtype="<i2")
+    regions = detect_speech(pcm.astype(np.float32) / 32768, info.sample_rate)
+    speech = sum(end - start for start, end in regions) / info.sample_rate
+    if speech < VAD_MIN_SPEECH_SECONDS:
+        return None, 0.0
+
+    pad = int(VAD_PAD_SECONDS * info.sample_rate)
+    spans = [(max(0, start - pad), min(len(pcm), end + pad)) for start, end in regions]
+    if len(spans) == 1 and spans[0] == (0, len(pcm)):
+        return audio_bytes, speech
+
+    trimmed = np.concatenate([pcm[start:end] for start, end in spans])
+    return wav_header(info.sample_rate, 1, 2, trimmed.nbytes) + trimmed.tobytes(), speech
@@ -0,0 +1,270 @@
+"""
+재실행 비용 벤치마크
+진입점(앱)과 단계/탭 상태마다 처음 실행(cold)과 반복 재실행(steady) 시간을 재고,
+재실행 한 번에 브라우저로 보내는 요소 수와 바이트 수를 셈. 결과를 기준값으로 저장해 두고 나빠지면 실패
+
+    python bench_rerun.py --update-baseline     # 기준값 저장 (TRIAL_CACHE_DIR, 기본 .cache/rerun_baseline.json)
+    python bench_rerun.py                       # 기준값과 비교 - 나빠진 항목이 있으면 종료 코드 1
+
+앱마다 새 프로세스에서 실행 (모듈 불러오기까지 포함한 프로세스 cold 시간을 재기 위해)
+API 요청(라운드 사전 평가 등)은 로컬 대역 서버(mock_openai.py)로 보냄
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_store import CACHE_DIR
+from mock_openai import MockConfig, start_mock_server
+
+# 실행한 위치와 상관없이 앱 캐시 폴더에 (벤치 중 앱은 임시 캐시 폴더를 쓰지만 기준값은 여기)
+BASELINE_PATH = os.path.join(CACHE_DIR, "rerun_baseline.json")
+# 시간은 기계/부하에 따라 흔들리므로 여유 있게, 요소/바이트 수는 거의 그대로라 좁게
+TIME_TOLERANCE = 0.5
+TIME_SLACK_SECONDS = 0.02
+SIZE_TOLERANCE = 0.1
+DEFAULT_REPEAT = 5
+
+CASE_TEXT = "학생 A가 급식 줄에서 새치기를 했습니다. 친구가 자리를 맡아줬다고 주장하지만 목격자들은 부인합니다."
+ROUNDS = [
+    {"id": 1, "prosecutor": "첫째, 피고는 급식 줄의 규칙을 어겼습니다. 목격자 진술이 있습니다.",
+     "defender": "피고는 친구가 자리를 맡아줬다고 믿었습니다. 오해였습니다.", "pros_time": 0, "def_time": 0},
+    {"id": 2, "prosecutor": "둘째, 다른 학생들의 권리를 침해했습니다. 공정하지 않습니다.",
+     "defender": "배가 너무 고팠고 바로 사과했습니다. 배려가 필요합니다.", "pros_time": 0, "def_time": 0},
+]
+JUDGMENT_TEXT = "1. 🏆 검사팀 승리\n2. 👍 잘한 점\n3. 💡 개선할 점\n4. 🌟 베스트 발언자\n5. 📈 점수: 검사팀 85점, 변호팀 80점"
+
+
+# --- 상태 준비 (첫 실행 뒤 세션 상태를 바꿔 원하는 단계/탭 화면으로) ---
+
+def _set(**values):
+    def apply(at):
+        for name, value in values.items():
+            at.session_state[name] = json.loads(json.dumps(value))
+    return apply
+
+
+def _full_advanced(at):
+    at.radio(key="mode_selector").set_value("📚 상세 모드")
+
+
+# 진입점별 상태 - (이름, 첫 실행 뒤 적용할 함수 또는 None)
+STATES = {
+    "app_simple.py": [
+        ("빈 화면", None),
+        ("토론 입력", _set(case=CASE_TEXT, rounds=[{"prosecutor": r["prosecutor"], "defender": r["defender"]} for r in ROUNDS])),
+        ("판결 후", _set(case=CASE_TEXT, rounds=[{"prosecutor": r["prosecutor"], "defender": r["defender"]} for r in ROUNDS],
+                         judgment=JUDGMENT_TEXT)),
+    ],
+    "app.py": [
+        ("간편 - 빈 화면", None),
+        ("간편 - 토론 입력", _set(case_summary=CASE_TEXT, rounds=ROUNDS)),
+        ("간편 - 판결 후", _set(case_summary=CASE_TEXT, rounds=ROUNDS, ai_judgment=JUDGMENT_TEXT)),
+        ("상세 모드", _full_advanced),
+    ],
+    "app_improved.py": [
+        ("준비", None),
+        ("토론", _set(case_summary=CASE_TEXT, current_phase="debate", start_time=None)),
+        ("판결", _set(case_summary=CASE_TEXT, rounds=ROUNDS, current_phase="judgment", ai_judgment=JUDGMENT_TEXT)),
+        ("결과", _set(case_summary=CASE_TEXT, rounds=ROUNDS, current_phase="review", ai_judgment=JUDGMENT_TEXT)),
+    ],
+    "app_improved_structure.py": [("기본", None)],
+    "browser_speech.py": [("기본", None)],
+}
+
+
+# --- 측정 (작업 프로세스에서 실행) ---
+
+_last_messages = []
+
+
+def _capture_messages():
+    """AppTest 재실행마다 브라우저로 보낼 메시지(ForwardMsg)를 보관하도록 연결"""
+    from streamlit.testing.v1 import local_script_runner
+
+    runner = local_script_runner.LocalScriptRunner
+    if getattr(runner.run, "_captures_messages", False):
+        return
+    original = runner.run
+
+    def run(self, *args, **kwargs):
+        tree = original(self, *args, **kwargs)
+        _last_messages[:] = list(self.forward_msgs())
+        return tree
+
+    run._captures_messages = True
+    runner.run = run
+
+
+def _message_stats():
+    """마지막 재실행의 요소 수, 레이아웃 블록 수, 직렬화 바이트 수"""
+    elements = blocks = size = 0
+    for message in _last_messages:
+        size += message.ByteSize()
+        if message.WhichOneof("type") == "delta":
+            kind = message.delta.WhichOneof("type")
+            if kind == "new_element":
+                elements += 1
+            elif kind == "add_block":
+                blocks += 1
+    return {"elements": elements, "blocks": blocks, "bytes": size}
+
+
+def bench_app(app, repeat=DEFAULT_REPEAT, timeout=60.0):
+    """앱 하나의 모든 상태 측정 - 첫 상태의 첫 실행이 프로세스 cold"""
+    from streamlit.testing.v1 import AppTest
+
+    _capture_messages()
+    result = {"app": app, "process_cold": None, "states": {}}
+    for name, prepare in STATES[app]:
+        at = AppTest.from_file(app, default_timeout=timeout)
+        started = time.perf_counter()
+        at.run()
+        cold = time.perf_counter() - started
+        if result["process_cold"] is None:
+            result["process_cold"] = cold
+        if prepare is not None:
+            prepare(at)
+            at.run()
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            at.run()
+            times.append(time.perf_counter() - started)
+        state = {
+            "cold": cold,
+            "steady": statistics.median(times),
+            "steady_max": max(times),
+            "exceptions": [str(e.value) for e in at.exception],
+        }
+        state.update(_message_stats())
+        result["states"][name] = state
+    return result
+
+
+# --- 비교/보고 (부모 프로세스) ---
+
+def run_benchmarks(apps, repeat=DEFAULT_REPEAT):
+    server = start_mock_server(config=MockConfig(latency=0.05, jitter=0.0, token_delay=0.0))
+    os.environ.update({
+        "OPENAI_API_KEY": os.environ.get("BENCH_API_KEY", "mock-key"),
+        "OPENAI_BASE_URL": server.base_url,
+        "TRIAL_CACHE_DIR": tempfile.mkdtemp(prefix="bench-cache-"),
+        "OPENAI_KEEPWARM_SECONDS": "0",
+        "STREAMLIT_LOGGER_LEVEL": os.environ.get("STREAMLIT_LOGGER_LEVEL", "error"),
+    })
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    try:
+        for app in apps:
+            # 앱끼리 서로 영향을 주지 않도록 하나씩, 매번 새 프로세스에서
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[app] = pool.submit(bench_app, app, repeat).result()
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def _worse(current, baseline, tolerance, slack=0.0):
+    return current > baseline * (1 + tolerance) + slack
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, size_tolerance=SIZE_TOLERANCE):
+    """기준값보다 나빠진 항목 목록 (기준값에 없는 앱/상태는 건너뜀)"""
+    regressions = []
+    for app, result in results.items():
+        base_app = baseline.get(app)
+        if not base_app:
+            continue
+        if _worse(result["process_cold"], base_app["process_cold"], time_tolerance, TIME_SLACK_SECONDS):
+            regressions.append(
+                f"{app} 프로세스 cold {base_app['process_cold']:.2f}→{result['process_cold']:.2f}초"
+            )
+        for name, state in result["states"].items():
+            base = base_app["states"].get(name)
+            if not base:
+                continue
+            for field in ("cold", "steady"):
+                if _worse(state[field], base[field], time_tolerance, TIME_SLACK_SECONDS):
+                    regressions.append(f"{app} [{name}] {field} {base[field]:.3f}→{state[field]:.3f}초")
+            for field in ("elements", "bytes"):
+                if _worse(state[field], base[field], size_tolerance):
+                    regressions.append(f"{app} [{name}] {field} {base[field]}→{state[field]}")
+    return regressions
+
+
+def format_results(results):
+    lines = []
+    for app, result in results.items():
+        lines.append(f"⏱️ {app} - 프로세스 cold {result['process_cold']:.2f}초")
+        for name, state in result["states"].items():
+            line = (
+                f"   {name:<12} cold {state['cold'] * 1000:7.1f}ms · steady {state['steady'] * 1000:7.1f}ms "
+                f"· 요소 {state['elements']:4d}개 · 블록 {state['blocks']:3d}개 · {state['bytes'] / 1024:6.1f}KB"
+            )
+            if state["exceptions"]:
+                line += f" · ⚠️ 예외 {len(state['exceptions'])}건"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="진입점/단계별 재실행 비용 벤치마크")
+    parser.add_argument("--apps", nargs="+", default=list(STATES), choices=list(STATES))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="상태마다 반복 재실행 횟수")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="기준값 파일")
+    parser.add_argument("--update-baseline", action="store_true", help="이번 결과를 기준값으로 저장")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE,
+                        help="시간이 기준값보다 이 비율 이상 늘면 실패 (0.5 = 50%%)")
+    parser.add_argument("--size-tolerance", type=float, default=SIZE_TOLERANCE,
+                        help="요소/바이트 수가 기준값보다 이 비율 이상 늘면 실패")
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.apps, args.repeat)
+    print(format_results(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failed = [
+        f"{app} [{name}] 예외: {state['exceptions'][0]}"
+        for app, result in results.items()
+        for name, state in result["states"].items() if state["exceptions"]
+    ]
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        directory = os.path.dirname(args.baseline)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"💾 기준값 저장: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            failed += compare(results, json.load(f), args.time_tolerance, args.size_tolerance)
+    else:
+        print(f"ℹ️ 기준값 파일이 없습니다 ({args.baseline}). --update-baseline으로 먼저 저장하세요.")
+
+    if failed:
+        print("❌ 기준값보다 나빠진 항목:")
+        for item in failed:
+            print(f"   - {item}")
+        sys.exit(1)
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        print("✅ 기준값 이내")
+
+
+if __name__ == "__main__":
+    main()
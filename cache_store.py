@@ -0,0 +1,133 @@
+"""
+2단계 캐시 저장소
+프로세스 메모리 LRU + 디스크 SQLite (크기 기준 제거, 선택적 TTL)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# 캐시 파일 위치 - 환경변수로 바꿀 수 있음
+CACHE_DIR = os.getenv(
+    "TRIAL_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+
+
+class TieredCache:
+    """메모리 LRU 앞단 + SQLite 뒷단 캐시 - 여러 세션/스레드가 함께 사용"""
+
+    def __init__(self, name, max_memory_items=256, max_disk_bytes=50 * 1024 * 1024,
+                 ttl_seconds=None, path=None):
+        self.name = name
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _expired(self, created, now):
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def get(self, key, default=None):
+        """값 조회 - 메모리에 없으면 디스크에서 읽어 메모리로 올림"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._stats["misses"] += 1
+                return default
+
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self._stats["disk_hits"] += 1
+            return value
+
+    def set(self, key, value):
+        """값 저장 - 메모리와 디스크 모두에 기록하고 용량 초과분 제거"""
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, value, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), now, now)
+            )
+            self._evict_disk()
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """디스크 용량이 넘치면 오래 쓰지 않은 항목부터 제거"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        excess = total - self.max_disk_bytes
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY accessed")
+        victims = []
+        for key, size in rows:
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._stats["evictions"] += len(victims)
+
+    def stats(self):
+        """적중/실패 횟수와 저장 현황"""
+        with self._lock:
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_items"] = len(self._memory)
+        stats["disk_items"] = count
+        stats["disk_bytes"] = size
+        return stats
@@ -0,0 +1,103 @@
+"""
+API 응답 녹화/재생 (카세트)
+실제 OpenAI 응답을 한 번 JSONL 파일에 녹화해 두고, 같은 요청이 오면 네트워크 없이 그대로 재생
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+def request_key(endpoint, fields):
+    """엔드포인트 + 응답을 결정하는 요청 필드의 해시 (오디오는 파일 내용 해시로)"""
+    canonical = json.dumps(
+        {"endpoint": endpoint, "request": fields},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def chat_fields(body):
+    """판결/라운드 평가 요청에서 응답을 결정하는 필드만"""
+    return {
+        "model": body.get("model"),
+        "messages": body.get("messages"),
+        "temperature": body.get("temperature"),
+        "max_tokens": body.get("max_tokens"),
+        "stream": bool(body.get("stream")),
+    }
+
+
+def audio_fields(form, audio):
+    """음성 인식 요청 - 녹음 파일은 내용 해시만 (같은 녹음이면 같은 키)"""
+    return {
+        "model": form.get("model"),
+        "language": form.get("language"),
+        "prompt": form.get("prompt"),
+        "response_format": form.get("response_format"),
+        "file": hashlib.sha256(audio or b"").hexdigest(),
+    }
+
+
+class Cassette:
+    """JSONL 카세트 - 한 줄에 요청 하나 (key, endpoint, status, content_type, body 또는 events)
+
+    같은 키로 여러 번 녹화했으면 녹화한 순서대로 돌아가며 재생함
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def play(self, key):
+        """녹화된 응답 (없으면 None)"""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            self.hits += 1
+            return entries[index % len(entries)]
+
+    def record(self, key, endpoint, status, content_type, body=None, events=None):
+        entry = {"key": key, "endpoint": endpoint, "status": status, "content_type": content_type}
+        if events is not None:
+            entry["events"] = events
+        else:
+            entry["body"] = body
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self.recorded += 1
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": sum(len(entries) for entries in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded,
+            }
@@ -0,0 +1,88 @@
+"""
+회로 차단기
+외부 API가 계속 실패하면 잠시 호출을 멈추고 모든 세션이 대체 결과를 쓰도록 함
+"""
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """회로가 열려 있어 호출하지 않음"""
+
+
+class CircuitBreaker:
+    """연속 실패가 failure_threshold번 쌓이면 열림(open) -> reset_seconds 뒤 시험 호출 하나 허용
+
+    시험 호출이 성공하면 닫히고(closed), 실패하면 다시 열림
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._trips = 0
+        self._last_error = None
+
+    def is_open(self):
+        """열려 있고 아직 시험 호출 시간이 되지 않았는지"""
+        with self._lock:
+            return self._state == OPEN and time.monotonic() - self._opened_at < self.reset_seconds
+
+    def allow(self):
+        """지금 호출해도 되는지 - 열린 상태면 False, 반쯤 열린 상태면 시험 호출 하나만 True"""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN:
+                # 시험 호출이 결과 없이 사라진 경우를 대비해 reset_seconds가 지나면 다시 허용
+                if self._probing and time.monotonic() - self._probe_started < self.reset_seconds:
+                    return False
+                self._probing = True
+                self._probe_started = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self._last_error = repr(error) if error is not None else None
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._trips += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def status(self):
+        """현재 상태, 연속 실패 수, 열린 횟수, 다시 시험하기까지 남은 시간"""
+        with self._lock:
+            retry_in = 0.0
+            if self._state == OPEN:
+                retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+            return {
+                "name": self.name,
+                "state": self._state,
+                "failures": self._failures,
+                "trips": self._trips,
+                "retry_in": retry_in,
+                "last_error": self._last_error,
+            }
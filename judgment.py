@@ -0,0 +1,710 @@
+"""
+AI 판결 생성
+스트리밍 출력, 끊긴 스트림 재시도, 첫 토큰 시간(TTFT) 측정, 판결 캐시, 중복 요청 합치기
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import streamlit as st
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from api_telemetry import get_api_telemetry, session_tags
+from cache_store import TieredCache
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from model_router import MODEL_TIERS, choose_model
+from rate_limiter import estimate_chat_tokens, estimate_tokens
+from reactor import MAX_CONCURRENT_REQUESTS
+from usage_budget import current_class, get_usage_ledger
+
+# 스트림이 끊겼을 때 처음부터 다시 시도하는 최대 횟수
+MAX_STREAM_ATTEMPTS = 3
+# 시도 한 번의 제한 시간(초) - 요청 한도 대기열에서 기다린 시간은 제외
+ATTEMPT_TIMEOUT_SECONDS = 45
+# 판결 하나에 쓰는 전체 제한 시간(초) - 넘으면 더 재시도하지 않음
+JUDGMENT_DEADLINE_SECONDS = 90
+# 재시도 간격 - 0 ~ min(최대, 기본 * 2^n) 사이 무작위 (여러 세션이 한꺼번에 재시도하지 않도록)
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 4.0
+# 연속 실패가 이만큼 쌓이면 잠시 모든 세션에서 판결 호출을 멈춤
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+# 첫 토큰이 이 시간(초) 안에 오지 않으면 규칙 기반 임시 판결을 먼저 보여 줌
+HEDGE_SECONDS = 8
+# 최근 판결 기록 보관 개수 (관리자 화면용)
+METRICS_HISTORY = 200
+# 같은 토론 내용의 판결을 재사용하는 기간 (샘플 사건은 하루에도 여러 번 진행)
+JUDGMENT_CACHE_TTL = 7 * 24 * 3600
+
+
+class StreamInterrupted(Exception):
+    """완료 신호(finish_reason) 없이 스트림이 끝난 경우"""
+
+
+# 다시 시도하면 나아질 수 있는 오류 - 연결 끊김, 시간 초과, 서버 오류(5xx)
+# (이것만 회로 차단기 실패로 셈 - 400/401 같은 요청 오류는 다시 보내도 같으므로 바로 실패)
+RETRYABLE_ERRORS = (
+    APIConnectionError, APITimeoutError, InternalServerError, StreamInterrupted, TimeoutError
+)
+
+
+class JudgmentMetrics:
+    """판결 응답 속도 기록 - 모든 세션이 공유"""
+
+    def __init__(self, history=METRICS_HISTORY):
+        self._records = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def record(self, model, ttft, total, attempts, ok):
+        with self._lock:
+            self._records.append({
+                "time": time.time(),
+                "model": model,
+                "ttft": ttft,
+                "total": total,
+                "attempts": attempts,
+                "ok": ok,
+            })
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def summary(self):
+        """첫 토큰 시간/전체 시간의 중앙값과 최댓값, 재시도/실패 횟수"""
+        records = self.records()
+        ttfts = sorted(r["ttft"] for r in records if r["ttft"] is not None)
+        totals = sorted(r["total"] for r in records if r["ok"])
+
+        def median(values):
+            return values[len(values) // 2] if values else None
+
+        return {
+            "count": len(records),
+            "ttft_median": median(ttfts),
+            "ttft_max": ttfts[-1] if ttfts else None,
+            "total_median": median(totals),
+            "retries": sum(r["attempts"] - 1 for r in records),
+            "failures": sum(1 for r in records if not r["ok"]),
+        }
+
+
+@st.cache_resource
+def get_judgment_metrics():
+    """서버 프로세스 전체에서 하나만 쓰는 판결 속도 기록"""
+    return JudgmentMetrics()
+
+
+@st.cache_resource
+def get_judgment_cache():
+    """모든 세션이 함께 쓰는 판결 캐시 - 기간이 지나거나 용량이 넘치면 오래된 것부터 제거"""
+    return TieredCache(
+        "judgments",
+        max_memory_items=128,
+        max_disk_bytes=20 * 1024 * 1024,
+        ttl_seconds=JUDGMENT_CACHE_TTL
+    )
+
+
+def normalize_text(text):
+    """캐시 비교용 정규화 - 유니코드 조합 통일, 공백/줄바꿈 차이 무시"""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def debate_content(case, rounds):
+    """판결 키에 넣을 토론 내용 - 정규화한 사건 개요와 라운드별 (검사, 변호) 발언 (빈 라운드 제외)"""
+    statements = []
+    for round_data in rounds:
+        pair = [normalize_text(round_data.get("prosecutor")), normalize_text(round_data.get("defender"))]
+        if any(pair):
+            statements.append(pair)
+    return {"case": normalize_text(case), "rounds": statements}
+
+
+def judgment_cache_key(model, system_prompt, prompt, debate=None):
+    """모델 + 시스템 프롬프트 + 토론 내용(사건 개요, 라운드 발언)의 정규화 해시
+
+    debate=(사건 개요, 라운드 목록)을 주면 프롬프트 대신 토론 내용으로 키를 만듦 -
+    프롬프트에 들어가는 라운드 평가(LLM 생성)나 예산에 따라 줄인 발언은 토론 내용에서
+    나온 것이므로, 평가가 있든 없든 같은 토론이면 같은 판결을 재사용/합류함
+    """
+    content = {"prompt": normalize_text(prompt)} if debate is None else debate_content(*debate)
+    canonical = json.dumps(
+        dict(content, model=model, system=normalize_text(system_prompt)),
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _stream_tokens(client, model, messages, max_tokens, temperature, timing, timeout=None):
+    """판결 토큰을 하나씩 내보내는 제너레이터 - 첫 토큰 시간과 (마지막 조각의) 토큰 사용량을 timing에 기록"""
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=timeout
+    )
+    if hasattr(stream, "on_wait"):
+        # 공유 루프 스트림이면 첫 조각을 기다리는 동안 대기 순서 표시, 제한 시간 적용
+        stream.on_wait = timing.get("on_wait")
+        stream.timeout = timeout
+    finished = False
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            timing["usage"] = chunk.usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        delta = choice.delta.content if choice.delta else None
+        if delta:
+            if timing["ttft"] is None:
+                timing["ttft"] = time.perf_counter() - timing["started"]
+                if timing.get("on_first_token"):
+                    timing["on_first_token"]()
+            yield delta
+        if choice.finish_reason:
+            finished = True
+    if not finished:
+        raise StreamInterrupted("판결 스트림이 중간에 끊겼습니다.")
+
+
+class FlightRestarted(Exception):
+    """진행 중인 판결 스트림이 끊겨 처음부터 다시 받는 중"""
+
+
+class JudgmentCancelled(Exception):
+    """라운드 내용이 바뀌어 미리 시작한 판결을 버림"""
+
+
+class JudgmentFlight:
+    """진행 중인 판결 하나 - 같은 요청을 한 여러 세션이 같은 토큰 흐름을 함께 읽음"""
+
+    def __init__(self, key):
+        self.key = key
+        self.model = None
+        self.reason = None
+        self.chunks = []
+        self.attempt = 1
+        self.ticket = None
+        self.done = False
+        self.text = None
+        self.error = None
+        self.followers = 0
+        self.speculative = False
+        self.cancelled = False
+        # 학급 예산 때문에 저렴한 모델로 내린 경우
+        self.budget_downgrade = False
+        # API 호출 기록 - 시작한 세션 이름으로 한 번만 (토큰은 재시도한 것까지 합산)
+        self.call = None
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "tokens_estimated": False}
+        self._cond = threading.Condition()
+
+    def set_ticket(self, ticket):
+        self.ticket = ticket
+
+    def push(self, delta):
+        with self._cond:
+            self.chunks.append(delta)
+            self._cond.notify_all()
+
+    def restart(self):
+        """끊긴 스트림을 버리고 처음부터 - 읽던 세션은 FlightRestarted를 받음"""
+        with self._cond:
+            self.attempt += 1
+            self.chunks = []
+            self.ticket = None
+            self._cond.notify_all()
+
+    def finish(self, text=None, error=None):
+        """처음 한 번만 - 취소된 판결이 뒤늦게 받은 결과로 덮어쓰지 않도록"""
+        with self._cond:
+            if self.done:
+                return
+            self.text = text
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def cancel(self):
+        """미리 시작한 판결을 버림 - 받던 스트림은 다음 토큰에서 멈추고 캐시에 남기지 않음"""
+        self.cancelled = True
+        self.finish(error=JudgmentCancelled("미리 시작한 판결이 취소되었습니다."))
+
+    def tokens(self, on_wait=None):
+        """지금까지 받은 토큰부터 차례로 내보냄 - 첫 토큰 전에는 on_wait(ticket)으로 대기 상태 알림"""
+        with self._cond:
+            attempt = self.attempt
+        index = 0
+        while True:
+            with self._cond:
+                if self.attempt != attempt:
+                    raise FlightRestarted()
+                batch = self.chunks[index:]
+                index += len(batch)
+                if not batch:
+                    if self.done:
+                        if self.error is not None:
+                            raise self.error
+                        return
+                    self._cond.wait(timeout=0.5)
+            if batch:
+                yield "".join(batch)
+            elif index == 0 and on_wait is not None:
+                on_wait(self.ticket)
+
+
+class JudgmentFlights:
+    """진행 중인 판결 목록 - 같은 요청(프롬프트 해시)은 API를 한 번만 호출"""
+
+    def __init__(self):
+        self._flights = {}
+        # 스트림을 받을 스레드를 기다리는 판결 (시작한 순서)
+        self._queued = []
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """진행 중인 판결에 합류하거나 새로 시작 - (flight, 새로 시작했는지)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = JudgmentFlight(key)
+            self._flights[key] = flight
+            return flight, True
+
+    def get(self, key):
+        with self._lock:
+            return self._flights.get(key)
+
+    def release(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def cancel(self, key):
+        """아무도 합류하지 않은 미리 시작한 판결이면 취소 - 취소했는지 반환"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None or not flight.speculative or flight.followers:
+                return False
+            del self._flights[key]
+        flight.cancel()
+        return True
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def enqueue(self, flight):
+        with self._lock:
+            self._queued.append(flight)
+
+    def dequeue(self, flight):
+        """스레드를 받아 판결을 받기 시작함"""
+        with self._lock:
+            if flight in self._queued:
+                self._queued.remove(flight)
+
+    def ahead(self, flight):
+        """스레드를 기다리는 중이면 앞에 있는 판결 수, 아니면 None"""
+        with self._lock:
+            if flight not in self._queued:
+                return None
+            return self._queued.index(flight)
+
+    def queued(self):
+        with self._lock:
+            return len(self._queued)
+
+
+# 판결 스트림을 받는 스레드 - 요청한 세션이 화면을 떠나도 판결은 끝까지 받음
+# (공유 루프의 동시 요청 한도만큼 - 스레드가 모자라 한도보다 먼저 막히지 않도록)
+_flight_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="judgment-flight")
+
+
+@st.cache_resource
+def get_judgment_breaker():
+    """판결 API 회로 차단기 - 모든 세션이 공유"""
+    return CircuitBreaker(
+        "judgment",
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_seconds=BREAKER_RESET_SECONDS
+    )
+
+
+def retry_delay(attempt):
+    """attempt번째 재시도 전 대기 시간 - 지수 증가 상한 안에서 무작위 (full jitter)"""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+@st.cache_resource
+def get_judgment_flights():
+    """서버 프로세스 전체에서 하나만 쓰는 진행 중 판결 목록"""
+    return JudgmentFlights()
+
+
+def judgment_pending():
+    """이 세션이 마지막으로 요청한 판결이 아직 생성 중인지 (버튼 표시용)"""
+    key = st.session_state.get("judgment_key")
+    return key is not None and get_judgment_flights().get(key) is not None
+
+
+def _add_usage(flight, timing, messages):
+    """시도 한 번의 토큰 사용량을 더함 - 응답에 사용량이 없으면(끊긴 스트림 등) 추정치"""
+    usage = timing.get("usage")
+    if usage is not None:
+        flight.usage["prompt_tokens"] += usage.prompt_tokens or 0
+        flight.usage["completion_tokens"] += usage.completion_tokens or 0
+        return
+    flight.usage["prompt_tokens"] += estimate_chat_tokens(messages)
+    flight.usage["completion_tokens"] += estimate_tokens("".join(flight.chunks)) if flight.chunks else 0
+    flight.usage["tokens_estimated"] = True
+
+
+def _produce(flight, flights, client, model, messages, max_tokens, temperature,
+             cache, metrics, breaker):
+    """판결 스트림을 받아 flight에 채움 - 끊기면 잠시 쉬었다 처음부터, 성공하면 캐시에 저장"""
+    flights.dequeue(flight)
+    started = time.perf_counter()
+    deadline = started + JUDGMENT_DEADLINE_SECONDS
+    attempts = 0
+    outcome = "error"
+    error = StreamInterrupted("판결 스트림을 끝내 받지 못했습니다.")
+    try:
+        for attempt in range(1, MAX_STREAM_ATTEMPTS + 1):
+            if attempt > 1:
+                delay = retry_delay(attempt - 1)
+                if time.perf_counter() + delay >= deadline:
+                    break
+                time.sleep(delay)
+            if flight.cancelled:
+                outcome = "cancelled"
+                return
+            if not breaker.allow():
+                error = CircuitOpenError("판결 API 회로가 열려 있습니다.")
+                outcome = "circuit_open"
+                break
+            attempts = attempt
+            timing = {"started": started, "ttft": None, "on_wait": flight.set_ticket}
+            timeout = min(ATTEMPT_TIMEOUT_SECONDS, deadline - time.perf_counter())
+            try:
+                for delta in _stream_tokens(client, model, messages, max_tokens, temperature,
+                                            timing, timeout):
+                    if flight.cancelled:
+                        # 스트림을 닫으면 공유 루프의 요청도 함께 취소됨
+                        outcome = "cancelled"
+                        _add_usage(flight, timing, messages)
+                        return
+                    if flight.call is not None:
+                        flight.call.first_token()
+                    flight.push(delta)
+            except RateLimitError as e:
+                # 대기열에서 여러 번 다시 기다렸는데도 한도 초과 - 재시도해도 같은 결과
+                # (서버 고장이 아니므로 회로 차단기에는 실패로 세지 않음)
+                breaker.record_success()
+                metrics.record(model, None, time.perf_counter() - started, attempt, False)
+                outcome = "rate_limited"
+                flight.finish(error=e)
+                return
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure(e)
+                error = e
+                _add_usage(flight, timing, messages)
+                flight.restart()
+                continue
+            except Exception as e:
+                # 요청 자체의 문제 - 재시도하지 않고, 서버 상태와 무관하므로 차단기도 그대로
+                _add_usage(flight, timing, messages)
+                metrics.record(model, None, time.perf_counter() - started, attempt, False)
+                error = e
+                flight.finish(error=e)
+                return
+            breaker.record_success()
+            _add_usage(flight, timing, messages)
+            if flight.cancelled:
+                # 마지막 조각을 받는 사이에 취소됨 - 버린 판결은 저장하지 않고 취소 상태 그대로
+                outcome = "cancelled"
+                return
+            outcome = "ok"
+            text = "".join(flight.chunks)
+            metrics.record(model, timing["ttft"], time.perf_counter() - started, attempt, True)
+            if cache is not None:
+                cache.set(flight.key, {"text": text, "model": model, "reason": flight.reason})
+            flight.finish(text)
+            return
+        metrics.record(model, None, time.perf_counter() - started, max(attempts, 1), False)
+        flight.finish(error=error)
+    except Exception as e:
+        error = e
+        flight.finish(error=e)
+    finally:
+        # 캐시에 저장한 뒤에 목록에서 빼야 그 사이에 온 요청이 API를 다시 부르지 않음
+        flights.release(flight)
+        if flight.call is not None:
+            fields = dict(flight.usage, outcome=outcome, attempts=attempts)
+            if outcome == "ok":
+                fields["bytes_received"] = len((flight.text or "").encode("utf-8"))
+            elif error is not None and outcome == "error":
+                fields["error"] = type(error).__name__
+            flight.call.close(**fields)
+
+
+def _load(client, flights):
+    """지금 판결 쪽 부하 - 생성 중인 판결 수 + 요청 한도 대기열"""
+    queued = 0
+    if hasattr(client, "stats"):
+        queued = client.stats()["queues"].get("chat", {}).get("waiting", 0)
+    return flights.in_flight() + queued
+
+
+def _set_meta(model, reason, source):
+    """이번 판결을 만든 모델과 선택 이유 - 저장/다운로드하는 결과에 함께 기록"""
+    st.session_state.judgment_meta = {"model": model, "reason": reason, "source": source}
+
+
+def _start(flight, flights, client, model, system_prompt, prompt, max_tokens, temperature,
+           cache, breaker, cache_status="miss", budget=None):
+    """새로 만든 flight의 모델을 고르고 백그라운드에서 판결 받기 시작 (API 호출 기록도 여기서 시작)
+
+    학급 예산을 많이 썼으면(budget state가 downgrade/exhausted) 가장 저렴한 모델부터 고름
+    """
+    preferred = model
+    if budget is not None and budget["state"] != "ok" and model in MODEL_TIERS:
+        preferred = MODEL_TIERS[-1]
+    flight.model, flight.reason = choose_model(
+        preferred, system_prompt, prompt, max_tokens,
+        records=get_judgment_metrics().records(),
+        queue_depth=_load(client, flights) - 1
+    )
+    if preferred != model:
+        flight.budget_downgrade = True
+        flight.reason = f"학급 예산 {budget['ratio']:.0%} 사용"
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+    flight.call = get_api_telemetry().track(
+        "judgment", session_tags(),
+        model=flight.model,
+        cache=cache_status,
+        bytes_sent=len((system_prompt + prompt).encode("utf-8"))
+    )
+    flights.enqueue(flight)
+    _flight_pool.submit(
+        _produce, flight, flights, client, flight.model, messages, max_tokens, temperature,
+        cache, get_judgment_metrics(), breaker
+    )
+
+
+def speculate_judgment(client, prompt, model, system_prompt, max_tokens=1000, temperature=0.7,
+                       cache=None, debate=None):
+    """판결 버튼을 누르기 전에 미리 판결을 시작하고 판결 키 반환 (화면 출력 없음)
+
+    결과는 stream_judgment와 같은 캐시/진행 중 판결 목록에 들어가므로, 나중에 같은 프롬프트로
+    stream_judgment를 부르면 끝난 판결은 캐시에서, 아직 생성 중이면 그 스트림에 합류해 받음.
+    이미 저장된 판결이 있거나 회로가 열려 있거나 학급 예산을 다 썼으면 아무것도 하지 않음
+    (debate는 stream_judgment와 같이 판결 키를 토론 내용으로 만들 때)
+    """
+    cache_key = judgment_cache_key(model, system_prompt, prompt, debate)
+    if cache is not None and cache.get(cache_key) is not None:
+        return cache_key
+    breaker = get_judgment_breaker()
+    if breaker.is_open():
+        return None
+    budget = get_usage_ledger().budget_status(current_class())
+    if budget["state"] == "exhausted":
+        return None
+    flights = get_judgment_flights()
+    flight, leader = flights.join(cache_key)
+    if leader:
+        flight.speculative = True
+        _start(flight, flights, client, model, system_prompt, prompt, max_tokens, temperature,
+               cache, breaker, cache_status="speculative", budget=budget)
+    st.session_state.judgment_key = cache_key
+    return cache_key
+
+
+def cancel_speculation(key):
+    """미리 시작한 판결 버리기 - 다른 세션이 합류해 있으면 그대로 둠"""
+    if key is not None:
+        get_judgment_flights().cancel(key)
+    if st.session_state.get("judgment_key") == key:
+        st.session_state.judgment_key = None
+
+
+def stream_judgment(client, prompt, model, system_prompt, fallback,
+                    max_tokens=1000, temperature=0.7, cache=None, refresh=False,
+                    local_verdict=None, debate=None):
+    """판결을 st.write_stream으로 토큰 단위 출력하고 전체 텍스트 반환
+
+    model은 기본(최고) 모델이며, 실제 모델은 프롬프트 길이/최근 응답 시간/부하를 보고
+    model_router가 고름 (고른 모델과 이유는 st.session_state.judgment_meta와 캐시에 기록).
+
+    cache가 주어지면 같은 내용의 판결은 API 없이 바로 보여 주며 (debate=(사건 개요, 라운드 목록)을
+    주면 프롬프트가 아니라 토론 내용이 같은지로 판단),
+    refresh=True(다시 판결)면 저장된 판결을 무시하고 새로 받아 덮어씀.
+    같은 내용의 판결이 이미 생성 중이면(다른 세션, 두 번 누른 버튼) 그 스트림에 합류함.
+    스트림이 끊기거나 제한 시간을 넘기면 출력한 부분을 지우고 잠시 뒤 처음부터 다시 요청하며,
+    끝내 실패하거나 회로 차단기가 열려 있으면 fallback 판결을 표시해 반환함 (fallback은 캐시하지 않음).
+    요청 한도(429)에 걸려 끝내 차례를 얻지 못하면 가짜 판결 대신 안내만 하고 빈 문자열 반환.
+
+    local_verdict(규칙 기반 임시 판결문)가 주어지면 첫 토큰이 HEDGE_SECONDS 안에 오지 않을 때
+    먼저 보여 주고 AI 판결이 도착하면 바꿔 보여 주며, 실패 시에는 fallback 대신 사용함
+
+    호출마다 API 호출 기록(api_telemetry)에 남김 - API를 실제로 부른 세션은 flight가 끝날 때
+    토큰 사용량과 함께, 저장된 판결/합류한 세션은 여기서 (토큰 없이)
+
+    학급 예산(usage_budget)을 많이 썼으면 가장 저렴한 모델로, 다 썼으면 local_verdict로 판결함
+    (저장된 판결은 비용이 들지 않으므로 예산과 관계없이 보여 줌)
+    """
+    if local_verdict:
+        fallback = local_verdict
+    telemetry = get_api_telemetry()
+    cache_key = judgment_cache_key(model, system_prompt, prompt, debate)
+    if cache is not None and not refresh:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if isinstance(cached, str):
+                cached = {"text": cached, "model": model, "reason": None}
+            st.markdown(cached["text"])
+            st.caption("⚡ 같은 토론 내용의 저장된 판결입니다. 새 판결이 필요하면 '다시 판결'을 누르세요.")
+            _set_meta(cached["model"], cached["reason"], "cache")
+            telemetry.track("judgment", session_tags(), model=cached["model"], cache="hit").close(
+                bytes_received=len(cached["text"].encode("utf-8"))
+            )
+            return cached["text"]
+
+    breaker = get_judgment_breaker()
+    if breaker.is_open():
+        # 서버가 불안정한 동안은 기다리게 하지 않고 바로 임시 판결
+        _set_meta(None, "회로 차단", "local" if local_verdict else "fallback")
+        telemetry.track("judgment", session_tags(), model=model, cache="miss").close(outcome="circuit_open")
+        return _show_fallback(fallback, breaker=True)
+
+    budget = get_usage_ledger().budget_status(current_class())
+    if budget["state"] == "exhausted" and local_verdict:
+        st.info(f"💰 이번 달 학급 예산(${budget['budget']:.2f})을 다 써서 발언 평가로 계산한 판결을 보여 드립니다.")
+        st.markdown(local_verdict)
+        _set_meta(None, "학급 예산 소진", "local")
+        telemetry.track("judgment", session_tags(), model=None, cache="miss").close(outcome="budget")
+        return local_verdict
+
+    flights = get_judgment_flights()
+    flight, leader = flights.join(cache_key)
+    st.session_state.judgment_key = cache_key
+    call = None
+    if leader:
+        _start(flight, flights, client, model, system_prompt, prompt, max_tokens, temperature,
+               cache, breaker, cache_status="bypass" if refresh else "miss", budget=budget)
+    else:
+        call = telemetry.track("judgment", session_tags(), model=flight.model, cache="joined")
+    with call if call is not None else nullcontext():
+        return _relay_judgment(flight, call, model, local_verdict, fallback)
+
+
+def _relay_judgment(flight, call, model, local_verdict, fallback):
+    """flight의 토큰을 화면에 출력 - 합류한 세션이면 call에 결과를 기록"""
+
+    def done(outcome, text=""):
+        if call is not None:
+            call.update(outcome=outcome, bytes_received=len((text or "").encode("utf-8")))
+
+    if call is not None:
+        if flight.speculative:
+            st.caption("🔮 토론이 끝날 때 미리 시작해 둔 판결을 이어서 받습니다.")
+        else:
+            st.caption("👥 같은 내용의 판결이 이미 만들어지는 중이라 함께 받아 봅니다.")
+    if flight.budget_downgrade:
+        st.caption(f"💰 학급 예산을 아끼기 위해 {flight.model} 모델을 사용합니다. ({flight.reason})")
+    elif flight.model != model:
+        st.caption(f"⚡ 빠른 판결을 위해 {flight.model} 모델을 사용합니다. ({flight.reason})")
+
+    hedge = st.empty()
+    status = st.empty()
+    status.info("⚖️ AI 판사가 신중하게 검토 중입니다...")
+    waiting_since = time.perf_counter()
+    hedged = []
+
+    def show_queue(ticket):
+        queued = get_judgment_flights().ahead(flight)
+        if queued is not None:
+            # 판결 스레드를 기다리는 중 (아직 요청 한도 대기열에 들어가기 전)
+            status.info(f"⏳ 요청이 많아 차례를 기다리는 중입니다. 앞에 {queued}건")
+        elif ticket is not None and not ticket.started:
+            status.info(
+                f"⏳ 요청이 많아 차례를 기다리는 중입니다. "
+                f"앞에 {ticket.ahead()}건 (약 {ticket.eta():.0f}초)"
+            )
+        else:
+            status.info("⚖️ AI 판사가 신중하게 검토 중입니다...")
+        if local_verdict and not hedged and time.perf_counter() - waiting_since >= HEDGE_SECONDS:
+            # 기다리는 대신 규칙 기반 임시 판결부터 - AI 판결 첫 토큰이 오면 지움
+            hedged.append(True)
+            with hedge.container():
+                st.markdown(local_verdict)
+                st.caption("⏱️ AI 판결이 늦어져 발언 평가로 계산한 임시 판결을 먼저 보여 드립니다. "
+                           "AI 판결이 도착하면 바로 바뀝니다.")
+
+    def relay():
+        first = True
+        for delta in flight.tokens(on_wait=show_queue):
+            if first:
+                status.empty()
+                hedge.empty()
+                first = False
+            yield delta
+
+    while True:
+        placeholder = st.empty()
+        try:
+            with placeholder.container():
+                text = st.write_stream(relay())
+        except FlightRestarted:
+            # 이미 보인 일부 판결은 지우고 처음부터 다시
+            placeholder.empty()
+            status.info("🔄 연결이 끊겨 판결을 다시 요청합니다...")
+            continue
+        except RateLimitError:
+            placeholder.empty()
+            status.warning("⏳ 지금 판결 요청이 너무 많습니다. 잠시 후 다시 요청해 주세요.")
+            if hedged:
+                # 이미 보여 준 임시 판결은 그대로 결과로 사용
+                _set_meta(None, "요청 한도 초과", "local")
+                done("rate_limited", local_verdict)
+                return local_verdict
+            done("rate_limited")
+            return ""
+        except Exception as e:
+            placeholder.empty()
+            status.empty()
+            hedge.empty()
+            _set_meta(None, type(e).__name__, "local" if local_verdict else "fallback")
+            done("cancelled" if isinstance(e, JudgmentCancelled) else
+                 "circuit_open" if isinstance(e, CircuitOpenError) else "error")
+            return _show_fallback(fallback, breaker=isinstance(e, CircuitOpenError))
+        status.empty()
+        _set_meta(flight.model, flight.reason, "api")
+        done("ok", text)
+        return text
+
+
+def _show_fallback(fallback, breaker=False):
+    """기본 판결 표시 - 회로가 열린 경우에는 그 사실을 함께 안내"""
+    if breaker:
+        st.warning("🛠️ AI 판사 서버가 불안정해 임시 판결을 보여 드립니다. 잠시 후 '다시 판결'을 눌러 주세요.")
+    st.markdown(fallback)
+    return fallback
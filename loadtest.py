@@ -0,0 +1,426 @@
+"""
+동시 교실 부하 테스트
+로컬 대역 서버(mock_openai.py)를 띄우고, 여러 교실 세션이 동시에 앱을 쓰는 상황을 Streamlit AppTest로 재현
+재실행 지연 백분위, 처리량, 음성 인식 대기 시간, 최대 메모리(RSS), 스레드 수를 앱별로 보고
+
+    python loadtest.py --sessions 10 --apps app_simple.py app.py app_improved.py
+    python loadtest.py --sessions 20 --latency 3 --error-rate 0.05 --json loadtest.json
+    python loadtest.py --sessions 5 10 20 40 --apps app.py   # 교실 수별로 한 줄씩
+
+녹음기가 있는 앱(app.py, app_improved.py)은 라운드마다 합성 음성 WAV를 녹음기 값으로 넣어
+음성 인식 큐와 대역 서버의 Whisper 응답까지 거침 (간편 버전은 녹음 기능이 없어 텍스트만)
+
+AppTest는 한 프로세스에서 여러 스레드로 돌릴 수 없어서 세션마다 프로세스 하나를 씀
+(교실마다 서버 프로세스가 따로 있는 셈 - 같은 프로세스 안에서만 공유되는 판결 합류는 재현되지 않음,
+디스크 캐시는 모든 세션이 같은 폴더를 씀)
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mock_openai import MockConfig, start_mock_server
+
+APPS = ["app_simple.py", "app.py", "app_improved.py"]
+CASE_TEXT = "학생 A가 급식 줄에서 새치기를 했습니다. 친구가 자리를 맡아줬다고 주장하지만 목격자들은 부인합니다."
+PROSECUTOR_TEXT = "첫째, 피고는 급식 줄의 규칙을 어겼습니다. 둘째, 목격자 진술이 피고의 주장과 다릅니다. 공정한 급식을 위해 책임을 져야 합니다."
+DEFENDER_TEXT = "피고는 친구가 자리를 맡아줬다고 믿었습니다. 왜냐하면 전날 그렇게 약속했기 때문입니다. 오해였다면 배려와 사과로 해결해야 합니다."
+# 녹음 한 번의 길이(초) - 교실 녹음기(44.1kHz 스테레오)와 같은 형식으로 만듦
+AUDIO_SECONDS = 6.0
+AUDIO_SAMPLE_RATE = 44100
+# 녹음 뒤 음성 인식 결과가 화면에 반영될 때까지 기다리는 최대 시간(초)
+TRANSCRIPTION_WAIT_SECONDS = 60.0
+
+
+# --- 세션 하나 (작업 프로세스에서 실행) ---
+
+def _thread_count():
+    """운영체제 기준 스레드 수 (리눅스가 아니면 파이썬 스레드 수)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return threading.active_count()
+
+
+def _peak_rss_mb():
+    # 리눅스는 KB, macOS는 바이트 단위
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if peak > 1 << 32 else peak / 1024
+
+
+def _button(at, text=None, key=None):
+    for button in at.button:
+        if (key is not None and button.key == key) or (text is not None and text in button.label):
+            return button
+    raise LookupError(f"버튼을 찾지 못했습니다: {key or text}")
+
+
+def _judgment_button(at):
+    # 미리 시작한 판결이 생성 중이면 버튼 문구가 바뀜
+    for button in at.button:
+        if "판결 요청" in button.label or "판결 생성 중" in button.label:
+            return button
+    raise LookupError("판결 버튼을 찾지 못했습니다")
+
+
+def _statement(text, session_id, round_num, shared):
+    # 세션마다 내용을 다르게 해야 판결 캐시가 아닌 API까지 요청이 감
+    return text if shared else f"{text} (교실 {session_id} 라운드 {round_num})"
+
+
+# --- 녹음 (작업 프로세스에서 녹음기 값을 대신 넣음) ---
+
+# 녹음기 키 → 녹음 WAV (브라우저 녹음기처럼 한 번 녹음하면 재실행마다 같은 값을 돌려줌)
+_recordings = {}
+
+
+def _fake_audio_recorder(*args, key=None, **kwargs):
+    return _recordings.get(key)
+
+
+def install_recorder():
+    """audio_recorder_streamlit 컴포넌트 대신 _recordings의 값을 돌려주도록 바꿈
+
+    AppTest는 브라우저 컴포넌트 값을 넣을 수 없어서, 앱이 불러오는 함수를 작업 프로세스 안에서 바꿈
+    """
+    import audio_recorder_streamlit
+    audio_recorder_streamlit.audio_recorder = _fake_audio_recorder
+
+
+def speech_wav(seconds=AUDIO_SECONDS, seed=0, sample_rate=AUDIO_SAMPLE_RATE):
+    """음성처럼 들리는 합성 WAV (16비트 스테레오) - 음절 단위로 세기가 바뀌어 무음 검출을 통과
+
+    seed가 다르면 소리도 달라져 음성 인식 캐시에 걸리지 않음
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 60 * rng.random()
+    voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    syllables = np.clip(np.sin(2 * np.pi * (3 + rng.random()) * t), 0, None)
+    noise = rng.normal(0, 0.02, len(t))
+    pcm = (np.clip(voice * syllables * 0.3 + noise, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(np.repeat(pcm, 2).tobytes())
+    return buffer.getvalue()
+
+
+def _record(prefix, round_num, session_id, shared, audio_seconds):
+    # 같은 교실 안에서도 라운드/팀마다 다른 녹음 (shared면 모든 교실이 같은 녹음)
+    seed = (0 if shared else session_id * 100) + round_num * 2 + (prefix == "def")
+    recording = speech_wav(audio_seconds, seed)
+    return lambda at: _recordings.__setitem__(f"{prefix}_audio_{round_num}", recording)
+
+
+def _audio_steps(round_num, session_id, shared, audio_seconds):
+    """라운드 하나의 양 팀 녹음 - 이름이 "녹음"으로 시작하는 단계는 음성 인식이 끝날 때까지 기다림"""
+    if not audio_seconds:
+        return []
+    return [
+        (f"녹음 라운드 {round_num} 검사", _record("pros", round_num, session_id, shared, audio_seconds)),
+        (f"녹음 라운드 {round_num} 변호", _record("def", round_num, session_id, shared, audio_seconds)),
+    ]
+
+
+def simple_steps(session_id, rounds, shared, audio_seconds=0.0):
+    """app_simple.py - 사건 입력 → 라운드 추가/발언 입력 → 판결 요청 (녹음 기능 없음)"""
+    steps = [("사건 입력", lambda at: next(
+        t for t in at.text_area if t.label == "사건 내용"
+    ).set_value(_statement(CASE_TEXT, session_id, 0, shared)))]
+    for i in range(rounds):
+        steps.append((f"라운드 {i + 1} 추가", lambda at: _button(at, "새 라운드 추가").click()))
+        steps.append((f"라운드 {i + 1} 검사", lambda at, i=i: at.text_area(key=f"pros_{i}").set_value(
+            _statement(PROSECUTOR_TEXT, session_id, i + 1, shared))))
+        steps.append((f"라운드 {i + 1} 변호", lambda at, i=i: at.text_area(key=f"def_{i}").set_value(
+            _statement(DEFENDER_TEXT, session_id, i + 1, shared))))
+    steps.append(("판결", lambda at: _judgment_button(at).click()))
+    return steps
+
+
+def _save_statement(at, prefix, round_num, text):
+    at.text_area(key=f"{prefix}_text_{round_num}").set_value(text)
+    _button(at, key=f"save_{prefix}_{round_num}").click()
+
+
+def full_steps(session_id, rounds, shared, audio_seconds=0.0):
+    """app.py - 사건 불러오기 → 라운드 선택/녹음/발언 저장 → 판결 요청"""
+    rounds = min(rounds, 4)  # 라운드 수 입력은 최대 4
+    steps = [
+        ("라운드 수", lambda at: at.number_input[0].set_value(rounds)),
+        ("사건 불러오기", lambda at: _button(at, "사건 불러오기").click()),
+    ]
+    for n in range(1, rounds + 1):
+        steps.append((f"라운드 {n} 선택", lambda at, n=n: next(
+            s for s in at.selectbox if s.label == "라운드 선택"
+        ).set_value(n)))
+        steps.extend(_audio_steps(n, session_id, shared, audio_seconds))
+        steps.append((f"라운드 {n} 검사", lambda at, n=n: _save_statement(
+            at, "pros", n, _statement(PROSECUTOR_TEXT, session_id, n, shared))))
+        steps.append((f"라운드 {n} 변호", lambda at, n=n: _save_statement(
+            at, "def", n, _statement(DEFENDER_TEXT, session_id, n, shared))))
+    steps.append(("판결", lambda at: _judgment_button(at).click()))
+    return steps
+
+
+def improved_steps(session_id, rounds, shared, audio_seconds=0.0):
+    """app_improved.py - 사건 불러오기 → 토론 시작 → 라운드별 녹음/저장/다음 라운드 → 판결 요청"""
+    rounds = min(rounds, 2)  # 간편 모드는 라운드 2개로 고정
+    steps = [
+        ("사건 불러오기", lambda at: _button(at, "사건 불러오기").click()),
+        ("토론 시작", lambda at: _button(at, "토론 시작").click()),
+    ]
+    for n in range(1, rounds + 1):
+        steps.extend(_audio_steps(n, session_id, shared, audio_seconds))
+        steps.append((f"라운드 {n} 검사", lambda at, n=n: _save_statement(
+            at, "pros", n, _statement(PROSECUTOR_TEXT, session_id, n, shared))))
+        steps.append((f"라운드 {n} 변호", lambda at, n=n: _save_statement(
+            at, "def", n, _statement(DEFENDER_TEXT, session_id, n, shared))))
+        if n < rounds:
+            steps.append((f"라운드 {n + 1}로", lambda at: _button(at, "다음 라운드").click()))
+    steps.append(("판결", lambda at: _judgment_button(at).click()))
+    return steps
+
+
+SCENARIOS = {
+    "app_simple.py": simple_steps,
+    "app.py": full_steps,
+    "app_improved.py": improved_steps,
+}
+
+
+def _wait_transcriptions(at, rerun, name, limit=TRANSCRIPTION_WAIT_SECONDS):
+    """녹음한 음성 인식 작업이 모두 끝나 화면에 반영될 때까지 재실행 - 걸린 시간(초), 시간 초과면 None"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < limit:
+        if "transcription_jobs" in at.session_state and not at.session_state.transcription_jobs:
+            return time.perf_counter() - started
+        time.sleep(0.2)
+        rerun(f"{name} 대기")
+    return None
+
+
+def run_session(app, session_id, rounds=2, shared=False, think_time=0.0, idle_reruns=2,
+                timeout=120.0, start_delay=0.0, audio_seconds=AUDIO_SECONDS):
+    """교실 하나 - 시나리오 단계마다 재실행 시간을 재서 반환 (녹음 단계는 음성 인식 대기 시간도)"""
+    from streamlit.testing.v1 import AppTest
+
+    install_recorder()
+    time.sleep(start_delay)
+    at = AppTest.from_file(app, default_timeout=timeout)
+    result = {"app": app, "session": session_id, "steps": [], "errors": [], "judged": False,
+              "transcriptions": []}
+    peak_threads = 0
+
+    def rerun(name):
+        nonlocal peak_threads
+        started = time.perf_counter()
+        try:
+            at.run()
+        except Exception as e:
+            result["errors"].append(f"{name}: {type(e).__name__}: {e}")
+        result["steps"].append({"name": name, "seconds": time.perf_counter() - started})
+        for exception in at.exception:
+            result["errors"].append(f"{name}: {exception.value}")
+        peak_threads = max(peak_threads, _thread_count())
+
+    session_started = time.perf_counter()
+    rerun("첫 화면")
+    for name, action in SCENARIOS[app](session_id, rounds, shared, audio_seconds):
+        time.sleep(think_time)
+        try:
+            action(at)
+        except Exception as e:
+            result["errors"].append(f"{name}: {type(e).__name__}: {e}")
+            break
+        rerun(name)
+        if name.startswith("녹음"):
+            waited = _wait_transcriptions(at, rerun, name)
+            if waited is None:
+                result["errors"].append(f"{name}: 음성 인식이 {TRANSCRIPTION_WAIT_SECONDS:.0f}초 안에 끝나지 않음")
+            else:
+                result["transcriptions"].append(waited)
+    for i in range(idle_reruns):
+        time.sleep(think_time)
+        rerun("대기")
+
+    key = "judgment" if app == "app_simple.py" else "ai_judgment"
+    result["judged"] = key in at.session_state and bool(at.session_state[key])
+    result["total_seconds"] = time.perf_counter() - session_started
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["peak_threads"] = peak_threads
+    return result
+
+
+# --- 집계 (부모 프로세스) ---
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(app, results, wall_seconds, mock_stats):
+    # 첫 화면은 모듈 불러오기와 캐시 초기화가 포함되어 따로 봄
+    first = [step["seconds"] for r in results for step in r["steps"] if step["name"] == "첫 화면"]
+    reruns = [step["seconds"] for r in results for step in r["steps"] if step["name"] != "첫 화면"]
+    judgments = [step["seconds"] for r in results for step in r["steps"] if step["name"] == "판결"]
+    transcriptions = [seconds for r in results for seconds in r["transcriptions"]]
+    return {
+        "app": app,
+        "sessions": len(results),
+        "reruns": len(reruns) + len(first),
+        "wall_seconds": wall_seconds,
+        "reruns_per_second": (len(reruns) + len(first)) / wall_seconds if wall_seconds else 0.0,
+        "first_p50": percentile(first, 50),
+        "rerun_p50": percentile(reruns, 50),
+        "rerun_p95": percentile(reruns, 95),
+        "rerun_p99": percentile(reruns, 99),
+        "judgment_p50": percentile(judgments, 50),
+        "judgment_p95": percentile(judgments, 95),
+        "transcriptions": len(transcriptions),
+        "transcription_p50": percentile(transcriptions, 50),
+        "transcription_p95": percentile(transcriptions, 95),
+        "judged": sum(1 for r in results if r["judged"]),
+        "errors": [e for r in results for e in r["errors"]],
+        "peak_rss_mb": max((r["peak_rss_mb"] for r in results), default=0.0),
+        "peak_threads": max((r["peak_threads"] for r in results), default=0),
+        "api": mock_stats,
+    }
+
+
+def format_summary(summary):
+    lines = [
+        f"📊 {summary['app']} - 교실 {summary['sessions']}개 · 재실행 {summary['reruns']}회 "
+        f"· {summary['wall_seconds']:.1f}초 ({summary['reruns_per_second']:.1f}회/초)",
+        f"   재실행 p50 {summary['rerun_p50']:.2f}초 · p95 {summary['rerun_p95']:.2f}초 "
+        f"· p99 {summary['rerun_p99']:.2f}초 (첫 화면 p50 {summary['first_p50']:.2f}초)",
+        f"   판결 단계 p50 {summary['judgment_p50']:.2f}초 · p95 {summary['judgment_p95']:.2f}초 "
+        f"· 판결 완료 {summary['judged']}/{summary['sessions']}",
+        f"   세션당 최대 RSS {summary['peak_rss_mb']:.0f}MB · 최대 스레드 {summary['peak_threads']}개 "
+        f"· API 요청 {summary['api']['requests']} 응답 {summary['api']['statuses']}",
+    ]
+    if summary["transcriptions"]:
+        lines.insert(3, f"   음성 인식 {summary['transcriptions']}건 · 녹음→반영 p50 "
+                        f"{summary['transcription_p50']:.2f}초 · p95 {summary['transcription_p95']:.2f}초")
+    if summary["errors"]:
+        lines.append(f"   ⚠️ 오류 {len(summary['errors'])}건 (예: {summary['errors'][0]})")
+    return "\n".join(lines)
+
+
+def format_sweep(summaries):
+    """교실 수를 바꿔 가며 돌린 결과 - 교실 수마다 한 줄"""
+    lines = [
+        f"📈 {summaries[0]['app']} 교실 수별",
+        "   교실 | 재실행/초 | 재실행 p50 | p95 | 판결 p95 | 음성 인식 p95 | 판결 완료 | 오류 | RSS(MB)",
+    ]
+    for s in summaries:
+        lines.append(
+            f"   {s['sessions']:>4} | {s['reruns_per_second']:>9.1f} | {s['rerun_p50']:>9.2f}초 "
+            f"| {s['rerun_p95']:.2f}초 | {s['judgment_p95']:>6.2f}초 | {s['transcription_p95']:>11.2f}초 "
+            f"| {s['judged']:>4}/{s['sessions']:<4} | {len(s['errors']):>4} | {s['peak_rss_mb']:.0f}"
+        )
+    return "\n".join(lines)
+
+
+def run_load_test(app, sessions, config, rounds=2, shared=False, think_time=0.0, idle_reruns=2,
+                  ramp_seconds=0.0, timeout=120.0, workers=None, audio_seconds=AUDIO_SECONDS):
+    """앱 하나에 교실 sessions개를 동시에 돌리고 요약 반환 - 앱마다 대역 서버와 캐시 폴더를 새로"""
+    server = start_mock_server(config=config)
+    cache_dir = tempfile.mkdtemp(prefix="loadtest-cache-")
+    # 작업 프로세스는 시작할 때 환경변수를 물려받음
+    os.environ.update({
+        "OPENAI_API_KEY": os.environ.get("LOADTEST_API_KEY", "mock-key"),
+        "OPENAI_BASE_URL": server.base_url,
+        "TRIAL_CACHE_DIR": cache_dir,
+        "OPENAI_KEEPWARM_SECONDS": "0",
+        "STREAMLIT_LOGGER_LEVEL": os.environ.get("STREAMLIT_LOGGER_LEVEL", "error"),
+    })
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers or sessions, mp_context=context) as pool:
+            started = time.perf_counter()
+            futures = [
+                pool.submit(run_session, app, i + 1, rounds, shared, think_time, idle_reruns,
+                            timeout, ramp_seconds * i / max(1, sessions), audio_seconds)
+                for i in range(sessions)
+            ]
+            results = [future.result() for future in futures]
+            wall_seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+    return summarize(app, results, wall_seconds, server.stats.as_dict())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="동시 교실 부하 테스트 (로컬 대역 서버 사용)")
+    parser.add_argument("--apps", nargs="+", default=APPS, choices=APPS)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10],
+                        help="동시에 진행하는 교실 수 (여러 개면 차례로 돌려 교실 수별로 한 줄씩 보고)")
+    parser.add_argument("--workers", type=int, help="동시에 돌릴 프로세스 수 (기본: 교실 수)")
+    parser.add_argument("--rounds", type=int, default=2, help="교실마다 진행할 라운드 수")
+    parser.add_argument("--shared-case", action="store_true",
+                        help="모든 교실이 같은 발언 사용 (판결 캐시 효과 확인)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="단계 사이 쉬는 시간(초)")
+    parser.add_argument("--idle-reruns", type=int, default=2, help="판결 뒤 추가 재실행 횟수")
+    parser.add_argument("--audio-seconds", type=float, default=AUDIO_SECONDS,
+                        help="라운드마다 양 팀이 녹음하는 길이(초), 0이면 녹음 없이 텍스트만")
+    parser.add_argument("--ramp", type=float, default=0.0, help="교실 시작을 이 시간(초)에 걸쳐 나눔")
+    parser.add_argument("--timeout", type=float, default=120.0, help="재실행 한 번 제한 시간(초)")
+    parser.add_argument("--latency", type=float, default=1.0, help="대역 서버 첫 토큰 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--audio-latency", type=float, default=1.0, help="대역 서버 음성 인식 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args()
+
+    summaries = []
+    for app in args.apps:
+        sweep = []
+        for sessions in args.sessions:
+            config = MockConfig(
+                latency=args.latency, jitter=args.jitter, token_delay=args.token_delay,
+                audio_latency=args.audio_latency,
+                error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                drop_rate=args.drop_rate, seed=args.seed
+            )
+            summary = run_load_test(
+                app, sessions, config, rounds=args.rounds, shared=args.shared_case,
+                think_time=args.think_time, idle_reruns=args.idle_reruns, ramp_seconds=args.ramp,
+                timeout=args.timeout, workers=args.workers, audio_seconds=args.audio_seconds
+            )
+            print(format_summary(summary), flush=True)
+            sweep.append(summary)
+        if len(sweep) > 1:
+            print(format_sweep(sweep), flush=True)
+        summaries.extend(sweep)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
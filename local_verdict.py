@@ -0,0 +1,73 @@
+"""
+규칙 기반 임시 판결
+AI 판결이 늦거나 실패할 때 발언 품질 점수(calculate_speech_quality)만으로 바로 만드는 판결문
+"""
+
+from utils import calculate_speech_quality
+
+TEAM_NAMES = {"prosecutor": "검사팀", "defender": "변호팀"}
+# 평가 항목별 개선 안내 - calculate_speech_quality의 피드백 문구 기준
+IMPROVEMENT_TIPS = {
+    "✅ 충분한 설명": "주장을 조금 더 길고 자세하게 설명해 보세요.",
+    "✅ 체계적인 구조": "'첫째, 둘째'처럼 순서를 정해 말하면 더 설득력 있어요.",
+    "✅ 근거 제시": "증거나 목격자 진술 같은 근거를 함께 제시해 보세요.",
+    "✅ 가치어 사용": "정의, 공정, 책임 같은 가치어로 주장을 마무리해 보세요.",
+}
+
+
+def score_rounds(rounds):
+    """팀별 라운드 발언 평가 - {팀: [(라운드 번호, 점수, 피드백), ...]}"""
+    results = {team: [] for team in TEAM_NAMES}
+    for i, round_data in enumerate(rounds, 1):
+        for team in TEAM_NAMES:
+            text = (round_data.get(team) or "").strip()
+            if text:
+                score, feedback = calculate_speech_quality(text)
+            else:
+                score, feedback = 0, []
+            results[team].append((i, score, feedback))
+    return results
+
+
+def build_local_verdict(rounds):
+    """AI 판결과 같은 형식(승리 팀, 잘한 점, 개선할 점, 베스트 발언, 점수)의 규칙 기반 판결문"""
+    results = score_rounds(rounds)
+    totals = {
+        team: round(sum(score for _, score, _ in scored) / len(scored)) if scored else 0
+        for team, scored in results.items()
+    }
+    pros, defense = totals["prosecutor"], totals["defender"]
+    if pros == defense:
+        winner = "무승부"
+    else:
+        winner = TEAM_NAMES["prosecutor" if pros > defense else "defender"] + " 승리"
+
+    lines = [
+        "**⚡ 임시 판결 (발언 평가 기준 자동 계산)**",
+        "",
+        f"1. 🏆 **{winner}** - 라운드 평균 발언 점수 검사팀 {pros}점, 변호팀 {defense}점",
+        "2. 👍 잘한 점",
+    ]
+    for team, name in TEAM_NAMES.items():
+        earned = []
+        for _, _, feedback in results[team]:
+            earned.extend(item for item in feedback if item.startswith("✅") and item not in earned)
+        praise = ", ".join(item[2:] for item in earned[:2]) if earned else "끝까지 재판에 참여한 점"
+        lines.append(f"   - {name}: {praise}")
+
+    lines.append("3. 💡 개선할 점")
+    for team, name in TEAM_NAMES.items():
+        earned = {item for _, _, feedback in results[team] for item in feedback}
+        missing = [tip for item, tip in IMPROVEMENT_TIPS.items() if item not in earned]
+        lines.append(f"   - {name}: {missing[0] if missing else '지금처럼 꾸준히 발언해 주세요.'}")
+
+    best = max(
+        ((score, i, team) for team, scored in results.items() for i, score, _ in scored),
+        default=None
+    )
+    if best and best[0] > 0:
+        lines.append(f"4. 🌟 베스트 발언: 라운드 {best[1]} {TEAM_NAMES[best[2]]} ({best[0]}점)")
+    else:
+        lines.append("4. 🌟 베스트 발언: 아직 평가할 발언이 없습니다")
+    lines.append(f"5. 📈 점수: 검사팀 {pros}점, 변호팀 {defense}점 (100점 만점)")
+    return "\n".join(lines)
@@ -0,0 +1,493 @@
+"""
+로컬 OpenAI 대역 서버 (부하 테스트용)
+chat.completions / audio.transcriptions / models 요청에 실제 API 대신 응답
+지연 시간, 오류 비율, 스트림 끊김을 조절할 수 있고, 카세트(cassette.py)로 실제 응답을 녹화/재생함
+
+    python mock_openai.py --port 8765 --latency 2 --token-delay 0.03 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app_simple.py
+
+    # 실제 API 응답을 한 번 녹화 → 이후에는 네트워크 없이 재생
+    python mock_openai.py --mode record --cassette .cache/cassette.jsonl
+    python mock_openai.py --mode replay --cassette .cache/cassette.jsonl
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from cassette import Cassette, request_key, chat_fields, audio_fields
+
+UPSTREAM_URL = "https://api.openai.com"
+MODES = ("mock", "record", "replay")
+
+# 대역 판결문 - 실제 판결과 같은 5단 형식
+MOCK_JUDGMENT = [
+    "1. 🏆 {winner} 승리 - {reason}",
+    "2. 👍 잘한 점",
+    "   - 검사팀: 첫째, 둘째로 순서를 정해 주장했고 목격자 진술을 근거로 들었습니다.",
+    "   - 변호팀: 상황을 차분히 설명하고 공정과 배려의 가치를 강조했습니다.",
+    "3. 💡 개선할 점",
+    "   - 검사팀: 상대 주장을 직접 반박하는 문장을 하나 더 준비해 보세요.",
+    "   - 변호팀: 증거가 되는 사실을 더 구체적으로 제시해 보세요.",
+    "4. 🌟 베스트 발언자: 라운드 {best} {winner}",
+    "5. 📈 점수: 검사팀 {pros}점, 변호팀 {defense}점 (100점 만점)",
+]
+MOCK_REASONS = [
+    "증거를 구체적으로 제시하고 논리가 일관되었습니다.",
+    "상대 주장의 빈틈을 정확히 짚었습니다.",
+    "가치어를 활용해 설득력 있게 마무리했습니다.",
+]
+MOCK_SENTENCE = "첫째, 피고는 급식 줄에서 차례를 지키지 않았습니다. "
+# 녹음 크기 몇 바이트마다 인식 문장 하나
+MOCK_BYTES_PER_SENTENCE = 32 * 1024
+
+
+class MockConfig:
+    """대역 서버 동작 설정 - 실행 중에도 POST /mock/config로 바꿀 수 있음"""
+
+    def __init__(self, latency=1.0, jitter=0.3, token_delay=0.02, audio_latency=1.0,
+                 audio_seconds_per_mb=2.0, error_rate=0.0, rate_limit_rate=0.0,
+                 drop_rate=0.0, retry_after=1.0, strict=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.audio_latency = audio_latency
+        self.audio_seconds_per_mb = audio_seconds_per_mb
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.drop_rate = drop_rate
+        self.retry_after = retry_after
+        self.strict = strict
+        self.seed = seed
+
+    def update(self, values):
+        for name, value in values.items():
+            if name in vars(self):
+                setattr(self, name, value)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class MockStats:
+    """엔드포인트별 요청 수, 응답 코드, 동시 처리 수"""
+
+    def __init__(self):
+        self.requests = {}
+        self.statuses = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def begin(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def end(self, status):
+        with self._lock:
+            self.in_flight -= 1
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "statuses": dict(self.statuses),
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+
+def mock_judgment(seed, max_tokens):
+    """요청마다 같은 결과가 나오는 대역 판결문 (max_tokens 근처에서 자름)"""
+    rng = random.Random(seed)
+    pros, defense = rng.randint(70, 95), rng.randint(70, 95)
+    text = "\n".join(MOCK_JUDGMENT).format(
+        winner="검사팀" if pros >= defense else "변호팀",
+        reason=rng.choice(MOCK_REASONS),
+        best=rng.randint(1, 3),
+        pros=pros,
+        defense=defense
+    )
+    words = text.split(" ")
+    return " ".join(words[:max(1, max_tokens or len(words))])
+
+
+def mock_transcript(audio_bytes):
+    return (MOCK_SENTENCE * max(1, len(audio_bytes) // MOCK_BYTES_PER_SENTENCE)).strip()
+
+
+def _chat_chunk(completion_id, model, delta=None, finish_reason=None, usage=None):
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if usage else [
+            {"index": 0, "delta": delta or {}, "finish_reason": finish_reason}
+        ],
+    }
+    if usage:
+        chunk["usage"] = usage
+    return json.dumps(chunk, ensure_ascii=False)
+
+
+def _usage(body, text):
+    prompt = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 2
+    completion = len(text) // 2
+    return {"prompt_tokens": prompt, "completion_tokens": completion,
+            "total_tokens": prompt + completion}
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """요청 하나 처리 - 서버 설정(self.server.config)에 따라 지연/오류/끊김을 흉내냄"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # --- 요청/응답 기본 ---
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = (body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def _send_error(self, status, message, error_type, headers=None):
+        return self._send(status, {"error": {"message": message, "type": error_type, "code": None}},
+                          headers=headers)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_event(self, data):
+        payload = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # --- 지연/오류 흉내 ---
+
+    def _sleep_latency(self, base):
+        config = self.server.config
+        time.sleep(max(0.0, base + self.server.uniform(-config.jitter, config.jitter)))
+
+    def _injected_error(self):
+        """설정된 비율로 429/500 응답 - 보냈으면 상태 코드, 아니면 None"""
+        config = self.server.config
+        roll = self.server.uniform(0, 1)
+        if roll < config.rate_limit_rate:
+            return self._send_error(
+                429, "Rate limit reached (mock)", "requests",
+                headers={"retry-after": f"{config.retry_after:g}",
+                         "retry-after-ms": str(int(config.retry_after * 1000))}
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            return self._send_error(500, "The server had an error (mock)", "server_error")
+        return None
+
+    # --- 라우팅 ---
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/mock/stats":
+            stats = self.server.stats.as_dict()
+            stats["mode"] = self.server.mode
+            stats["config"] = self.server.config.as_dict()
+            if self.server.cassette is not None:
+                stats["cassette"] = self.server.cassette.stats()
+            return self._send(200, stats)
+        if path.startswith("/v1/models"):
+            self.server.stats.begin("models")
+            model_id = path[len("/v1/models/"):] or None
+            body = ({"id": model_id, "object": "model", "created": 0, "owned_by": "mock"}
+                    if model_id else {"object": "list", "data": []})
+            return self.server.stats.end(self._send(200, body))
+        self._send_error(404, f"Unknown path {path}", "invalid_request_error")
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        raw = self._read_body()
+        if path == "/mock/config":
+            self.server.config.update(json.loads(raw or b"{}"))
+            return self._send(200, self.server.config.as_dict())
+        if path == "/v1/chat/completions":
+            endpoint, handler = "chat", self._chat
+        elif path == "/v1/audio/transcriptions":
+            endpoint, handler = "audio", self._audio
+        else:
+            return self._send_error(404, f"Unknown path {path}", "invalid_request_error")
+        self.server.stats.begin(endpoint)
+        status = 500
+        try:
+            status = handler(path, raw)
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 먼저 끊음 (스트림 취소, 제한 시간 초과)
+            status = 499
+        finally:
+            self.server.stats.end(status)
+
+    # --- chat.completions ---
+
+    def _chat(self, path, raw):
+        body = json.loads(raw or b"{}")
+        key = request_key("chat", chat_fields(body))
+        if self.server.mode == "record":
+            return self._forward(path, raw, "chat", key, stream=bool(body.get("stream")))
+
+        entry = self.server.cassette.play(key) if self.server.mode == "replay" else None
+        if entry is None and self.server.mode == "replay" and self.server.config.strict:
+            return self._send_error(404, "No recorded response for this request", "cassette_miss")
+        error = self._injected_error()
+        if error:
+            return error
+
+        self._sleep_latency(self.server.config.latency)
+        if entry is not None and "events" in entry:
+            return self._replay_stream(entry["events"])
+        if entry is not None:
+            return self._send(entry["status"], entry["body"], entry["content_type"])
+
+        model = body.get("model", "gpt-4")
+        text = mock_judgment(key, body.get("max_tokens"))
+        completion_id = f"chatcmpl-mock-{key[:12]}"
+        if not body.get("stream"):
+            return self._send(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(body, text),
+            })
+
+        events = [_chat_chunk(completion_id, model, {"role": "assistant", "content": ""})]
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            events.append(_chat_chunk(completion_id, model, {"content": word + (" " if i < len(words) - 1 else "")}))
+        events.append(_chat_chunk(completion_id, model, finish_reason="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append(_chat_chunk(completion_id, model, usage=_usage(body, text)))
+        events.append("[DONE]")
+        return self._replay_stream(events)
+
+    def _replay_stream(self, events):
+        """SSE 이벤트를 토큰 간격을 두고 보냄 - drop_rate 비율로 중간에 끊음 (finish_reason 없이)"""
+        config = self.server.config
+        cut = len(events)
+        if self.server.uniform(0, 1) < config.drop_rate:
+            cut = max(1, len(events) // 2)
+        self._start_stream()
+        for i, data in enumerate(events[:cut]):
+            if i:
+                time.sleep(config.token_delay)
+            self._write_event(data)
+        self._end_stream()
+        return 200
+
+    # --- audio.transcriptions ---
+
+    def _audio(self, path, raw):
+        form, audio = self._parse_form(raw)
+        key = request_key("audio", audio_fields(form, audio))
+        if self.server.mode == "record":
+            return self._forward(path, raw, "audio", key)
+
+        entry = self.server.cassette.play(key) if self.server.mode == "replay" else None
+        if entry is None and self.server.mode == "replay" and self.server.config.strict:
+            return self._send_error(404, "No recorded response for this request", "cassette_miss")
+        error = self._injected_error()
+        if error:
+            return error
+
+        config = self.server.config
+        self._sleep_latency(config.audio_latency + len(audio) / (1024 * 1024) * config.audio_seconds_per_mb)
+        if entry is not None:
+            return self._send(entry["status"], entry["body"], entry["content_type"])
+        text = mock_transcript(audio)
+        if form.get("response_format") == "text":
+            return self._send(200, text + "\n", "text/plain; charset=utf-8")
+        return self._send(200, {"text": text})
+
+    def _parse_form(self, raw):
+        """multipart/form-data → (일반 필드 dict, 파일 바이트)"""
+        content_type = self.headers.get("Content-Type", "")
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + raw
+        )
+        form, audio = {}, b""
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename() is not None:
+                audio = payload
+            else:
+                form[name] = payload.decode("utf-8")
+        return form, audio
+
+    # --- 녹화: 실제 API로 전달하고 응답을 카세트에 저장 ---
+
+    def _forward(self, path, raw, endpoint, key, stream=False):
+        headers = {
+            name: value for name, value in self.headers.items()
+            if name.lower() in ("authorization", "content-type", "openai-organization", "openai-project")
+        }
+        if self.server.upstream_key:
+            headers["Authorization"] = f"Bearer {self.server.upstream_key}"
+        url = self.server.upstream + path
+        if not stream:
+            response = self.server.http.post(url, content=raw, headers=headers)
+            content_type = response.headers.get("content-type", "application/json")
+            if response.status_code == 200:
+                self.server.cassette.record(key, endpoint, 200, content_type, body=response.text)
+            return self._send(response.status_code, response.content, content_type,
+                              headers={k: v for k, v in response.headers.items()
+                                       if k.lower().startswith(("retry-after", "x-ratelimit"))})
+
+        with self.server.http.stream("POST", url, content=raw, headers=headers) as response:
+            if response.status_code != 200:
+                response.read()
+                return self._send(response.status_code, response.content,
+                                  response.headers.get("content-type", "application/json"))
+            self._start_stream()
+            events = []
+            for line in response.iter_lines():
+                if line.startswith("data:"):
+                    data = line[len("data:"):].strip()
+                    events.append(data)
+                    self._write_event(data)
+            self._end_stream()
+        if events and events[-1] == "[DONE]":
+            # 끝까지 받은 스트림만 녹화
+            self.server.cassette.record(key, endpoint, 200, "text/event-stream", events=events)
+        return 200
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """요청마다 스레드 하나 - 여러 교실이 동시에 요청하는 상황을 그대로 받음"""
+
+    daemon_threads = True
+
+    def __init__(self, address, config=None, mode="mock", cassette=None,
+                 upstream=UPSTREAM_URL, upstream_key=None, verbose=False):
+        if mode not in MODES:
+            raise ValueError(f"mode는 {MODES} 중 하나여야 합니다: {mode}")
+        if mode != "mock" and cassette is None:
+            raise ValueError(f"{mode} 모드에는 카세트 파일이 필요합니다.")
+        super().__init__(address, MockOpenAIHandler)
+        self.config = config or MockConfig()
+        self.mode = mode
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/")
+        self.upstream_key = upstream_key
+        self.verbose = verbose
+        self.stats = MockStats()
+        self.http = httpx.Client(timeout=httpx.Timeout(120.0, connect=10.0)) if mode == "record" else None
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+
+    def uniform(self, low, high):
+        with self._rng_lock:
+            return self._rng.uniform(low, high)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_mock_server(port=0, host="127.0.0.1", **kwargs):
+    """백그라운드 스레드에서 대역 서버 시작 - 서버 반환 (base_url로 주소 확인, shutdown()으로 종료)"""
+    server = MockOpenAIServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 OpenAI 대역 서버 (부하 테스트용)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mode", choices=MODES, default="mock",
+                        help="mock: 가짜 응답, record: 실제 API 응답 녹화, replay: 녹화한 응답 재생")
+    parser.add_argument("--cassette", help="녹화/재생할 JSONL 파일")
+    parser.add_argument("--strict", action="store_true", help="replay에서 녹화가 없으면 가짜 응답 대신 404")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="record 모드에서 요청을 보낼 실제 API 주소")
+    parser.add_argument("--upstream-key", help="record 모드 API 키 (없으면 앱이 보낸 키 사용)")
+    parser.add_argument("--latency", type=float, default=1.0, help="첫 토큰까지 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="지연 시간 무작위 폭(±초)")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="스트리밍 토큰 사이 간격(초)")
+    parser.add_argument("--audio-latency", type=float, default=1.0, help="음성 인식 기본 지연(초)")
+    parser.add_argument("--audio-seconds-per-mb", type=float, default=2.0, help="녹음 1MB당 추가 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 오류 비율 (0~1)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 응답 비율 (0~1)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="스트림을 중간에 끊는 비율 (0~1)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 응답의 retry-after(초)")
+    parser.add_argument("--seed", type=int, help="지연/오류 난수 시드 (같은 시드면 같은 순서)")
+    parser.add_argument("--verbose", action="store_true", help="요청마다 로그 출력")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency, jitter=args.jitter, token_delay=args.token_delay,
+        audio_latency=args.audio_latency, audio_seconds_per_mb=args.audio_seconds_per_mb,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        drop_rate=args.drop_rate, retry_after=args.retry_after, strict=args.strict, seed=args.seed
+    )
+    cassette = Cassette(args.cassette) if args.cassette else None
+    server = MockOpenAIServer(
+        (args.host, args.port), config=config, mode=args.mode, cassette=cassette,
+        upstream=args.upstream, upstream_key=args.upstream_key, verbose=args.verbose
+    )
+    print(f"🧪 OpenAI 대역 서버 ({args.mode}) - OPENAI_BASE_URL={server.base_url}")
+    if cassette is not None:
+        print(f"📼 카세트 {args.cassette}: {len(cassette)}건")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
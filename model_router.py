@@ -0,0 +1,98 @@
+"""
+판결 모델 선택
+프롬프트 길이, 최근 응답 시간, 요청 대기열을 보고 응답 목표 시간(SLO) 안에 들어올 모델을 고름
+"""
+
+import os
+import time
+
+from rate_limiter import estimate_tokens
+
+# 판결 응답 목표 시간(초) - 학생들이 기다릴 수 있는 한계
+JUDGMENT_SLO_SECONDS = float(os.getenv("JUDGMENT_SLO_SECONDS", "25"))
+# 좋은 모델부터 빠른/저렴한 모델 순서
+MODEL_TIERS = [
+    name.strip()
+    for name in os.getenv("JUDGMENT_MODEL_TIERS", "gpt-4,gpt-3.5-turbo").split(",")
+    if name.strip()
+]
+# 모델별 문맥 길이(토큰)와 기록이 없을 때 쓰는 예상 응답 시간(초, 출력 1000토큰 기준)
+MODEL_PROFILES = {
+    "gpt-4": {"context": 8192, "latency": 20.0},
+    "gpt-4o": {"context": 128000, "latency": 10.0},
+    "gpt-4o-mini": {"context": 128000, "latency": 6.0},
+    "gpt-3.5-turbo": {"context": 16385, "latency": 6.0},
+}
+DEFAULT_PROFILE = {"context": 8192, "latency": 15.0}
+# 최근 기록 몇 개로 응답 시간을 추정할지, 최소 몇 개가 있어야 기록을 믿을지
+LATENCY_WINDOW = 20
+MIN_SAMPLES = 3
+# 이보다 오래된 기록은 무시 - 한 번 내려간 모델도 시간이 지나면 다시 시도
+LATENCY_MAX_AGE = 600
+# 판결 대기열이 이만큼 쌓이면 한 단계 빠른 모델로
+LOAD_QUEUE_THRESHOLD = 5
+
+
+def _profile(model):
+    return MODEL_PROFILES.get(model, DEFAULT_PROFILE)
+
+
+def recent_latency(model, records):
+    """최근 성공한 판결의 전체 응답 시간 75번째 백분위 - 기록이 부족하면 None"""
+    since = time.time() - LATENCY_MAX_AGE
+    totals = [
+        r["total"] for r in records
+        if r["model"] == model and r["ok"] and r["time"] >= since
+    ][-LATENCY_WINDOW:]
+    if len(totals) < MIN_SAMPLES:
+        return None
+    totals.sort()
+    return totals[min(len(totals) - 1, int(len(totals) * 0.75))]
+
+
+def predict_latency(model, prompt_tokens, max_tokens, records):
+    """예상 응답 시간 - 최근 기록이 있으면 그것을, 없으면 모델 기본값에 출력 길이를 반영"""
+    observed = recent_latency(model, records)
+    if observed is not None:
+        return observed
+    # 출력 길이에 따라 절반 정도가 달라지고, 긴 프롬프트는 읽는 시간이 조금 더 걸림
+    latency = _profile(model)["latency"]
+    return latency * (0.5 + 0.5 * min(max_tokens, 1000) / 1000) + prompt_tokens / 4000
+
+
+def choose_model(preferred, system_prompt, prompt, max_tokens, records=(), queue_depth=0,
+                 slo_seconds=JUDGMENT_SLO_SECONDS, tiers=None):
+    """(사용할 모델, 선택 이유) - preferred부터 시작해 필요하면 더 빠른 모델로 내려감"""
+    tiers = list(tiers or MODEL_TIERS)
+    if preferred not in tiers:
+        return preferred, "지정 모델"
+    candidates = tiers[tiers.index(preferred):]
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(prompt)
+
+    # 문맥 길이에 들어가지 않는 모델은 제외
+    fitting = [m for m in candidates if prompt_tokens + max_tokens <= _profile(m)["context"]]
+    if not fitting:
+        return candidates[-1], f"프롬프트가 너무 김 (약 {prompt_tokens}토큰)"
+    reasons = []
+    if fitting[0] != preferred:
+        reasons.append(f"프롬프트 약 {prompt_tokens}토큰")
+
+    # 대기열이 길면 한 단계 빠른 모델부터 고려
+    start = 0
+    if queue_depth >= LOAD_QUEUE_THRESHOLD and len(fitting) > 1:
+        start = 1
+        reasons.append(f"대기 {queue_depth}건")
+
+    predictions = {m: predict_latency(m, prompt_tokens, max_tokens, records) for m in fitting}
+    for model in fitting[start:]:
+        if predictions[model] <= slo_seconds:
+            if model != fitting[0] and not reasons:
+                reasons.append(
+                    f"{fitting[0]} 예상 {predictions[fitting[0]]:.0f}초 > 목표 {slo_seconds:.0f}초"
+                )
+            return model, " · ".join(reasons) if reasons else "기본 모델"
+
+    # 어느 모델도 목표 시간 안에 못 들어오면 가장 빠를 것으로 보이는 모델
+    fastest = min(fitting[start:], key=lambda m: predictions[m])
+    reasons.append(f"모든 모델이 목표 {slo_seconds:.0f}초 초과 예상 - 가장 빠른 모델")
+    return fastest, " · ".join(reasons)
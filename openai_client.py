@@ -0,0 +1,88 @@
+"""
+OpenAI 클라이언트 공유
+프로세스당 비동기 클라이언트 하나와 연결 풀 (keep-alive, 명시적 타임아웃, 미리 연결해 두기)
+요청은 모두 공유 asyncio 루프(reactor.py)에서 처리
+"""
+
+import os
+import threading
+import time
+
+import httpx
+import streamlit as st
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from reactor import AsyncReactor, ReactorClient, MAX_CONCURRENT_REQUESTS
+
+# 타임아웃(초) - 연결은 빨리 포기하고, 판결 생성처럼 긴 응답은 충분히 기다림
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0
+WRITE_TIMEOUT = 30.0
+POOL_TIMEOUT = 10.0
+# 연결 풀 - 여러 교실이 동시에 써도 연결을 재사용
+MAX_CONNECTIONS = 50
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 120.0
+# SDK 자체 재시도는 끔 - 속도 제한을 거치지 않고 판결 재시도와 곱해지므로
+# 429는 reactor.py가 대기열에 다시 넣고, 판결 오류는 judgment.py가 재시도
+MAX_RETRIES = 0
+# 쉬는 시간에도 연결이 끊기지 않도록 주기적으로 가볍게 요청 (0이면 사용 안 함)
+KEEPWARM_SECONDS = float(os.getenv("OPENAI_KEEPWARM_SECONDS", "60"))
+
+
+def create_async_client(api_key):
+    """연결 풀과 타임아웃을 지정한 비동기 OpenAI 클라이언트"""
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+    )
+    # 타임아웃은 요청마다 클라이언트 설정이 적용되므로 OpenAI 쪽에 지정
+    return AsyncOpenAI(
+        api_key=api_key,
+        http_client=http_client,
+        timeout=httpx.Timeout(
+            READ_TIMEOUT,
+            connect=CONNECT_TIMEOUT,
+            write=WRITE_TIMEOUT,
+            pool=POOL_TIMEOUT
+        ),
+        max_retries=MAX_RETRIES
+    )
+
+
+async def _ping(client):
+    await client.with_options(timeout=CONNECT_TIMEOUT * 2).models.retrieve("whisper-1")
+
+
+def _warm(client):
+    """TLS 연결을 미리 맺어 둠 - 첫 판결이 연결 비용을 치르지 않도록 (실패해도 무시)"""
+    try:
+        client.submit(_ping).result()
+    except Exception:
+        pass
+
+
+def _keep_warm(client):
+    while True:
+        _warm(client)
+        time.sleep(KEEPWARM_SECONDS)
+
+
+@st.cache_resource
+def get_openai_client(api_key, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """서버 프로세스 전체에서 하나만 쓰는 OpenAI 클라이언트 (공유 루프 창구)
+
+    스크립트가 다시 실행될 때마다 새 HTTP 클라이언트를 만들지 않으므로
+    호출마다 TLS 연결을 새로 맺지 않음. 동기 클라이언트처럼 호출할 수 있고,
+    client.submit()으로 코루틴을 넘기면 Future를 바로 돌려받음
+    """
+    reactor = AsyncReactor(lambda: create_async_client(api_key), max_concurrency)
+    client = ReactorClient(reactor)
+
+    # 서버가 처음 뜰 때 백그라운드에서 연결해 두기
+    target = _keep_warm if KEEPWARM_SECONDS > 0 else _warm
+    threading.Thread(target=target, args=(client,), name="openai-warmup", daemon=True).start()
+    return client
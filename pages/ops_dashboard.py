@@ -0,0 +1,144 @@
+"""
+API 운영 현황 (관리자 전용 페이지)
+엔드포인트별 지연 백분위, 오류율, 진행 중인 호출, 최근 호출 기록, Prometheus 내보내기
+주소: /ops_dashboard?admin=<ADMIN_KEY>
+"""
+
+import time
+from datetime import datetime
+
+import streamlit as st
+
+from admin import is_admin, show_judgment_metrics
+from api_telemetry import get_api_telemetry
+from usage_budget import budget_period, get_usage_ledger
+
+st.set_page_config(page_title="API 운영 현황", page_icon="📈", layout="wide")
+
+if not is_admin():
+    st.warning("🔒 관리자만 볼 수 있는 페이지입니다.")
+    st.stop()
+
+ENDPOINT_LABELS = {"judgment": "⚖️ 판결", "round_eval": "🧮 라운드 평가", "transcription": "🎤 음성 인식"}
+WINDOWS = {"최근 5분": 300, "최근 1시간": 3600, "최근 24시간": 86400, "전체 (보관 중인 기록)": None}
+RECENT_LIMIT = 50
+
+
+def seconds(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+telemetry = get_api_telemetry()
+
+st.title("📈 API 운영 현황")
+col1, col2 = st.columns([3, 1])
+with col1:
+    window = st.radio("기간", list(WINDOWS), horizontal=True, key="ops_window")
+with col2:
+    if st.button("🔄 새로고침", use_container_width=True):
+        st.rerun()
+since = time.time() - WINDOWS[window] if WINDOWS[window] else None
+
+# 엔드포인트별 요약
+summary = telemetry.summary(since)
+if summary:
+    st.dataframe(
+        [
+            {
+                "엔드포인트": ENDPOINT_LABELS.get(endpoint, endpoint),
+                "호출": stats["calls"],
+                "진행 중": stats["in_flight"],
+                "오류율": f"{stats['error_rate']:.1%}",
+                "캐시 적중": f"{stats['cache_hit_rate']:.0%}",
+                "p50(초)": seconds(stats["p50"]),
+                "p95(초)": seconds(stats["p95"]),
+                "p99(초)": seconds(stats["p99"]),
+                "첫 토큰 p50(초)": seconds(stats["ttft_p50"]),
+                "입력 토큰": stats["prompt_tokens"],
+                "출력 토큰": stats["completion_tokens"],
+                "오디오(초)": round(stats["audio_seconds"], 1),
+                "보낸 양(KB)": round(stats["bytes_sent"] / 1024, 1),
+            }
+            for endpoint, stats in summary.items()
+        ],
+        hide_index=True
+    )
+    st.caption("지연 백분위는 캐시 적중을 뺀 호출 기준 · 오류율에는 한도 초과/회로 차단/임시 판결도 포함")
+else:
+    st.info("이 기간에 기록된 API 호출이 없습니다.")
+
+# 진행 중인 호출
+st.subheader("⏳ 진행 중인 호출")
+live = telemetry.in_flight()
+if live:
+    st.dataframe(
+        [
+            {
+                "엔드포인트": ENDPOINT_LABELS.get(call["endpoint"], call["endpoint"]),
+                "경과(초)": round(call["seconds"], 1),
+                "모델": call["model"],
+                "세션": call["session"],
+            }
+            for call in live
+        ],
+        hide_index=True
+    )
+else:
+    st.caption("진행 중인 호출이 없습니다.")
+
+# 최근 호출
+st.subheader("🧾 최근 호출")
+records = telemetry.records(since)[-RECENT_LIMIT:]
+if records:
+    st.dataframe(
+        [
+            {
+                "시각": datetime.fromtimestamp(record["time"]).strftime("%H:%M:%S"),
+                "엔드포인트": ENDPOINT_LABELS.get(record["endpoint"], record["endpoint"]),
+                "결과": record["outcome"],
+                "캐시": record.get("cache"),
+                "모델": record.get("model"),
+                "시간(초)": round(record["seconds"], 2),
+                "토큰": (record.get("prompt_tokens") or 0) + (record.get("completion_tokens") or 0),
+                "세션": record.get("session"),
+            }
+            for record in reversed(records)
+        ],
+        hide_index=True
+    )
+else:
+    st.caption("기록이 없습니다.")
+
+# 학급별 사용량과 예산
+st.subheader(f"💰 학급별 사용량 ({budget_period()})")
+ledger = get_usage_ledger()
+classes = ledger.classes()
+if classes:
+    rows = []
+    for class_id in classes:
+        usage = ledger.class_usage(class_id)
+        status = ledger.budget_status(class_id)
+        rows.append({
+            "학급": class_id,
+            "판결": usage["judgments"],
+            "판결 토큰": usage["judgment_tokens"],
+            "전체 토큰": usage["tokens"],
+            "음성 인식(분)": round(usage["audio_seconds"] / 60, 1),
+            "비용(USD)": round(usage["cost"], 3),
+            "예산(USD)": status["budget"] or "-",
+            "상태": {"ok": "🟢 여유", "downgrade": "🟡 저렴한 모델", "exhausted": "🔴 규칙 기반 판결"}[status["state"]],
+        })
+    st.dataframe(rows, hide_index=True)
+else:
+    st.caption("이번 달 사용량이 없습니다.")
+
+with st.expander("⚖️ 판결 응답 속도"):
+    show_judgment_metrics()
+
+# Prometheus 텍스트 형식 - 수집기가 있으면 API_METRICS_PROM_FILE로 파일을 주기적으로 써 둘 수도 있음
+with st.expander("📤 Prometheus 내보내기"):
+    metrics_text = telemetry.prometheus_text()
+    st.download_button("⬇️ metrics.prom 다운로드", metrics_text, file_name="metrics.prom", mime="text/plain")
+    st.code(metrics_text, language="text")
+    if telemetry.log_path:
+        st.caption(f"호출 기록 파일: {telemetry.log_path} (최대 {telemetry.max_bytes // (1024 * 1024)}MB × {telemetry.backups + 1}개)")
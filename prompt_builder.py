@@ -0,0 +1,232 @@
+"""
+판결 프롬프트 생성
+토큰 예산 안에서 프롬프트를 만들고, 넘치면 긴 발언부터 핵심 문장만 남겨 줄임
+(바뀌지 않는 사건 개요와 판결 형식을 앞에 두어 같은 사건이면 프롬프트 앞부분이 항상 같음)
+"""
+
+import json
+import re
+
+import streamlit as st
+
+from rate_limiter import estimate_tokens
+
+# 판결 프롬프트 기본 예산(토큰) - 출력 토큰과 합쳐도 모델 문맥 길이에 여유가 있도록
+JUDGMENT_PROMPT_BUDGET = 3000
+# 줄이더라도 발언 하나에 남기는 최소 토큰
+MIN_STATEMENT_TOKENS = 40
+# 사전 평가가 있는 라운드는 발언 전체 대신 평가와 이만큼의 발췌만 보냄
+EXCERPT_TOKENS = 60
+# 핵심 문장을 고를 때 가산점을 주는 말 (calculate_speech_quality의 평가 기준과 같은 말)
+KEY_TERMS = [
+    "첫째", "둘째", "셋째", "증거", "목격", "사실", "왜냐하면", "때문",
+    "정의", "공정", "책임", "배려", "존중", "신뢰", "협력",
+]
+TEAM_LABELS = [("prosecutor", "검사"), ("defender", "변호")]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。])\s+|(?<=다)\s+|(?<=요)\s+|\n+")
+
+
+def split_sentences(text):
+    """문장 단위로 나누기 - 마침표가 없는 말투(~다, ~요)도 문장 끝으로 봄"""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+def _sentence_score(sentence, index, count):
+    score = sum(2 for term in KEY_TERMS if term in sentence)
+    if index == 0 or index == count - 1:
+        # 첫 문장(주장)과 마지막 문장(결론)은 남기는 편이 좋음
+        score += 1.5
+    return score + min(len(sentence), 80) / 80
+
+
+def _join(sentences, indices):
+    """고른 문장을 원래 순서로 잇기 - 빠진 문장이 있는 자리에만 … 표시"""
+    parts = []
+    for n, i in enumerate(indices):
+        if n and i != indices[n - 1] + 1:
+            parts.append("…")
+        parts.append(sentences[i])
+    return " ".join(parts)
+
+
+def _truncate(text, max_tokens):
+    """한 문장짜리는 앞부분만 - 단어 단위로 자르되, 띄어쓰기 없이 긴 덩어리는 글자 단위로"""
+    def fits(head):
+        return estimate_tokens(head + " …") <= max_tokens
+
+    words = text.split()
+    kept = []
+    for word in words:
+        if not fits(" ".join(kept + [word])):
+            break
+        kept.append(word)
+    head = " ".join(kept)
+    if len(kept) < len(words) and not fits(words[len(kept)]):
+        # 다음 단어 하나가 예산보다 김 (예: 띄어쓰기 없는 긴 글) - 남는 자리만큼 글자로 채움
+        prefix = head + " " if head else ""
+        word = words[len(kept)]
+        low, high = 0, len(word)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if fits(prefix + word[:middle]):
+                low = middle
+            else:
+                high = middle - 1
+        if low:
+            head = prefix + word[:low]
+    return head + " …" if head else "…"
+
+
+def compact_text(text, max_tokens):
+    """핵심 문장만 남겨 max_tokens 안으로 줄이기 (추출 요약, 원래 순서 유지)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sentences = split_sentences(text)
+    if len(sentences) <= 1:
+        return _truncate(text, max_tokens)
+
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: _sentence_score(sentences[i], i, len(sentences)),
+        reverse=True
+    )
+    chosen = []
+    for i in ranked:
+        candidate = sorted(chosen + [i])
+        if estimate_tokens(_join(sentences, candidate)) > max_tokens:
+            continue
+        chosen = candidate
+    if not chosen:
+        return compact_text(sentences[ranked[0]], max_tokens)
+    return _join(sentences, chosen)
+
+
+def _fair_shares(sizes, available):
+    """짧은 발언은 그대로 두고, 남는 예산을 긴 발언끼리 똑같이 나눔"""
+    shares = list(sizes)
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    remaining = available
+    while pending:
+        share = max(MIN_STATEMENT_TOKENS, remaining // len(pending))
+        if sizes[pending[0]] <= share:
+            remaining -= sizes[pending[0]]
+            pending.pop(0)
+            continue
+        for i in pending:
+            shares[i] = share
+        break
+    return shares
+
+
+def _round_texts(rounds, round_evals):
+    """라운드별로 프롬프트에 넣을 글 {(라운드 인덱스, 필드): 글}
+
+    사전 평가가 있는 라운드는 평가를 중심으로, 발언은 핵심 문장 발췌만 (최종 판결은 평가를 종합)
+    """
+    texts = {}
+    for i, round_data in enumerate(rounds):
+        if i in round_evals:
+            texts[(i, "evaluation")] = round_evals[i]
+        for team, _ in TEAM_LABELS:
+            if round_data.get(team):
+                text = round_data[team]
+                if i in round_evals:
+                    text = compact_text(text, EXCERPT_TOKENS)
+                texts[(i, team)] = text
+    return texts
+
+
+def _format_rounds(rounds, texts):
+    lines = []
+    for i in range(len(rounds)):
+        if not any((i, field) in texts for field in ("evaluation", "prosecutor", "defender")):
+            continue
+        lines.append(f"라운드 {i + 1}:")
+        evaluated = (i, "evaluation") in texts
+        if evaluated:
+            lines.append(f"사전 평가: {texts[(i, 'evaluation')]}")
+        for team, label in TEAM_LABELS:
+            if (i, team) in texts:
+                lines.append(f"{label}{' (발췌)' if evaluated else ''}: {texts[(i, team)]}")
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+class PromptReport:
+    """프롬프트 크기 보고 - 줄이기 전/후 예상 토큰과 줄인 발언 수"""
+
+    def __init__(self, tokens_before, tokens_after, budget, compacted):
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.budget = budget
+        self.compacted = compacted
+
+    def as_dict(self):
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "budget": self.budget,
+            "compacted": self.compacted,
+        }
+
+
+def build_judgment_prompt(case, rounds, instructions, round_evals=None,
+                          intro="중학생 모의재판을 평가해주세요.",
+                          budget=JUDGMENT_PROMPT_BUDGET):
+    """(프롬프트, PromptReport) - 고정 부분(안내, 사건 개요, 판결 형식)을 앞에, 라운드 내용을 뒤에
+
+    round_evals({라운드 인덱스: 사전 평가})가 있는 라운드는 발언 전체 대신 평가와 짧은 발췌를 보냄
+    """
+    round_evals = round_evals or {}
+    prefix = f"{intro}\n\n[사건 개요]\n{case.strip()}\n\n[판결 형식]\n{instructions.strip()}\n\n[토론 내용]\n"
+    suffix = "\n\n사전 평가가 있는 라운드는 그 평가를 종합해서 판결해주세요." if round_evals else ""
+
+    texts = _round_texts(rounds, round_evals)
+    full = prefix + _format_rounds(rounds, texts) + suffix
+    before = estimate_tokens(full)
+    if before <= budget:
+        return full, PromptReport(before, before, budget, 0)
+
+    # 예산을 넘으면 라운드 내용(발언, 사전 평가)만 줄임 (사건 개요, 형식은 그대로)
+    fields = list(texts)
+    sizes = [estimate_tokens(texts[field]) for field in fields]
+    fixed = before - sum(sizes)
+    shares = _fair_shares(sizes, max(0, budget - fixed))
+
+    compacted = 0
+    for field, size, share in zip(fields, sizes, shares):
+        if size > share:
+            texts[field] = compact_text(texts[field], share)
+            compacted += 1
+
+    prompt = prefix + _format_rounds(rounds, texts) + suffix
+    return prompt, PromptReport(before, estimate_tokens(prompt), budget, compacted)
+
+
+def debate_snapshot(case, rounds):
+    """판결에 들어가는 토론 내용 - 이것이 같으면 같은 프롬프트를 써야 판결 캐시가 맞음"""
+    return json.dumps([case, rounds], ensure_ascii=False, sort_keys=True)
+
+
+def pinned_prompt(snapshot):
+    """토론 내용이 그대로면 세션에 고정해 둔 (프롬프트, PromptReport), 없거나 바뀌었으면 None"""
+    pinned = st.session_state.get("pinned_prompt")
+    if pinned and pinned["snapshot"] == snapshot:
+        return pinned["prompt"], pinned["report"]
+    return None
+
+
+def pin_prompt(snapshot, prompt, report):
+    """사전 평가가 모두 정해진 뒤 만든 프롬프트를 세션에 고정 - 다시 누르면 같은 프롬프트"""
+    st.session_state.pinned_prompt = {"snapshot": snapshot, "prompt": prompt, "report": report}
+
+
+def record_prompt_report(report):
+    """세션에 마지막 프롬프트 크기를 남기고, 줄인 경우 한 줄 안내"""
+    st.session_state.prompt_report = report.as_dict()
+    if report.compacted:
+        st.caption(
+            f"📝 긴 발언 {report.compacted}개를 핵심 문장만 남겨 "
+            f"프롬프트를 약 {report.tokens_before}→{report.tokens_after}토큰으로 줄였습니다."
+        )
@@ -0,0 +1,188 @@
+"""
+프로세스 전체 요청 속도 제한
+종류(chat/audio)별 분당 요청 수(RPM)와 분당 토큰 수(TPM) 토큰 버킷, 먼저 온 순서대로 대기
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+# OpenAI 계정 한도에 맞춰 조절 (0이면 제한 없음)
+CHAT_RPM = int(os.getenv("OPENAI_CHAT_RPM", "500"))
+CHAT_TPM = int(os.getenv("OPENAI_CHAT_TPM", "40000"))
+AUDIO_RPM = int(os.getenv("OPENAI_AUDIO_RPM", "50"))
+# 429 응답에 Retry-After가 없을 때 쉬는 시간(초)
+DEFAULT_RETRY_AFTER = 5.0
+
+
+def estimate_tokens(text):
+    """토크나이저 없이 대략적인 토큰 수 - 한글은 글자당 약 1토큰, 영문/숫자는 4글자당 약 1토큰"""
+    text = text or ""
+    wide = sum(1 for ch in text if ord(ch) > 127)
+    return wide + (len(text) - wide) // 4 + 1
+
+
+def estimate_chat_tokens(messages, max_tokens=0):
+    """채팅 요청 하나가 쓸 토큰 - 입력 추정치 + 최대 출력"""
+    prompt = sum(estimate_tokens(m.get("content")) + 4 for m in messages)
+    return prompt + (max_tokens or 0)
+
+
+class TokenBucket:
+    """분당 한도를 초당 일정하게 다시 채우는 버킷
+
+    꺼내기(take/pause)는 루프 스레드에서만 하고, 남은 양은 (양, 시각) 한 덩어리로 바꿔 넣어
+    다른 스레드(화면의 예상 대기 시간)는 잠금 없이 읽기만 함
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.state = (self.capacity, time.monotonic())
+
+    def level_at(self, now):
+        """now 시점까지 다시 채워진 양 (상태는 바꾸지 않음)"""
+        level, updated = self.state
+        return min(self.capacity, level + max(0.0, now - updated) * self.rate)
+
+    def delay(self, amount, now):
+        """amount만큼 꺼낼 수 있을 때까지 기다려야 하는 시간(초)"""
+        level = self.level_at(now)
+        need = min(amount, self.capacity)
+        if level >= need:
+            return 0.0
+        return (need - level) / self.rate
+
+    def take(self, amount):
+        now = time.monotonic()
+        self.state = (self.level_at(now) - min(amount, self.capacity), now)
+
+    def pause(self, seconds):
+        """한도 초과(429) 응답 후 seconds 동안 비워 둠"""
+        now = time.monotonic()
+        self.state = (min(self.level_at(now), -self.rate * seconds), now)
+
+
+class Ticket:
+    """요청 하나의 대기 순번 - 화면에 '앞에 N건'을 보여 주는 데 사용"""
+
+    def __init__(self, limiter, kind, number, tokens):
+        self.limiter = limiter
+        self.kind = kind
+        self.number = number
+        self.tokens = tokens
+        self.started = False
+
+    def ahead(self):
+        """앞에서 기다리는 요청 수"""
+        return self.limiter.ahead(self)
+
+    def eta(self):
+        """차례가 올 때까지 예상 시간(초)"""
+        return self.limiter.eta(self)
+
+
+class _Lane:
+    """종류별 대기열 - 요청 버킷, 토큰 버킷, 먼저 온 순서를 지키는 잠금"""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.lock = asyncio.Lock()
+        self.waiting = {}
+        self.issued = 0
+        self.served = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+
+
+class RateLimiter:
+    """종류별 RPM/TPM 한도 - 모든 세션의 요청이 같은 대기열을 공유"""
+
+    def __init__(self, limits=None):
+        if limits is None:
+            limits = {"chat": (CHAT_RPM, CHAT_TPM), "audio": (AUDIO_RPM, 0)}
+        self._lanes = {kind: _Lane(rpm, tpm) for kind, (rpm, tpm) in limits.items()}
+        self._lock = threading.Lock()
+
+    def ticket(self, kind, tokens=0):
+        """순번 발급 - 제한 대상이 아닌 종류면 None"""
+        lane = self._lanes.get(kind)
+        if lane is None:
+            return None
+        with self._lock:
+            ticket = Ticket(self, kind, lane.issued, tokens)
+            lane.issued += 1
+            lane.waiting[ticket.number] = ticket
+        return ticket
+
+    async def acquire(self, ticket):
+        """한도 안에 들어올 때까지 순서대로 대기한 뒤 버킷에서 차감"""
+        lane = self._lanes[ticket.kind]
+        started = time.monotonic()
+        try:
+            # asyncio.Lock은 기다린 순서대로 넘겨주므로 먼저 온 요청이 먼저 나감
+            async with lane.lock:
+                while True:
+                    now = time.monotonic()
+                    delay = max(
+                        lane.requests.delay(1, now) if lane.requests else 0.0,
+                        lane.tokens.delay(ticket.tokens, now) if lane.tokens else 0.0
+                    )
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                if lane.requests:
+                    lane.requests.take(1)
+                if lane.tokens:
+                    lane.tokens.take(ticket.tokens)
+        finally:
+            with self._lock:
+                lane.waiting.pop(ticket.number, None)
+        ticket.started = True
+        lane.served += 1
+        lane.wait_total += time.monotonic() - started
+
+    def requeue(self, ticket, retry_after=None):
+        """429를 받은 요청을 다시 대기열에 넣고 해당 종류 전체를 잠시 멈춤"""
+        lane = self._lanes[ticket.kind]
+        lane.throttled += 1
+        seconds = retry_after if retry_after else DEFAULT_RETRY_AFTER
+        if lane.requests:
+            lane.requests.pause(seconds)
+        if lane.tokens:
+            lane.tokens.pause(seconds)
+        ticket.started = False
+        with self._lock:
+            lane.waiting[ticket.number] = ticket
+
+    def ahead(self, ticket):
+        lane = self._lanes[ticket.kind]
+        with self._lock:
+            return sum(1 for number in lane.waiting if number < ticket.number)
+
+    def eta(self, ticket):
+        """앞선 요청 수와 현재 버킷 상태로 계산한 대략적인 대기 시간 (화면 스레드에서 호출 - 버킷은 읽기만)"""
+        lane = self._lanes[ticket.kind]
+        now = time.monotonic()
+        ahead = self.ahead(ticket)
+        seconds = 0.0
+        if lane.requests:
+            seconds = max(seconds, lane.requests.delay(ahead + 1, now))
+        if lane.tokens:
+            seconds = max(seconds, lane.tokens.delay(ticket.tokens * (ahead + 1), now))
+        return seconds
+
+    def stats(self):
+        """종류별 대기 수, 처리 수, 429 횟수, 평균 대기 시간"""
+        with self._lock:
+            return {
+                kind: {
+                    "waiting": len(lane.waiting),
+                    "served": lane.served,
+                    "throttled": lane.throttled,
+                    "avg_wait": lane.wait_total / lane.served if lane.served else 0.0,
+                }
+                for kind, lane in self._lanes.items()
+            }
@@ -0,0 +1,205 @@
+"""
+공유 비동기 I/O 루프
+서버 프로세스당 asyncio 이벤트 루프 하나가 모든 OpenAI 요청을 처리
+(분당 한도는 rate_limiter의 토큰 버킷, 동시 요청 수는 세마포어 하나로 제한)
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+from openai import RateLimitError
+
+from rate_limiter import RateLimiter, estimate_chat_tokens
+
+# 동시에 진행하는 OpenAI 요청 수 (모든 교실 합계)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+# 429를 받은 요청을 대기열에 다시 넣는 최대 횟수
+MAX_RATE_LIMIT_RETRIES = 5
+# 스트림 첫 조각을 기다리는 동안 대기 순서를 알려 주는 간격(초)
+WAIT_POLL_SECONDS = 0.5
+
+
+def _retry_after(error):
+    """429 응답의 Retry-After 헤더(초) - 없으면 None"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class ReactorStream:
+    """루프에서 받은 스트리밍 조각을 동기로 읽는 이터레이터
+
+    첫 조각을 기다리는 동안 on_wait(ticket)을 주기적으로 불러 대기 순서를 알릴 수 있음.
+    timeout(초)을 정하면 한도 대기열을 통과한 뒤부터 그 시간이 지나면 TimeoutError
+    """
+
+    def __init__(self, future, chunks, done, ticket):
+        self.future = future
+        self.ticket = ticket
+        self.on_wait = None
+        self.timeout = None
+        self._chunks = chunks
+        self._done = done
+        self._admitted = time.monotonic() if ticket is None else None
+
+    def _check_deadline(self):
+        if self.timeout is None:
+            return
+        if self._admitted is None:
+            # 대기열에서 차례를 기다린 시간은 빼고 계산
+            if not self.ticket.started:
+                return
+            self._admitted = time.monotonic()
+        if time.monotonic() - self._admitted > self.timeout:
+            raise TimeoutError(f"{self.timeout:.0f}초 안에 응답을 다 받지 못했습니다.")
+
+    def __iter__(self):
+        try:
+            while True:
+                try:
+                    chunk = self._chunks.get(timeout=WAIT_POLL_SECONDS)
+                except queue.Empty:
+                    if self.on_wait is not None:
+                        self.on_wait(self.ticket)
+                    self._check_deadline()
+                    continue
+                if chunk is self._done:
+                    self.future.result()  # 스트림 중 오류가 있었으면 여기서 다시 발생
+                    return
+                self._check_deadline()
+                yield chunk
+        finally:
+            # 소비하는 쪽이 중간에 그만두면 루프 쪽 요청도 취소
+            self.future.cancel()
+
+
+class AsyncReactor:
+    """백그라운드 스레드에서 도는 asyncio 루프 + 비동기 OpenAI 클라이언트
+
+    스크립트 쪽에서는 submit()으로 코루틴을 넘기고 Future를 받음.
+    요청이 소켓을 기다리는 동안 스크립트/작업 스레드를 붙잡아 두지 않음
+    """
+
+    def __init__(self, client_factory, max_concurrency=MAX_CONCURRENT_REQUESTS, limiter=None):
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter or RateLimiter()
+        self._client = client_factory()
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._active = 0
+        self._waiting = 0
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="openai-reactor", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop.call_soon(self._ready.set)
+        self._loop.run_forever()
+
+    async def _limited(self, coro_fn, ticket):
+        """분당 한도 -> 동시 요청 한도 순서로 통과한 뒤 코루틴 실행
+
+        429를 받으면 해당 종류를 Retry-After 동안 멈추고 대기열에 다시 넣음
+        (대기/진행 수는 루프 스레드에서만 변경)
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            if ticket is not None:
+                await self.limiter.acquire(ticket)
+            self._waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                # 기다리다 취소된 경우에도 대기 수는 되돌림
+                self._waiting -= 1
+            self._active += 1
+            try:
+                return await coro_fn(self._client)
+            except RateLimitError as e:
+                if ticket is None or attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                self.limiter.requeue(ticket, _retry_after(e))
+            finally:
+                self._active -= 1
+                self._semaphore.release()
+
+    def submit(self, coro_fn, kind=None, tokens=0):
+        """coro_fn(비동기 클라이언트) 코루틴을 루프에 맡기고 concurrent.futures.Future 반환
+
+        kind("chat"/"audio")를 주면 해당 종류의 분당 한도 대기열을 거침.
+        반환된 Future의 ticket으로 대기 순서를 확인할 수 있음
+        """
+        ticket = self.limiter.ticket(kind, tokens) if kind else None
+        future = asyncio.run_coroutine_threadsafe(self._limited(coro_fn, ticket), self._loop)
+        future.ticket = ticket
+        return future
+
+    def stream(self, coro_fn, kind=None, tokens=0):
+        """스트리밍 응답을 동기 이터레이터(ReactorStream)로 - 루프에서 받은 조각을 큐로 전달"""
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump(client):
+            response = await coro_fn(client)
+            async for chunk in response:
+                chunks.put(chunk)
+
+        future = self.submit(pump, kind, tokens)
+        future.add_done_callback(lambda _: chunks.put(done))
+        return ReactorStream(future, chunks, done, future.ticket)
+
+    def stats(self):
+        """현재 진행 중/대기 중인 요청 수와 종류별 분당 한도 대기열"""
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "queues": self.limiter.stats(),
+        }
+
+
+class ReactorClient:
+    """동기 OpenAI 클라이언트처럼 쓸 수 있는 얇은 창구 - 실제 요청은 공유 루프에서 처리
+
+    client.chat.completions.create(...)와 client.audio.transcriptions.create(...)를
+    기존 코드 그대로 부를 수 있고, 결과를 기다리지 않으려면 submit()을 사용
+    """
+
+    def __init__(self, reactor):
+        self.reactor = reactor
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_create))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe_create))
+
+    def submit(self, coro_fn, kind=None, tokens=0):
+        return self.reactor.submit(coro_fn, kind, tokens)
+
+    def _chat_create(self, **kwargs):
+        tokens = estimate_chat_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        call = lambda client: client.chat.completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return self.reactor.stream(call, "chat", tokens)
+        return self.reactor.submit(call, "chat", tokens).result()
+
+    def _transcribe_create(self, **kwargs):
+        def call(client):
+            # 429 뒤 대기열에서 다시 보낼 때도 파일을 처음부터 읽도록
+            if hasattr(kwargs.get("file"), "seek"):
+                kwargs["file"].seek(0)
+            return client.audio.transcriptions.create(**kwargs)
+
+        return self.reactor.submit(call, "audio").result()
+
+    def stats(self):
+        return self.reactor.stats()
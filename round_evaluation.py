@@ -0,0 +1,303 @@
+"""
+라운드별 사전 평가
+검사/변호 발언이 모두 저장된 라운드는 백그라운드에서 미리 평가해 두고,
+최종 판결은 저장된 평가를 모아서 사용 (수정된 라운드만 다시 평가)
+"""
+
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import streamlit as st
+
+from api_telemetry import get_api_telemetry, session_tags
+from cache_store import TieredCache
+from judgment import normalize_text, get_judgment_breaker
+from prompt_builder import debate_snapshot, pin_prompt, pinned_prompt
+from rate_limiter import estimate_chat_tokens
+from usage_budget import current_class, get_usage_ledger
+
+# 라운드 평가는 짧고 빠른 모델로
+ROUND_EVAL_MODEL = "gpt-3.5-turbo"
+ROUND_EVAL_MAX_TOKENS = 300
+ROUND_EVAL_SYSTEM_PROMPT = "당신은 중학생 모의재판의 공정한 평가자입니다. 짧고 구체적으로 평가합니다."
+# 사건 하나의 라운드 평가를 보관하는 기간
+ROUND_EVAL_TTL = 7 * 24 * 3600
+# 판결을 요청할 때 아직 진행 중인 라운드 평가를 기다리는 최대 시간(초)
+# (판결 첫 토큰과 임시 판결이 그만큼 늦어지므로 짧게 - 넘기면 평가 없이 판결)
+ROUND_EVAL_WAIT_SECONDS = 2
+
+# 공유 루프 클라이언트가 아닐 때 평가 요청을 보내는 스레드
+_eval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="round-eval")
+
+
+def round_eval_key(case, round_num, prosecutor, defender):
+    """사건 + 라운드 번호 + 두 발언의 정규화 해시 - 한 라운드만 고치면 그 라운드 키만 바뀜"""
+    canonical = json.dumps(
+        {
+            "model": ROUND_EVAL_MODEL,
+            "case": normalize_text(case),
+            "round": round_num,
+            "prosecutor": normalize_text(prosecutor),
+            "defender": normalize_text(defender),
+        },
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def round_eval_messages(case, round_num, prosecutor, defender):
+    prompt = f"""[사건 개요]
+{case}
+
+[라운드 {round_num}]
+검사: {prosecutor}
+변호: {defender}
+
+이 라운드만 평가해주세요 (5줄 이내):
+- 우세한 팀과 한 줄 이유
+- 검사팀 잘한 점 / 아쉬운 점
+- 변호팀 잘한 점 / 아쉬운 점
+- 인상적인 발언 한 구절
+- 점수: 검사팀 ?점, 변호팀 ?점 (100점 만점)"""
+    return [
+        {"role": "system", "content": ROUND_EVAL_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _submit_chat(client, messages, call=None):
+    """평가 요청 하나를 보내고 Future 반환 - 공유 루프가 있으면 스레드 없이 루프에 맡김
+
+    call(API 호출 기록)이 있으면 응답의 토큰 사용량을 남김 (기록 마무리는 Future가 끝날 때)
+    """
+    def content(response):
+        text = response.choices[0].message.content
+        if call is not None:
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                call.update(prompt_tokens=usage.prompt_tokens or 0,
+                            completion_tokens=usage.completion_tokens or 0)
+            call.update(bytes_received=len((text or "").encode("utf-8")))
+        return text
+
+    if hasattr(client, "submit"):
+        async def request(async_client):
+            response = await async_client.chat.completions.create(
+                model=ROUND_EVAL_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=ROUND_EVAL_MAX_TOKENS
+            )
+            return content(response)
+
+        return client.submit(request, "chat", estimate_chat_tokens(messages, ROUND_EVAL_MAX_TOKENS))
+
+    def request():
+        response = client.chat.completions.create(
+            model=ROUND_EVAL_MODEL,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=ROUND_EVAL_MAX_TOKENS
+        )
+        return content(response)
+
+    return _eval_pool.submit(request)
+
+
+class RoundEvaluator:
+    """라운드 평가 요청과 결과 - 모든 세션이 공유 (같은 라운드 내용은 한 번만 평가)"""
+
+    def __init__(self, client, cache, telemetry=None):
+        self.client = client
+        self.cache = cache
+        self.telemetry = telemetry
+        self._pending = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, messages, tags=None):
+        """아직 평가가 없고 진행 중도 아니면 평가 요청 - tags(세션/학급)로 API 호출 기록"""
+        if self.cache.get(key) is not None:
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._failed.discard(key)
+            call = None
+            if self.telemetry is not None:
+                call = self.telemetry.track(
+                    "round_eval", tags,
+                    model=ROUND_EVAL_MODEL,
+                    bytes_sent=sum(len(m["content"].encode("utf-8")) for m in messages)
+                )
+            future = _submit_chat(self.client, messages, call)
+            self._pending[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f, call))
+
+    def _finish(self, key, future, call=None):
+        error = None
+        try:
+            text = future.result()
+        except Exception as e:
+            text = None
+            error = e
+        if call is not None:
+            if future.cancelled():
+                call.close(outcome="cancelled")
+            elif error is not None:
+                call.close(outcome="error", error=type(error).__name__)
+            else:
+                call.close(outcome="ok")
+        if text:
+            self.cache.set(key, text)
+        with self._lock:
+            self._pending.pop(key, None)
+            if not text:
+                self._failed.add(key)
+
+    def result(self, key):
+        return self.cache.get(key)
+
+    def wait(self, keys, timeout):
+        """진행 중인 평가를 timeout초까지 기다린 뒤 {키: 평가문} (실패했거나 덜 끝난 키는 빠짐)"""
+        with self._lock:
+            futures = {key: self._pending[key] for key in keys if key in self._pending}
+        if futures and timeout > 0:
+            wait(list(futures.values()), timeout=timeout)
+        results = {}
+        for key in keys:
+            text = self.cache.get(key)
+            future = futures.get(key)
+            if text is None and future is not None and future.done() \
+                    and not future.cancelled() and future.exception() is None:
+                # 캐시에 저장하는 콜백보다 먼저 깨어날 수 있어 Future 결과도 확인
+                text = future.result()
+            if text:
+                results[key] = text
+        return results
+
+    def status(self, key):
+        """'done' / 'pending' / 'failed' / None(요청 전)"""
+        if self.cache.get(key) is not None:
+            return "done"
+        with self._lock:
+            if key in self._pending:
+                return "pending"
+            if key in self._failed:
+                return "failed"
+        return None
+
+
+@st.cache_resource
+def get_round_evaluator(_client):
+    """서버 프로세스 전체에서 하나만 쓰는 라운드 평가기"""
+    cache = TieredCache(
+        "round_evaluations",
+        max_memory_items=256,
+        max_disk_bytes=10 * 1024 * 1024,
+        ttl_seconds=ROUND_EVAL_TTL
+    )
+    return RoundEvaluator(_client, cache, get_api_telemetry())
+
+
+def _evaluable_rounds(case, rounds):
+    """발언이 모두 저장된 라운드 - [(인덱스, 검사 발언, 변호 발언)]"""
+    evaluable = []
+    for i, round_data in enumerate(rounds):
+        prosecutor = (round_data.get("prosecutor") or "").strip()
+        defender = (round_data.get("defender") or "").strip()
+        if case and prosecutor and defender:
+            evaluable.append((i, prosecutor, defender))
+    return evaluable
+
+
+def collect_round_evaluations(evaluator, case, rounds):
+    """발언이 모두 저장된 라운드는 평가를 요청하고, 끝난 평가를 {라운드 인덱스: 평가문}으로 반환
+
+    세션에는 라운드별 마지막 키만 기억 - 라운드를 고치면 그 라운드 키만 바뀌어 다시 평가됨
+    """
+    keys = st.session_state.setdefault("round_eval_keys", {})
+    ready = {}
+    # 회로가 열렸거나 학급 예산을 다 썼으면 새 평가는 요청하지 않음 (판결은 발언만으로)
+    skip = (get_judgment_breaker().is_open()
+            or get_usage_ledger().budget_status(current_class())["state"] == "exhausted")
+    evaluable = _evaluable_rounds(case, rounds)
+    for i in [i for i in keys if i not in {i for i, _, _ in evaluable}]:
+        keys.pop(i)
+    for i, prosecutor, defender in evaluable:
+        key = round_eval_key(case, i + 1, prosecutor, defender)
+        keys[i] = key
+        text = evaluator.result(key)
+        if text is not None:
+            ready[i] = text
+        elif not skip:
+            evaluator.submit(key, round_eval_messages(case, i + 1, prosecutor, defender),
+                             tags=session_tags())
+    return ready
+
+
+def final_round_evaluations(evaluator, case, rounds, timeout=ROUND_EVAL_WAIT_SECONDS):
+    """최종 판결 프롬프트에 쓸 라운드 평가 - 모든 라운드 평가가 있을 때만 {라운드 인덱스: 평가문}
+
+    누른 시점에 끝난 평가만 쓰면 같은 토론도 프롬프트(=판결 캐시 키)가 달라지므로,
+    진행 중인 평가는 timeout초까지 기다리고 하나라도 없으면 {} (발언만으로 판결).
+    timeout이 지나도 진행 중인 평가가 남아 있으면 None
+    """
+    collect_round_evaluations(evaluator, case, rounds)
+    keys = {i: round_eval_key(case, i + 1, p, d) for i, p, d in _evaluable_rounds(case, rounds)}
+    if not keys:
+        return {}
+    if timeout > 0 and any(evaluator.status(key) == "pending" for key in keys.values()):
+        with st.spinner("🧮 라운드별 사전 평가를 마무리하는 중입니다..."):
+            results = evaluator.wait(list(keys.values()), timeout)
+    else:
+        results = evaluator.wait(list(keys.values()), 0)
+    if len(results) == len(keys):
+        return {i: results[key] for i, key in keys.items()}
+    if any(evaluator.status(key) == "pending" for key in keys.values() if key not in results):
+        return None
+    return {}
+
+
+@st.fragment(run_every=1)
+def wait_round_evaluations(evaluator, case, rounds):
+    """진행 중인 라운드 평가 확인 - 1초마다 이 부분만 다시 실행하고, 평가가 모두 정해지면 전체 화면 갱신
+
+    평가가 끝나도 다른 입력이 없으면 스크립트가 다시 돌지 않아, 미리 시작할 판결이 그대로 멈춰 있게 됨
+    """
+    if final_round_evaluations(evaluator, case, rounds, timeout=0) is not None:
+        st.rerun()
+
+
+def round_evaluated_prompt(evaluator, case, rounds, build, timeout=ROUND_EVAL_WAIT_SECONDS):
+    """판결 프롬프트 (프롬프트, PromptReport) - build(round_evals)로 만듦
+
+    같은 토론이면 세션에 고정해 둔 프롬프트를 다시 씀. 평가가 모두 끝났거나(또는 실패/미요청으로
+    정해졌을 때)만 고정하고, 기다려도 진행 중이면 이번만 평가 없이 만들어 다음에 다시 확인
+    """
+    snapshot = debate_snapshot(case, rounds)
+    pinned = pinned_prompt(snapshot)
+    if pinned is not None:
+        return pinned
+    round_evals = final_round_evaluations(evaluator, case, rounds, timeout)
+    prompt, report = build(round_evals or {})
+    if round_evals is not None:
+        pin_prompt(snapshot, prompt, report)
+    return prompt, report
+
+
+def show_round_evaluation_status(evaluator, rounds):
+    """사전 평가 진행 상황 한 줄 요약"""
+    keys = st.session_state.get("round_eval_keys", {})
+    if not keys:
+        return
+    statuses = [evaluator.status(key) for key in keys.values()]
+    done = statuses.count("done")
+    pending = statuses.count("pending")
+    text = f"🧮 라운드별 사전 평가 {done}/{len(rounds)} 완료"
+    if pending:
+        text += f" · {pending}건 평가 중"
+    st.caption(text + " - 완료된 평가는 최종 판결에 바로 반영됩니다.")
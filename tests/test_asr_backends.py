@@ -0,0 +1,66 @@
+"""
+Whisper 업로드 - 429로 대기열에 다시 들어간 요청이 같은 녹음을 다시 보내는지 확인
+"""
+
+import httpx
+from openai import RateLimitError
+
+from asr_backends import OpenAIWhisperBackend
+from rate_limiter import RateLimiter
+from reactor import AsyncReactor, ReactorClient
+
+
+class FakeTranscriptions:
+    """처음 한 번은 429, 그다음부터는 받은 파일 크기를 돌려주는 가짜 Whisper"""
+
+    def __init__(self):
+        self.calls = 0
+        self.uploads = []
+
+    async def create(self, file, **kwargs):
+        self.calls += 1
+        data = file.read()
+        if self.calls == 1:
+            response = httpx.Response(
+                429,
+                headers={"retry-after-ms": "10"},
+                request=httpx.Request("POST", "http://mock/v1/audio/transcriptions")
+            )
+            raise RateLimitError("Rate limit reached", response=response, body=None)
+        self.uploads.append(data)
+        return f"{len(data)}바이트"
+
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.audio = type("Audio", (), {})()
+        self.audio.transcriptions = FakeTranscriptions()
+
+
+def make_client():
+    fake = FakeAsyncClient()
+    reactor = AsyncReactor(lambda: fake, limiter=RateLimiter({"audio": (6000, 0)}))
+    return ReactorClient(reactor), fake.audio.transcriptions
+
+
+def test_upload_is_resent_after_rate_limit():
+    client, transcriptions = make_client()
+    backend = OpenAIWhisperBackend(client, compress=False)
+    audio = [b"RIFF-header", b"\x01\x02" * 500]
+
+    text, sent, used = backend.submit(None, audio, None, "ko", "").result(timeout=10)
+
+    assert transcriptions.calls == 2
+    assert transcriptions.uploads == [b"".join(audio)]
+    assert (text, sent, used) == (f"{sent}바이트", len(b"".join(audio)), "openai")
+
+
+def test_sync_create_rereads_file_after_rate_limit():
+    client, transcriptions = make_client()
+    backend = OpenAIWhisperBackend(client, compress=False)
+    with backend._payload([b"abc", b"def"], None) as audio_file:
+        text = client.audio.transcriptions.create(model="whisper-1", file=audio_file)
+
+    assert transcriptions.calls == 2
+    assert transcriptions.uploads == [b"abcdef"]
+    assert text == "6바이트"
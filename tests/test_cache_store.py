@@ -0,0 +1,48 @@
+"""
+2단계 캐시 - 메모리에서 밀려난 값은 디스크에서 다시 올리고, 만료/용량 초과 항목은 지우는지 확인
+"""
+
+import time
+
+from cache_store import TieredCache
+
+
+def make_cache(tmp_path, **kwargs):
+    return TieredCache("test", path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_memory_lru_falls_back_to_disk(tmp_path):
+    cache = make_cache(tmp_path, max_memory_items=1)
+    cache.set("a", {"text": "판결 A"})
+    cache.set("b", {"text": "판결 B"})
+    assert cache.get("b") == {"text": "판결 B"}
+    assert cache.get("a") == {"text": "판결 A"}
+    assert cache.get("c") is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+    assert (stats["memory_items"], stats["disk_items"]) == (1, 2)
+
+
+def test_disk_survives_a_new_process(tmp_path):
+    make_cache(tmp_path).set("key", "저장된 판결")
+    assert make_cache(tmp_path).get("key") == "저장된 판결"
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = make_cache(tmp_path, ttl_seconds=0.05)
+    cache.set("key", "판결")
+    time.sleep(0.06)
+    assert cache.get("key") is None
+    assert cache.stats()["disk_items"] == 0
+
+
+def test_disk_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, max_memory_items=1, max_disk_bytes=25)
+    cache.set("a", "가" * 3)
+    cache.set("b", "나" * 3)
+    cache.get("a")
+    # 항목 하나가 11바이트 - 세 번째를 넣으면 가장 오래 읽지 않은 b가 빠짐
+    cache.set("c", "다" * 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == "가" * 3 and cache.get("c") == "다" * 3
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,52 @@
+"""
+회로 차단기 - 연속 실패로 열리고, 시간이 지나면 시험 호출 하나만 보내 닫히거나 다시 열리는지 확인
+"""
+
+import time
+
+from circuit_breaker import CircuitBreaker
+
+
+def tripped(reset_seconds=0.05):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=reset_seconds)
+    breaker.record_failure(RuntimeError("1"))
+    assert breaker.allow()
+    breaker.record_failure(RuntimeError("2"))
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = tripped(reset_seconds=30)
+    assert breaker.is_open() and not breaker.allow()
+    status = breaker.status()
+    assert (status["state"], status["trips"]) == ("open", 1)
+    assert 0 < status["retry_in"] <= 30
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open() and breaker.allow()
+
+
+def test_half_open_allows_one_probe_then_closes():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.allow()
+    # 시험 호출 결과가 나올 때까지 다른 호출은 막음
+    assert not breaker.allow()
+    assert breaker.status()["state"] == "half_open"
+    breaker.record_success()
+    assert breaker.status()["state"] == "closed" and breaker.allow()
+
+
+def test_failed_probe_opens_again():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure(RuntimeError("probe"))
+    status = breaker.status()
+    assert (status["state"], status["trips"]) == ("open", 2)
+    assert not breaker.allow()
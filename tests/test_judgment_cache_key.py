@@ -0,0 +1,28 @@
+"""
+판결 키 - 프롬프트가 달라도(라운드 평가 유무, 줄인 발언) 같은 토론이면 같은 키인지 확인
+"""
+
+from judgment import judgment_cache_key
+
+CASE = "학생 A가 급식 줄에서 새치기를 했습니다."
+ROUNDS = [{"prosecutor": "규칙을 어겼습니다.", "defender": "친구가 자리를 맡아줬습니다."}]
+
+
+def key(prompt, case=CASE, rounds=ROUNDS, model="gpt-4"):
+    return judgment_cache_key(model, "판사", prompt, (case, rounds))
+
+
+def test_prompt_with_or_without_evaluations_shares_key():
+    assert key("발언만 담은 프롬프트") == key("사전 평가: 검사팀 우세 ...")
+
+
+def test_whitespace_and_empty_rounds_are_ignored():
+    spaced = [{"prosecutor": " 규칙을  어겼습니다.\n", "defender": "친구가 자리를 맡아줬습니다."},
+              {"prosecutor": "", "defender": ""}]
+    assert key("p", rounds=spaced) == key("p")
+
+
+def test_statement_or_model_change_makes_new_key():
+    edited = [{"prosecutor": "규칙을 어겼습니다. 목격자도 있습니다.", "defender": "친구가 자리를 맡아줬습니다."}]
+    assert key("p", rounds=edited) != key("p")
+    assert key("p", model="gpt-3.5-turbo") != key("p")
@@ -0,0 +1,83 @@
+"""
+판결 스레드 - 공유 루프의 동시 요청 한도만큼 스레드를 두고, 기다리는 판결은 순서를 알려 주고,
+취소된 판결은 저장하지 않는지 확인
+"""
+
+import judgment
+from circuit_breaker import CircuitBreaker
+from judgment import JudgmentCancelled, JudgmentFlights
+from reactor import MAX_CONCURRENT_REQUESTS
+
+
+def test_pool_matches_reactor_concurrency():
+    assert judgment._flight_pool._max_workers == MAX_CONCURRENT_REQUESTS
+
+
+def test_queued_flights_report_position():
+    flights = JudgmentFlights()
+    first, _ = flights.join("a")
+    second, _ = flights.join("b")
+    flights.enqueue(first)
+    flights.enqueue(second)
+    assert (flights.ahead(first), flights.ahead(second), flights.queued()) == (0, 1, 2)
+
+    # 먼저 들어온 판결이 스레드를 받으면 다음 판결이 맨 앞으로
+    flights.dequeue(first)
+    assert flights.ahead(first) is None
+    assert flights.ahead(second) == 0
+
+
+class CancellingStream:
+    """판결 조각을 보낸 뒤, 마지막 조각 전에 판결이 취소되는 가짜 스트림"""
+
+    def __init__(self, flights, key):
+        self.flights = flights
+        self.key = key
+
+    def create(self, **kwargs):
+        def chunk(content, finish_reason):
+            delta = type("Delta", (), {"content": content})()
+            choice = type("Choice", (), {"delta": delta, "finish_reason": finish_reason})()
+            return type("Chunk", (), {"choices": [choice], "usage": None})()
+
+        yield chunk("판결", None)
+        self.flights.cancel(self.key)
+        yield chunk(None, "stop")
+
+
+class DictCache(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+def test_flight_cancelled_mid_request_is_not_cached():
+    flights = JudgmentFlights()
+    flight, _ = flights.join("key")
+    flight.speculative = True
+    client = type("Client", (), {})()
+    client.chat = type("Chat", (), {})()
+    client.chat.completions = CancellingStream(flights, "key")
+    cache = DictCache()
+
+    judgment._produce(flight, flights, client, "gpt-4", [{"role": "user", "content": "판결"}],
+                      100, 0.7, cache, judgment.JudgmentMetrics(), CircuitBreaker("test"))
+
+    assert cache == {}
+    assert flight.text is None and isinstance(flight.error, JudgmentCancelled)
+    # 취소된 판결은 목록에서 빠져 같은 키로 다시 요청하면 새로 시작
+    assert flights.join("key")[1] is True
+
+
+def test_speculation_with_follower_is_not_cancelled():
+    flights = JudgmentFlights()
+    flight, started = flights.join("key")
+    flight.speculative = True
+    # 다른 세션이 같은 판결에 합류하면 한 세션의 토론이 바뀌어도 판결은 계속
+    follower, joined = flights.join("key")
+    assert (started, joined, follower is flight) == (True, False, True)
+    assert flights.cancel("key") is False and not flight.cancelled
+
+    alone, _ = flights.join("other")
+    alone.speculative = True
+    assert flights.cancel("other") is True
+    assert flights.join("other")[0] is not alone
@@ -0,0 +1,65 @@
+"""
+판결 재시도 - 연결/서버 오류만 다시 시도하고 회로 차단기 실패로 세는지 확인
+"""
+
+import httpx
+from openai import APIConnectionError, BadRequestError
+
+import judgment
+from circuit_breaker import CircuitBreaker
+from judgment import JudgmentFlights, JudgmentMetrics, _produce
+
+REQUEST = httpx.Request("POST", "http://mock/v1/chat/completions")
+
+
+class FakeCompletions:
+    """정해 둔 오류를 차례로 내고, 오류가 떨어지면 한 조각짜리 판결을 보내는 가짜 API"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        delta = type("Delta", (), {"content": "판결"})()
+        choice = type("Choice", (), {"delta": delta, "finish_reason": "stop"})()
+        return iter([type("Chunk", (), {"choices": [choice], "usage": None})()])
+
+
+class FakeClient:
+    def __init__(self, errors):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions(errors)
+
+
+def produce(client, breaker, monkeypatch):
+    monkeypatch.setattr(judgment, "retry_delay", lambda attempt: 0)
+    flights = JudgmentFlights()
+    flight, _ = flights.join("key")
+    _produce(flight, flights, client, "gpt-4", [{"role": "user", "content": "판결"}],
+             100, 0.7, None, JudgmentMetrics(), breaker)
+    return flight
+
+
+def test_connection_error_is_retried_and_counted(monkeypatch):
+    client = FakeClient([APIConnectionError(request=REQUEST)])
+    breaker = CircuitBreaker("test", failure_threshold=5)
+    flight = produce(client, breaker, monkeypatch)
+    assert flight.text == "판결"
+    assert client.chat.completions.calls == 2
+    # 실패로 한 번 세었다가 다시 성공해서 닫힘
+    assert "APIConnectionError" in breaker.status()["last_error"]
+    assert breaker.status()["failures"] == 0
+
+
+def test_bad_request_fails_fast_without_tripping_breaker(monkeypatch):
+    response = httpx.Response(400, request=REQUEST)
+    client = FakeClient([BadRequestError("bad request", response=response, body=None)] * 3)
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    flight = produce(client, breaker, monkeypatch)
+    assert isinstance(flight.error, BadRequestError)
+    assert client.chat.completions.calls == 1
+    status = breaker.status()
+    assert status["state"] == "closed" and status["failures"] == 0
@@ -0,0 +1,49 @@
+"""
+판결 모델 선택 - 문맥 길이, 최근 응답 시간, 대기열에 따라 더 빠른 모델로 내려가는지 확인
+"""
+
+import time
+
+from model_router import choose_model, predict_latency
+
+TIERS = ["gpt-4", "gpt-3.5-turbo"]
+
+
+def records(model, total, count=5):
+    return [{"model": model, "total": total, "ok": True, "time": time.time()}] * count
+
+
+def choose(prompt="짧은 토론", records=(), queue_depth=0):
+    return choose_model("gpt-4", "판사", prompt, 1000, records=records, queue_depth=queue_depth,
+                        slo_seconds=25, tiers=TIERS)
+
+
+def test_preferred_model_when_within_slo():
+    assert choose() == ("gpt-4", "기본 모델")
+
+
+def test_slow_recent_judgments_move_to_faster_model():
+    model, reason = choose(records=records("gpt-4", 40.0))
+    assert model == "gpt-3.5-turbo"
+    assert "gpt-4 예상 40초" in reason
+
+
+def test_too_few_or_old_records_are_ignored():
+    old = [dict(r, time=time.time() - 3600) for r in records("gpt-4", 40.0)]
+    assert choose(records=records("gpt-4", 40.0, count=2))[0] == "gpt-4"
+    assert choose(records=old)[0] == "gpt-4"
+    assert predict_latency("gpt-4", 0, 1000, old) == 20.0
+
+
+def test_long_prompt_skips_small_context_model():
+    model, reason = choose(prompt="가" * 9000)
+    assert model == "gpt-3.5-turbo" and "프롬프트" in reason
+
+
+def test_long_queue_starts_one_tier_down():
+    model, reason = choose(queue_depth=5)
+    assert model == "gpt-3.5-turbo" and "대기 5건" in reason
+
+
+def test_unknown_model_is_kept():
+    assert choose_model("my-model", "판사", "토론", 1000, tiers=TIERS) == ("my-model", "지정 모델")
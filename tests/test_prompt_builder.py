@@ -0,0 +1,25 @@
+"""
+발언 줄이기 - 띄어쓰기나 문장 끝이 없는 긴 글도 예산 안에서 앞부분을 남기는지 확인
+"""
+
+from prompt_builder import compact_text
+from rate_limiter import estimate_tokens
+
+
+def test_unbroken_text_is_cut_by_characters():
+    text = "가" * 500
+    compacted = compact_text(text, 40)
+    assert compacted.startswith("가" * 10) and compacted.endswith(" …")
+    assert estimate_tokens(compacted) <= 40
+
+
+def test_long_word_after_short_words_fills_the_budget():
+    compacted = compact_text("첫째 증거 " + "나" * 400, 40)
+    assert compacted.startswith("첫째 증거 나")
+    assert estimate_tokens(compacted) <= 40
+
+
+def test_words_are_kept_whole():
+    compacted = compact_text("hello world " * 50, 10)
+    assert compacted.endswith("world …") or compacted.endswith("hello …")
+    assert estimate_tokens(compacted) <= 10
@@ -0,0 +1,52 @@
+"""
+속도 제한 - 버킷이 분당 한도만큼 다시 차고, 예상 대기 시간은 버킷을 바꾸지 않는지 확인
+"""
+
+import asyncio
+import time
+
+from rate_limiter import RateLimiter, TokenBucket
+
+
+def test_bucket_refills_at_rate_per_second():
+    bucket = TokenBucket(60)
+    bucket.state = (0.0, 100.0)
+    assert bucket.delay(1, 100.0) == 1.0
+    assert bucket.delay(1, 100.5) == 0.5
+    assert bucket.delay(1, 101.0) == 0.0
+    # 한도보다 많이 다시 차지는 않음
+    assert bucket.level_at(1000.0) == 60.0
+
+
+def test_pause_empties_the_bucket_for_retry_after():
+    bucket = TokenBucket(60)
+    bucket.pause(5)
+    assert 5.9 < bucket.delay(1, time.monotonic()) <= 6.0
+
+
+def test_eta_only_reads_the_buckets():
+    limiter = RateLimiter({"chat": (60, 600)})
+    lane = limiter._lanes["chat"]
+    lane.requests.state = (0.0, time.monotonic())
+    first = limiter.ticket("chat", tokens=10)
+    second = limiter.ticket("chat", tokens=10)
+    before = (lane.requests.state, lane.tokens.state)
+    assert first.eta() <= 1.0
+    assert 1.0 < second.eta() <= 2.0
+    assert (lane.requests.state, lane.tokens.state) == before
+
+
+def test_acquire_waits_for_the_bucket_in_order():
+    limiter = RateLimiter({"chat": (600, 0)})
+    limiter._lanes["chat"].requests.state = (0.0, time.monotonic())
+    tickets = [limiter.ticket("chat") for _ in range(2)]
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire(ticket) for ticket in tickets))
+        return time.monotonic() - started
+
+    # 초당 10건 - 비어 있는 버킷에서 두 건이면 약 0.2초
+    assert asyncio.run(run()) >= 0.19
+    assert all(ticket.started for ticket in tickets)
+    assert limiter.stats()["chat"]["served"] == 2
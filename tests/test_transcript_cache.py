@@ -0,0 +1,44 @@
+"""
+음성 인식 캐시 - 대체 엔진이 인식한 결과는 그 엔진 이름으로 저장되는지 확인
+"""
+
+from asr_backends import FallbackBackend, StubBackend
+from transcription import transcribe_wav
+from test_transcription_usage import FakeWhisper, speech_wav
+
+
+class FailingWhisper(FakeWhisper):
+    def transcribe(self, parts, info, language, prompt):
+        raise RuntimeError("Whisper API 오류")
+
+
+class LocalStub(StubBackend):
+    name = "local"
+
+
+class DictCache(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+def test_fallback_result_is_not_cached_as_primary():
+    cache = DictCache()
+    audio = speech_wav()
+    result = transcribe_wav(FallbackBackend([FailingWhisper(), LocalStub(text="로컬 결과")]), audio, cache=cache)
+    assert result.backend == "local"
+
+    # 기본 엔진만 쓰는 설정은 로컬 결과를 받지 않음
+    whisper = transcribe_wav(FakeWhisper(text="Whisper 결과"), audio, cache=cache)
+    assert (whisper.text, whisper.cached) == ("Whisper 결과", False)
+
+    # 같은 대체 설정은 저장된 결과를 다시 씀 - 기본 엔진 결과가 있으면 그쪽을 먼저
+    again = transcribe_wav(FallbackBackend([FailingWhisper(), LocalStub(text="새 결과")]), audio, cache=cache)
+    assert (again.text, again.cached) == ("Whisper 결과", True)
+
+
+def test_local_only_result_is_reused_by_local_backend():
+    cache = DictCache()
+    audio = speech_wav()
+    transcribe_wav(FallbackBackend([FailingWhisper(), LocalStub(text="첫 결과")]), audio, cache=cache)
+    result = transcribe_wav(LocalStub(text="다른 결과"), audio, cache=cache)
+    assert (result.text, result.cached) == ("첫 결과", True)
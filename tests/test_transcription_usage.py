@@ -0,0 +1,61 @@
+"""
+음성 인식 사용량 - 엔진을 여러 개 설정해도 실제로 인식한 엔진의 모델로 비용을 계산하는지 확인
+"""
+
+import io
+import wave
+
+import numpy as np
+
+from api_telemetry import ApiTelemetry
+from asr_backends import FallbackBackend, StubBackend
+from transcription import TranscriptionQueue
+from usage_budget import WHISPER_PRICE_PER_MINUTE, call_cost
+
+
+class FakeWhisper(StubBackend):
+    """Whisper API 대신 - 이름과 모델만 같은 고정 엔진"""
+
+    name = "openai"
+    model = "whisper-1"
+
+
+class FailingLocal(StubBackend):
+    name = "local"
+
+    def transcribe(self, parts, info, language, prompt):
+        raise RuntimeError("로컬 엔진 없음")
+
+
+def speech_wav(seconds=3.0, rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    samples = (np.sin(2 * np.pi * 220 * t) * 12000).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def transcribe(backend):
+    telemetry = ApiTelemetry(log_path=None, prom_path=None)
+    records = []
+    telemetry.add_listener(records.append)
+    queue = TranscriptionQueue(max_workers=1, telemetry=telemetry)
+    queue.submit("prosecutor", 1, backend, speech_wav()).result()
+    return records[0]
+
+
+def test_fallback_records_whisper_model_and_cost():
+    record = transcribe(FallbackBackend([FakeWhisper(text="안녕하세요"), FailingLocal()]))
+    assert record["model"] == "whisper-1"
+    assert record["audio_seconds"] > 2
+    assert call_cost(record) == record["audio_seconds"] / 60 * WHISPER_PRICE_PER_MINUTE
+
+
+def test_non_whisper_engine_is_free():
+    record = transcribe(FallbackBackend([FailingLocal(), StubBackend(text="안녕하세요")]))
+    assert record["model"] == "stub"
+    assert call_cost(record) == 0.0
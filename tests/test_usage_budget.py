@@ -0,0 +1,35 @@
+"""
+학급 사용량 - 판결 토큰은 판결 호출만 세고, 예산을 쓴 만큼 저렴한 모델/규칙 기반 판결로 바뀌는지 확인
+"""
+
+import time
+
+from usage_budget import UsageLedger
+
+
+def call(endpoint, model="gpt-4", prompt_tokens=1000, completion_tokens=500, class_id="2-3"):
+    return {"time": time.time(), "endpoint": endpoint, "model": model, "class": class_id,
+            "session": "s1", "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+def test_judgment_tokens_exclude_round_evaluations(tmp_path):
+    ledger = UsageLedger(path=str(tmp_path / "usage.sqlite3"))
+    ledger.record(call("judgment"))
+    ledger.record(call("round_eval", model="gpt-3.5-turbo", prompt_tokens=200, completion_tokens=100))
+    usage = ledger.session_usage("s1")
+    assert (usage["calls"], usage["judgments"]) == (2, 1)
+    assert usage["judgment_tokens"] == 1500
+    assert usage["tokens"] == 1800
+
+
+def test_budget_moves_to_downgrade_then_exhausted(tmp_path):
+    # gpt-4 판결 한 번 = 1000 * 0.03/1000 + 500 * 0.06/1000 = $0.06
+    ledger = UsageLedger(path=str(tmp_path / "usage.sqlite3"), budgets={"2-3": 0.2}, downgrade_at=0.8)
+    states = []
+    for _ in range(4):
+        ledger.record(call("judgment"))
+        states.append(ledger.budget_status("2-3")["state"])
+    assert states == ["ok", "ok", "downgrade", "exhausted"]
+    # 예산이 없는 학급은 얼마를 써도 그대로
+    ledger.record(call("judgment", class_id="2-4"))
+    assert ledger.budget_status("2-4")["state"] == "ok"
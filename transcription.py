@@ -0,0 +1,306 @@
+"""
+음성 인식 파이프라인
+WAV 길이 제한, 16kHz 모노 변환/압축, 구간 분할, 병렬 인식과 이어 붙이기
+실제 인식은 asr_backends의 엔진이 담당
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from api_telemetry import get_api_telemetry
+from cache_store import TieredCache
+from asr_backends import create_asr_backend, ASR_BACKEND
+from audio_utils import parse_wav, split_wav, wav_segment, to_speech_wav, trim_silence
+
+# 한 번에 Whisper로 보내는 최대 길이(초) - 이보다 길면 구간으로 나눔
+CHUNK_SECONDS = 30
+# 구간 사이 겹침(초) - 경계에서 잘린 단어를 살리기 위함
+OVERLAP_SECONDS = 1.5
+# 녹음 전체 최대 길이(초) - 최종 변론도 3분이면 충분
+MAX_RECORDING_SECONDS = 180
+# 동시에 업로드하는 구간 수
+MAX_PARALLEL_CHUNKS = 6
+# Whisper 권장 샘플레이트 - 모노 16kHz면 스테레오 44kHz 대비 약 1/5 크기
+TARGET_SAMPLE_RATE = 16000
+# 백그라운드 음성 인식 작업을 동시에 처리하는 최대 개수 (모든 세션 합계)
+MAX_TRANSCRIPTION_WORKERS = 8
+# 이어 붙일 때 겹침으로 중복된 단어를 찾는 최대 범위
+MAX_OVERLAP_WORDS = 12
+
+DEFAULT_PROMPT = "중학생 모의재판 발언"
+
+# 모든 세션이 함께 쓰는 구간 인식용 스레드 풀 (공유 루프로 업로드하지 않는 엔진용)
+_chunk_pool = ThreadPoolExecutor(
+    max_workers=MAX_PARALLEL_CHUNKS,
+    thread_name_prefix="whisper-chunk"
+)
+
+
+@st.cache_resource
+def get_asr_backend(_client):
+    """배포 설정(ASR_BACKEND)에 맞는 음성 인식 엔진 - 프로세스 전체에서 하나"""
+    return create_asr_backend(ASR_BACKEND, _client)
+
+
+@st.cache_resource
+def get_transcript_cache():
+    """모든 세션이 함께 쓰는 음성 인식 결과 캐시 (텍스트라 용량이 작음)"""
+    return TieredCache("transcripts", max_memory_items=256, max_disk_bytes=20 * 1024 * 1024)
+
+
+class TranscriptResult:
+    """음성 인식 결과와 처리 정보 (전송량, 업로드 시간 포함)"""
+
+    def __init__(self, text="", duration=0.0, chunks=1, truncated=False,
+                 bytes_in=0, bytes_sent=0, upload_seconds=0.0, no_speech=False,
+                 cached=False, backend=""):
+        self.text = text
+        self.duration = duration
+        self.chunks = chunks
+        self.truncated = truncated
+        self.bytes_in = bytes_in
+        self.bytes_sent = bytes_sent
+        self.upload_seconds = upload_seconds
+        # 음성이 없어 API 호출을 건너뛴 경우
+        self.no_speech = no_speech
+        # 캐시에서 꺼낸 결과인 경우
+        self.cached = cached
+        # 실제로 인식한 엔진 이름
+        self.backend = backend
+
+    @property
+    def bytes_saved(self):
+        return max(0, self.bytes_in - self.bytes_sent)
+
+    @property
+    def saved_ratio(self):
+        """원본 대비 줄어든 비율 (0.0~1.0)"""
+        return self.bytes_saved / self.bytes_in if self.bytes_in else 0.0
+
+
+def stitch_transcripts(texts):
+    """겹침 구간 때문에 반복된 단어를 제거하며 순서대로 이어 붙이기"""
+    words = []
+    for text in texts:
+        new_words = text.split()
+        if not new_words:
+            continue
+        # 앞 구간의 끝과 뒷 구간의 시작이 가장 길게 일치하는 부분 찾기
+        overlap = 0
+        for size in range(min(MAX_OVERLAP_WORDS, len(words), len(new_words)), 0, -1):
+            if words[-size:] == new_words[:size]:
+                overlap = size
+                break
+        words.extend(new_words[overlap:])
+    return " ".join(words)
+
+
+def transcript_cache_key(audio_bytes, info, language, prompt, namespace="openai"):
+    """정규화된 오디오 데이터 + 엔진 + 언어 + 프롬프트의 해시"""
+    digest = hashlib.sha256()
+    digest.update(memoryview(audio_bytes)[info.data_offset:info.data_offset + info.data_size])
+    digest.update(f"|{namespace}|{info.sample_rate}|{language}|{prompt}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def transcribe_wav(backend, audio_bytes, language="ko", prompt=DEFAULT_PROMPT, cache=None):
+    """WAV 헤더 기준으로 길이를 제한하고, 16kHz 모노로 줄인 뒤 긴 녹음은 나눠서 동시에 인식
+
+    앞뒤 무음은 잘라내고, 음성이 없으면 API를 호출하지 않음.
+    cache(TieredCache)가 주어지면 정규화된 오디오 기준으로 결과를 재사용함.
+    WAV가 아니면 원본 그대로 한 번에 전송함
+    """
+    bytes_in = len(audio_bytes)
+    started = time.perf_counter()
+    try:
+        info = parse_wav(audio_bytes)
+    except ValueError:
+        text, sent, used = backend.transcribe(audio_bytes, None, language, prompt)
+        return TranscriptResult(
+            text=text, bytes_in=bytes_in, bytes_sent=sent,
+            upload_seconds=time.perf_counter() - started, backend=used
+        )
+
+    truncated = info.duration > MAX_RECORDING_SECONDS
+    n_frames = min(info.n_frames, int(MAX_RECORDING_SECONDS * info.sample_rate))
+    if n_frames == 0:
+        return TranscriptResult(bytes_in=bytes_in, no_speech=True)
+
+    # 업로드 전에 16kHz 모노로 변환 (잘린 뒤 구간은 변환하지 않음)
+    audio_bytes = to_speech_wav(audio_bytes, info, TARGET_SAMPLE_RATE, n_frames)
+    info = parse_wav(audio_bytes)
+
+    # 무음 제거 - 음성이 없으면 Whisper가 없는 문장을 지어내므로 호출하지 않음
+    audio_bytes, _ = trim_silence(audio_bytes, info)
+    if audio_bytes is None:
+        return TranscriptResult(bytes_in=bytes_in, no_speech=True)
+    info = parse_wav(audio_bytes)
+
+    # 같은 녹음을 다시 인식하는 경우 (재실행, 재접속, 수업 다시 보기)
+    if cache is not None:
+        for namespace in backend.cache_namespaces:
+            text = cache.get(transcript_cache_key(audio_bytes, info, language, prompt, namespace))
+            if text is not None:
+                return TranscriptResult(
+                    text=text, duration=info.duration, truncated=truncated,
+                    bytes_in=bytes_in, upload_seconds=time.perf_counter() - started,
+                    cached=True
+                )
+
+    result = _transcribe_segments(backend, audio_bytes, info, language, prompt)
+    result.truncated = truncated
+    result.bytes_in = bytes_in
+    result.upload_seconds = time.perf_counter() - started
+    # 실제로 인식한 엔진 기준으로 저장 (대체 엔진 결과가 기본 엔진 결과로 섞이지 않도록)
+    namespace = backend.served_namespace(result.backend) if cache is not None else None
+    if namespace is not None:
+        cache.set(transcript_cache_key(audio_bytes, info, language, prompt, namespace), result.text)
+    return result
+
+
+def _transcribe_segments(backend, audio_bytes, info, language, prompt):
+    """길이에 따라 한 번에 또는 구간별로 나눠 동시에 인식"""
+    n_frames = info.n_frames
+    duration = info.duration
+
+    if duration <= CHUNK_SECONDS:
+        # 헤더를 실제 데이터 길이에 맞게 다시 써서 전송
+        parts = wav_segment(audio_bytes, info, 0, n_frames)
+        text, sent, used = backend.transcribe(parts, info, language, prompt)
+        return TranscriptResult(text=text, duration=duration, bytes_sent=sent, backend=used)
+
+    segments = split_wav(audio_bytes, info, CHUNK_SECONDS, OVERLAP_SECONDS, n_frames)
+    futures = [
+        backend.submit(_chunk_pool, parts, info, language, prompt)
+        for parts in segments
+    ]
+    try:
+        # 제출 순서대로 결과를 모아야 문장 순서가 유지됨
+        results = [future.result() for future in futures]
+    except Exception:
+        # 한 구간이라도 실패하면 아직 시작하지 않은 구간은 취소
+        for future in futures:
+            future.cancel()
+        raise
+    return TranscriptResult(
+        text=stitch_transcripts([text for text, _, _ in results]),
+        duration=duration,
+        chunks=len(segments),
+        bytes_sent=sum(sent for _, sent, _ in results),
+        backend=",".join(sorted({used for _, _, used in results}))
+    )
+
+
+def format_upload_stats(result):
+    """전송량/업로드 시간 요약 문구"""
+    if result.cached:
+        return f"⚡ 캐시된 인식 결과 사용 · ⏱️ {result.upload_seconds * 1000:.0f}ms"
+    if result.backend == "local":
+        return f"🖥️ 로컬 엔진으로 인식 (전송 없음) · ⏱️ {result.upload_seconds:.1f}초"
+    return (
+        f"📦 전송 {result.bytes_sent / 1024:.0f}KB "
+        f"(원본 {result.bytes_in / 1024:.0f}KB, {result.saved_ratio:.0%} 절감) · "
+        f"⏱️ {result.upload_seconds:.1f}초"
+    )
+
+
+class TranscriptionJob:
+    """백그라운드 음성 인식 작업 - 어느 팀/라운드의 녹음인지와 Future 보관"""
+
+    def __init__(self, future, team, round_num):
+        self.future = future
+        self.team = team
+        self.round_num = round_num
+        self.submitted_at = time.time()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """TranscriptResult 반환 - 인식 중 오류는 그대로 다시 발생"""
+        return self.future.result()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.submitted_at
+
+
+def served_model(backend, result):
+    """실제로 인식한 엔진의 모델 이름 - 여러 엔진이 나눠 맡았으면 +로 이음 (예: local+whisper-1)
+
+    엔진을 여러 개 설정해도(openai,local) 비용은 실제로 쓴 엔진 기준으로 계산해야 함
+    """
+    engines = [engine for engine in result.backend.split(",") if engine]
+    return "+".join(sorted({backend.engine_model(engine) for engine in engines}))
+
+
+def _tracked_transcribe(call, backend, audio_bytes, language, cache):
+    """작업 스레드에서 음성 인식 - 결과(전송량, 오디오 길이, 캐시 여부, 쓴 모델)를 호출 기록에 남김"""
+    if call is None:
+        return transcribe_wav(backend, audio_bytes, language, DEFAULT_PROMPT, cache)
+    with call:
+        result = transcribe_wav(backend, audio_bytes, language, DEFAULT_PROMPT, cache)
+        if result.backend:
+            call.update(model=served_model(backend, result))
+        call.update(
+            outcome="no_speech" if result.no_speech else "ok",
+            cache="hit" if result.cached else "miss",
+            bytes_sent=result.bytes_sent,
+            bytes_received=len(result.text.encode("utf-8")),
+            audio_seconds=0.0 if result.cached else result.duration,
+            chunks=result.chunks
+        )
+        return result
+
+
+class TranscriptionQueue:
+    """모든 세션이 함께 쓰는 음성 인식 작업 큐 - 스레드 수를 제한해 순서대로 처리
+
+    작업 스레드에서는 streamlit 함수를 부르지 않으며, 화면 반영은
+    스크립트 쪽에서 결과를 꺼내 처리함
+    """
+
+    def __init__(self, max_workers=MAX_TRANSCRIPTION_WORKERS, telemetry=None):
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="whisper-job"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.telemetry = telemetry
+
+    def submit(self, team, round_num, backend, audio_bytes, language="ko", cache=None, tags=None):
+        """작업 제출 후 바로 반환 - 호출 기록은 제출 시점부터 (큐 대기 시간 포함)"""
+        with self._lock:
+            self._in_flight += 1
+        call = None
+        if self.telemetry is not None:
+            call = self.telemetry.track(
+                "transcription", tags,
+                model=getattr(backend, "model", None) or backend.name,
+                bytes_in=len(audio_bytes)
+            )
+        future = self._pool.submit(
+            _tracked_transcribe, call, backend, audio_bytes, language, cache
+        )
+        future.add_done_callback(self._finished)
+        return TranscriptionJob(future, team, round_num)
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def in_flight(self):
+        """대기 중이거나 처리 중인 작업 수"""
+        with self._lock:
+            return self._in_flight
+
+
+@st.cache_resource
+def get_transcription_queue():
+    """서버 프로세스 전체에서 하나만 쓰는 음성 인식 작업 큐"""
+    return TranscriptionQueue(telemetry=get_api_telemetry())
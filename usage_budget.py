@@ -0,0 +1,229 @@
+"""
+학급별 API 사용량과 예산
+판결 토큰과 음성 인식 시간을 세션/학급(또는 교사)별로 쌓아 두고 예상 비용을 계산,
+학급 예산을 거의 다 쓰면 저렴한 모델로, 다 쓰면 규칙 기반 판결로 전환
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from cache_store import CACHE_DIR
+
+# 모델별 가격 (USD, 1000토큰당 입력/출력) - 요금표가 바뀌면 여기만 고치면 됨
+MODEL_PRICES = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+# 가격을 모르는 모델은 가장 비싼 값으로 (예산을 넘겨 쓰지 않도록)
+DEFAULT_PRICE = (0.03, 0.06)
+# Whisper API 음성 인식 가격 (USD/분) - 로컬 엔진은 0
+WHISPER_PRICE_PER_MINUTE = 0.006
+
+# 학급 이름 - 주소에 ?class=2-3을 붙이거나 사이드바에서 입력
+DEFAULT_CLASS = "미지정"
+# 학급별 한 달 예산 (USD) - 예: CLASS_BUDGETS="2-3=5,2-4=3.5"
+CLASS_BUDGETS = {
+    name.strip(): float(value)
+    for name, _, value in (
+        item.partition("=") for item in os.getenv("CLASS_BUDGETS", "").split(",") if "=" in item
+    )
+}
+# 목록에 없는 학급의 한 달 예산 (0이면 제한 없음)
+DEFAULT_CLASS_BUDGET = float(os.getenv("DEFAULT_CLASS_BUDGET", "0"))
+# 예산을 이 비율 이상 쓰면 가장 저렴한 판결 모델로
+BUDGET_DOWNGRADE_AT = float(os.getenv("BUDGET_DOWNGRADE_AT", "0.8"))
+
+
+def budget_period(now=None):
+    """예산을 묶는 기간 - 달 단위 (예: 2024-05)"""
+    return time.strftime("%Y-%m", time.localtime(now))
+
+
+def call_cost(record):
+    """API 호출 기록 하나의 예상 비용 (USD)"""
+    if record["endpoint"] == "transcription":
+        # 여러 엔진이 나눠 맡은 녹음(local+whisper-1)은 넉넉하게 전체 길이를 Whisper 가격으로
+        models = (record.get("model") or "").split("+")
+        if not any(model.startswith("whisper") for model in models):
+            return 0.0
+        return (record.get("audio_seconds") or 0) / 60 * WHISPER_PRICE_PER_MINUTE
+    prompt_price, completion_price = MODEL_PRICES.get(record.get("model"), DEFAULT_PRICE)
+    return (
+        (record.get("prompt_tokens") or 0) / 1000 * prompt_price
+        + (record.get("completion_tokens") or 0) / 1000 * completion_price
+    )
+
+
+def current_class():
+    """지금 세션의 학급 이름"""
+    return (
+        st.session_state.get("class_id")
+        or st.query_params.get("class")
+        or DEFAULT_CLASS
+    ).strip() or DEFAULT_CLASS
+
+
+class UsageLedger:
+    """기간/학급/세션/엔드포인트별 사용량 합계 - SQLite에 저장해 서버를 다시 켜도 유지"""
+
+    def __init__(self, path=None, budgets=None, default_budget=DEFAULT_CLASS_BUDGET,
+                 downgrade_at=BUDGET_DOWNGRADE_AT):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "usage.sqlite3")
+        self.path = path
+        self.budgets = dict(CLASS_BUDGETS if budgets is None else budgets)
+        self.default_budget = default_budget
+        self.downgrade_at = downgrade_at
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                period TEXT NOT NULL,
+                class TEXT NOT NULL,
+                session TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                audio_seconds REAL NOT NULL,
+                cost REAL NOT NULL,
+                PRIMARY KEY (period, class, session, endpoint)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS usage_session ON usage (session)")
+
+    def record(self, record):
+        """API 호출 기록 하나를 합계에 더함 (api_telemetry가 호출이 끝날 때마다 부름)"""
+        row = (
+            budget_period(record["time"]),
+            record.get("class") or DEFAULT_CLASS,
+            record.get("session") or "-",
+            record["endpoint"],
+            record.get("prompt_tokens") or 0,
+            record.get("completion_tokens") or 0,
+            record.get("audio_seconds") or 0.0,
+            call_cost(record),
+        )
+        try:
+            with self._lock:
+                self._db.execute("""
+                    INSERT INTO usage VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+                    ON CONFLICT (period, class, session, endpoint) DO UPDATE SET
+                        calls = calls + 1,
+                        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                        completion_tokens = completion_tokens + excluded.completion_tokens,
+                        audio_seconds = audio_seconds + excluded.audio_seconds,
+                        cost = cost + excluded.cost
+                """, row)
+        except sqlite3.Error:
+            # 사용량 기록 실패로 수업이 멈추면 안 됨
+            pass
+
+    def _totals(self, where, params):
+        with self._lock:
+            rows = self._db.execute(f"""
+                SELECT endpoint, SUM(calls), SUM(prompt_tokens), SUM(completion_tokens),
+                       SUM(audio_seconds), SUM(cost)
+                FROM usage WHERE {where} GROUP BY endpoint
+            """, params).fetchall()
+        totals = {"calls": 0, "judgments": 0, "tokens": 0, "judgment_tokens": 0,
+                  "audio_seconds": 0.0, "cost": 0.0}
+        for endpoint, calls, prompt_tokens, completion_tokens, audio_seconds, cost in rows:
+            totals["calls"] += calls
+            if endpoint == "judgment":
+                totals["judgments"] += calls
+                totals["judgment_tokens"] += prompt_tokens + completion_tokens
+            # 전체 토큰에는 라운드 평가처럼 판결이 아닌 채팅 호출도 포함
+            totals["tokens"] += prompt_tokens + completion_tokens
+            totals["audio_seconds"] += audio_seconds
+            totals["cost"] += cost
+        return totals
+
+    def session_usage(self, session):
+        """세션 하나의 사용량 - {calls, judgments, tokens, judgment_tokens, audio_seconds, cost}"""
+        return self._totals("session = ?", (session,))
+
+    def class_usage(self, class_id, period=None):
+        """학급의 이번 기간 사용량"""
+        return self._totals("period = ? AND class = ?", (period or budget_period(), class_id))
+
+    def classes(self, period=None):
+        """이번 기간에 사용량이 있는 학급 목록"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT class FROM usage WHERE period = ? ORDER BY class",
+                (period or budget_period(),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def budget_for(self, class_id):
+        return self.budgets.get(class_id, self.default_budget)
+
+    def budget_status(self, class_id):
+        """학급 예산 상태 - state: ok(여유) / downgrade(저렴한 모델) / exhausted(규칙 기반 판결)"""
+        budget = self.budget_for(class_id)
+        spent = self.class_usage(class_id)["cost"]
+        ratio = spent / budget if budget > 0 else 0.0
+        if budget <= 0 or ratio < self.downgrade_at:
+            state = "ok"
+        elif ratio < 1.0:
+            state = "downgrade"
+        else:
+            state = "exhausted"
+        return {"class": class_id, "budget": budget, "spent": spent, "ratio": ratio, "state": state}
+
+
+@st.cache_resource
+def get_usage_ledger():
+    """서버 프로세스 전체에서 하나만 쓰는 사용량 장부"""
+    return UsageLedger()
+
+
+def session_usage():
+    """이번 세션의 사용량과 학급 - 결과 파일에 함께 저장"""
+    usage = get_usage_ledger().session_usage(st.session_state.get("session_id", "-"))
+    usage["class"] = current_class()
+    return usage
+
+
+def show_class_selector():
+    """사이드바 학급 입력 - 이후 API 사용량이 이 학급으로 기록됨"""
+    if "class_id" not in st.session_state:
+        st.session_state.class_id = st.query_params.get("class", "")
+    st.text_input("🏫 학급/교사", key="class_id", placeholder="예: 2-3 또는 김선생님",
+                  help="API 사용량과 예산을 학급별로 기록합니다. 주소에 ?class=2-3을 붙여도 됩니다.")
+
+
+def show_usage_summary():
+    """이번 세션과 학급의 API 사용량, 예산 사용률"""
+    session = session_usage()
+    status = get_usage_ledger().budget_status(session["class"])
+
+    st.markdown("### 💰 API 사용량")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("판결 토큰", f"{session['judgment_tokens']:,}")
+    with col2:
+        st.metric("음성 인식", f"{session['audio_seconds'] / 60:.1f}분")
+    with col3:
+        st.metric("예상 비용", f"${session['cost']:.3f}")
+
+    st.caption(f"이번 수업: API 호출 {session['calls']}회 (판결 {session['judgments']}회, 저장된 판결 재사용 포함) · "
+               f"전체 토큰 {session['tokens']:,}")
+    text = f"🏫 {status['class']} 이번 달 사용 ${status['spent']:.2f}"
+    if status["budget"] > 0:
+        st.progress(min(status["ratio"], 1.0), text=f"{text} / 예산 ${status['budget']:.2f} ({status['ratio']:.0%})")
+    else:
+        st.caption(f"{text} (예산 제한 없음)")
+    if status["state"] == "downgrade":
+        st.caption("💡 학급 예산을 많이 써서 판결은 더 저렴한 모델로 생성합니다.")
+    elif status["state"] == "exhausted":
+        st.caption("💡 이번 달 학급 예산을 다 써서 판결은 발언 평가로 계산합니다.")
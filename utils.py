@@ -8,6 +8,9 @@ import time
 from datetime import datetime, timedelta
 import json
 import random
+from audio_utils import audio_fingerprint
+from api_telemetry import session_tags
+from transcription import get_transcription_queue
 
 # 포인트 시스템
 POINT_SYSTEM = {
@@ -267,7 +270,8 @@ def save_session_data():
         "rounds": st.session_state.get('rounds', []),
         "points": st.session_state.get('points', {}),
         "badges": st.session_state.get('badges', {}),
-        "ai_judgment": st.session_state.get('ai_judgment', '')
+        "ai_judgment": st.session_state.get('ai_judgment', ''),
+        "judgment_meta": st.session_state.get('judgment_meta')
     }
     
     # 로컬 스토리지에 저장 (브라우저)
@@ -314,6 +318,69 @@ def create_quick_feedback(text, team):
     
     return score
 
+def is_new_recording(key, audio):
+    """녹음기 값이 새 녹음인지 확인 - 세션에는 원본 대신 지문만 보관"""
+    if not audio:
+        return False
+    fingerprints = st.session_state.setdefault('audio_fingerprints', {})
+    fingerprint = audio_fingerprint(audio)
+    if fingerprints.get(key) == fingerprint:
+        return False
+    fingerprints[key] = fingerprint
+    return True
+
+def queue_transcription(team, round_num, backend, audio, language="ko", cache=None):
+    """음성 인식을 백그라운드 큐에 넣고 바로 반환 - 결과는 collect_transcriptions로 받음"""
+    job = get_transcription_queue().submit(
+        team, round_num, backend, audio, language, cache, tags=session_tags()
+    )
+    st.session_state.setdefault('transcription_jobs', []).append(job)
+    return job
+
+def collect_transcriptions(team):
+    """끝난 음성 인식 작업을 세션에서 꺼내기"""
+    jobs = st.session_state.get('transcription_jobs', [])
+    finished = [job for job in jobs if job.team == team and job.done()]
+    if finished:
+        st.session_state.transcription_jobs = [job for job in jobs if job not in finished]
+    return finished
+
+def pending_transcriptions(team):
+    """아직 끝나지 않은 음성 인식 작업 목록"""
+    return [
+        job for job in st.session_state.get('transcription_jobs', [])
+        if job.team == team and not job.done()
+    ]
+
+@st.fragment(run_every=1)
+def show_transcription_status(team, client=None):
+    """음성 인식 진행 상태 - 1초마다 이 부분만 다시 그리고, 끝나면 전체 화면 갱신"""
+    jobs = [job for job in st.session_state.get('transcription_jobs', []) if job.team == team]
+    if any(job.done() for job in jobs):
+        st.rerun()
+    if jobs:
+        waited = max(job.elapsed for job in jobs)
+        st.info(f"🎙️ 음성 인식 중... ({len(jobs)}건, {waited:.0f}초 경과) 다른 팀은 계속 녹음할 수 있어요!")
+        queued = client.stats()["queues"].get("audio", {}).get("waiting", 0) if client is not None else 0
+        if queued:
+            st.caption(f"⏳ 여러 교실의 음성 인식 요청 {queued}건이 순서를 기다리는 중입니다.")
+
+def show_cache_stats(cache, title):
+    """캐시 적중/실패 현황 표시"""
+    stats = cache.stats()
+    st.markdown(f"**{title}**")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("적중", stats["memory_hits"] + stats["disk_hits"])
+    with col2:
+        st.metric("실패", stats["misses"])
+    with col3:
+        st.metric("적중률", f"{stats['hit_rate']:.0%}")
+    st.caption(
+        f"메모리 {stats['memory_items']}개 · 디스크 {stats['disk_items']}개 "
+        f"({stats['disk_bytes'] / 1024:.0f}KB) · 제거 {stats['evictions']}회"
+    )
+
 def format_time_korean(seconds):
     """한국어 시간 형식"""
     if seconds < 60: